@@ -1,13 +1,19 @@
-from .cli.cli import init
 import sys
 
 
-try:
-    if sys.argv[0].endswith("tap") and len(sys.argv) > 1:
+def init(config_path=None):
+    from .cli.cli import init as cli_init
+    cli_init(config_path)
+
+
+# 直接运行 tap 进入交互式模式时, 由 IPython 执行 cli.py 完成初始化; 这里不导入 cli,
+# 启动 IPython 之前不加载后端接口, 缓存和请求模块
+if not (sys.argv[0].endswith("tap") and len(sys.argv) == 1):
+    from .cli import cli
+    try:
+        if sys.argv[0].endswith("tap"):
+            init()
+        else:
+            get_ipython
+    except NameError:
         init()
-    elif sys.argv[0].endswith("tap"):
-        pass
-    else:
-        get_ipython
-except NameError:
-    init()
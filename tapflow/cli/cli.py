@@ -1,12 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import atexit
 import getpass
 import shlex
+import threading
 import os, sys
 from os.path import expanduser
 
 from tapflow.lib.backend_apis.common import MdbInstanceAssignedApi
-from tapflow.lib.commands.api_command import ApiCommand
-from tapflow.lib.commands.op_object_command import OpObjectCommand
 from tapflow.lib.configuration.config import get_configuration_path, ConfigParser
 
 # 获取当前脚本文件所在的目录
@@ -18,15 +19,14 @@ lib_path = os.path.join(current_dir, '..')
 # 将 lib 目录加入到 Python 搜索路径中
 sys.path.append(lib_path)
 
-from IPython.terminal.interactiveshell import TerminalInteractiveShell
 from platform import python_version
 from tapflow.lib.utils.log import logger
 from tapflow.lib.request import req
-from tapflow.lib.cache import client_cache
+from tapflow.lib.cache import client_cache, system_server_conf
+from tapflow.lib.disk_cache import open_disk_cache, save_client_cache
 from tapflow.lib.data_pipeline.nodes.sink import Sink
 from tapflow.lib.data_pipeline.nodes.source import Source
 from tapflow.lib.op_object import *
-from tapflow.lib.commands.show_command import ShowCommand
 from tapflow.lib.data_pipeline.pipeline import Pipeline, MView, Flow, _flows
 from tapflow.lib.data_pipeline.data_source import DataSource
 from tapflow.lib.data_pipeline.base_node import WriteMode, upsert, update, SyncType, DropType, no_drop, drop_data, drop_schema, FilterMode, FilterType
@@ -62,6 +62,57 @@ def get_default_sink():
         pass
 
 
+def _parallel_startup() -> bool:
+    return os.environ.get("TAPFLOW_PARALLEL_STARTUP", "1") != "0"
+
+
+def _revalidate_metadata(disk=None):
+    if not _parallel_startup():
+        globals().update(show_connections(quiet=True))
+        show_connectors(quiet=True)
+        show_jobs(quiet=True)
+        if req.mode == "cloud":
+            get_default_sink()
+    else:
+        # 连接, connector 和任务互不依赖, 并发拉取; 默认 sink 需要连接列表, 等连接加载完成后再获取
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="tapflow-warmup") as executor:
+            connections = executor.submit(show_connections, quiet=True)
+            others = [executor.submit(show_connectors, quiet=True), executor.submit(show_jobs, quiet=True)]
+            globals().update(connections.result())
+            if req.mode == "cloud":
+                get_default_sink()
+            for future in others:
+                future.result()
+    if disk is not None:
+        save_client_cache(client_cache, disk)
+
+
+def _revalidate_in_background(disk):
+    try:
+        _revalidate_metadata(disk)
+    except Exception as e:
+        logger.fdebug("revalidate metadata failed: {}", e)
+
+
+def load_metadata():
+    """
+    加载连接, connector 和任务; 磁盘缓存可用时先使用磁盘中的数据, 在后台向服务端校验
+    """
+    user = getattr(req, "ak", None) if req.mode == "cloud" else system_server_conf.get("user_id")
+    disk = open_disk_cache(req.server, user)
+    if disk is None:
+        _revalidate_metadata()
+        return
+    # 退出时保存会话中加载的表结构等元数据
+    atexit.register(save_client_cache, client_cache, disk)
+    namespace = warm_start(disk)
+    if namespace is not None:
+        globals().update(namespace)
+        threading.Thread(target=_revalidate_in_background, args=(disk,), daemon=True).start()
+    else:
+        _revalidate_metadata(disk)
+
+
 def init(config_path=None):
     """命令行模式初始化
     
@@ -70,25 +121,28 @@ def init(config_path=None):
     """
     config_file = config_path if config_path else get_configuration_path()
     ConfigParser(config_file, interactive=False).init()
-    globals().update(show_connections(quiet=True))
-    show_connectors(quiet=True)
-    show_jobs(quiet=True)
-    if req.mode == "cloud":
-        get_default_sink()
+    load_metadata()
 
 def main():
     """交互式模式"""
+    # IPython 和 magic 命令只在交互式模式下需要, tap -f 等命令行模式不导入
+    from IPython.terminal.interactiveshell import TerminalInteractiveShell
+    from tapflow.lib.commands.api_command import ApiCommand
+    from tapflow.lib.commands.op_object_command import OpObjectCommand
+    from tapflow.lib.commands.profile_command import ProfileCommand
+    from tapflow.lib.commands.show_command import ShowCommand
+
     # ipython settings
     ip = TerminalInteractiveShell.instance()
     ip.register_magics(ShowCommand)
     ip.register_magics(OpObjectCommand)
     ip.register_magics(ApiCommand)
+    ip.register_magics(ProfileCommand)
+    # 连接名和表名补全使用缓存中的索引; jedi 无法分析按需解析的属性, 使用 dir() 补全
+    ip.Completer.use_jedi = False
+    ip.Completer.custom_matchers.append(complete_connection_names)
     ConfigParser(get_configuration_path(), interactive=True).init()
-    globals().update(show_connections(quiet=True))
-    show_connectors(quiet=True)
-    show_jobs(quiet=True)
-    if req.mode == "cloud":
-        get_default_sink()
+    load_metadata()
 
 
 if __name__ == "__main__":
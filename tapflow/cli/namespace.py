@@ -0,0 +1,18 @@
+import builtins
+
+
+class LazyNamespace(dict):
+    """
+    交互式命令行的用户命名空间, 未定义的名称按连接名称从缓存中解析为 QuickDataSourceMigrateJob,
+    新建的连接不需要重新执行 show_connections 就可以直接使用
+
+    这个模块不导入 tapflow.lib, 第一次查找未定义的名称时才导入 op_object, 启动 IPython 之前不加载后端接口和缓存
+    """
+
+    def __missing__(self, key):
+        if isinstance(key, str) and key not in builtins.__dict__:
+            from tapflow.lib.op_object import resolve_connection_name
+            value = resolve_connection_name(key)
+            if value is not None:
+                return value
+        raise KeyError(key)
@@ -2,7 +2,6 @@ import argparse
 import os
 import sys
 import subprocess
-from IPython import start_ipython
 import importlib
 import importlib.util
 
@@ -65,7 +64,11 @@ c.TerminalInteractiveShell.prompts_class = NoPrompt
     # 使用绝对路径指定 profile-dir
     profile_dir = os.path.abspath(os.path.join(basepath, '.cli'))
 
-    start_ipython(argv=['--no-banner', '--profile-dir=' + profile_dir, '-i', os.path.join(source_path, 'cli', 'cli.py')])
+    # 用户命名空间按需解析连接名称, 不需要为每个连接生成全局变量
+    from IPython import start_ipython
+    from tapflow.cli.namespace import LazyNamespace
+    start_ipython(argv=['--no-banner', '--profile-dir=' + profile_dir, '-i', os.path.join(source_path, 'cli', 'cli.py')],
+                  user_ns=LazyNamespace())
 
 def load_module(file_path):
     """加载Python模块并返回模块对象"""
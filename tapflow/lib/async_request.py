@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, List
+
+import requests
+
+from tapflow.lib.request import RequestSession, req
+
+
+DEFAULT_ASYNC_LIMIT = 32
+
+
+class AsyncRequestSession:
+    """
+    asyncio 版本的后端请求会话
+
+    URL 映射(prepare_request)与云版 AK/SK 签名(generate_signed_params)全部复用 RequestSession,
+    每个工作线程持有一份独立的 RequestSession 副本, 同一时刻最多有 limit 个请求在途
+    """
+
+    def __init__(self, session: RequestSession = None, limit: int = DEFAULT_ASYNC_LIMIT):
+        """
+        :param session: 作为模板的同步会话, 默认使用全局 req
+        :param limit: 最大并发请求数
+        """
+        if limit < 1:
+            raise ValueError("limit must be greater than 0")
+        self.session = session if session is not None else req
+        self.limit = limit
+        self._local = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._semaphores = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix="tapflow-async")
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio.Semaphore 与事件循环绑定, 每个事件循环单独创建
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit)
+            self._semaphores = {l: s for l, s in self._semaphores.items() if not l.is_closed()}
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def thread_session(self) -> RequestSession:
+        """
+        获取当前线程的会话副本, 模板会话重新登录后自动重新复制
+        :return: RequestSession
+        """
+        fingerprint = self.session.fingerprint()
+        session = getattr(self._local, "session", None)
+        if session is None or getattr(self._local, "fingerprint", None) != fingerprint:
+            session = self.session.clone()
+            self._local.session = session
+            self._local.fingerprint = fingerprint
+        # 录像可能在副本创建之后才挂上, 每次同步
+        session.cassette = self.session.cassette
+        return session
+
+    async def run(self, fn: Callable[[RequestSession], Any]) -> Any:
+        """
+        在工作线程中以当前线程的会话执行 fn, 受并发上限约束
+        :param fn: 接收 RequestSession 的函数
+        :return: fn 的返回值
+        """
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), lambda: fn(self.thread_session()))
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return await self.run(lambda session: session.request(method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def gather(self, aws: Iterable[Awaitable], return_exceptions: bool = False) -> List[Any]:
+        """
+        并发等待多个请求, 并发数由 limit 限制
+        :param aws: 协程列表
+        :param return_exceptions: 为 True 时异常作为结果返回而不是抛出
+        :return: 结果列表, 顺序与输入一致
+        """
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def run_async(coro: Awaitable) -> Any:
+    """
+    在同步代码(脚本, tap -f)中运行一个协程并返回结果
+    :param coro: 协程
+    :return: 协程结果
+    """
+    return asyncio.run(coro)
@@ -6,7 +6,7 @@ class ApiServersApi(BaseBackendApi):
     def get_all_api_servers(self) -> list:
         params = {"order": "createAt DESC", "limit": 20, "skip": 0, "where": {}}
         res = self.req.get("/Modules", params=params)
-        return res.json().get("data", {}).get("items", [])
+        return (self._result(res).data or {}).get("items", [])
 
     def unpublish(self, id: str, tablename: str) -> Tuple[dict, bool]:
         payload = {
@@ -15,9 +15,10 @@ class ApiServersApi(BaseBackendApi):
             "status": "pending"
         }
         res = self.req.patch(f"/Modules", json=payload)
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json().get("data", {}), True
-        return res.json(), False
+        result = self._result(res)
+        if result.ok:
+            return {} if result.data is None else result.data, True
+        return result.body, False
     
     def publish(self, base_path: str, db: str, table: str, fields: list) -> Tuple[dict, bool]:
         payload = {
@@ -139,20 +140,23 @@ class ApiServersApi(BaseBackendApi):
             ]
         }
         res = self.req.post(f"/Modules", json=payload)
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json().get("data", {}), True
+        result = self._result(res)
+        if result.ok:
+            return {} if result.data is None else result.data, True
         return {}, False
     
     def publish_with_payload(self, payload: dict) -> Tuple[dict, bool]:
         res = self.req.post(f"/Modules", json=payload)
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json().get("data", {}), True
+        result = self._result(res)
+        if result.ok:
+            return {} if result.data is None else result.data, True
         return {}, False
 
     def update_with_payload(self, payload: dict) -> Tuple[dict, bool]:
         res = self.req.patch(f"/Modules", json=payload)
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json().get("data", {}), True
+        result = self._result(res)
+        if result.ok:
+            return {} if result.data is None else result.data, True
         return {}, False
     
     def activate(self, id: str, tablename: str) -> Tuple[dict, bool]:
@@ -165,6 +169,7 @@ class ApiServersApi(BaseBackendApi):
 
     def delete_api_server(self, id: str) -> Tuple[dict, bool]:
         res = self.req.delete(f"/Modules/{id}")
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json().get("data", {}), True
-        return res.json(), False
\ No newline at end of file
+        result = self._result(res)
+        if result.ok:
+            return {} if result.data is None else result.data, True
+        return result.body, False
\ No newline at end of file
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Iterable, List
+
+from tapflow.lib.async_request import AsyncRequestSession
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.dataVerify import DataVerifyApi
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.lib.backend_apis.task import TaskApi
+
+
+class AsyncBackendApi:
+    """
+    同步 BackendApi 的 asyncio 版本
+
+    每个公开方法都与同步版本同名同参, 返回协程; 请求构造和响应解析完全复用同步实现,
+    例如: await AsyncTaskApi(areq).get_task_by_id(task_id)
+    """
+
+    sync_api = None
+
+    def __init__(self, req: AsyncRequestSession):
+        self.req = req
+
+    def __getattr__(self, name: str):
+        method = getattr(self.sync_api, name, None)
+        if name.startswith("_") or not callable(method):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        async def call(*args, **kwargs):
+            return await self.req.run(lambda session: method(self.sync_api(session), *args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    async def map(self, name: str, args_list: Iterable, return_exceptions: bool = False) -> List[Any]:
+        """
+        对每组参数并发调用同一个方法, 例如: await api.map("get_task_by_id", task_ids)
+        :param name: 方法名
+        :param args_list: 参数列表, 元素为 tuple 时展开为多个位置参数
+        :param return_exceptions: 为 True 时异常作为结果返回而不是抛出
+        :return: 结果列表, 顺序与参数一致
+        """
+        method = getattr(self, name)
+        aws = [method(*args) if isinstance(args, tuple) else method(args) for args in args_list]
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+
+class AsyncTaskApi(AsyncBackendApi):
+    sync_api = TaskApi
+
+
+class AsyncConnectionsApi(AsyncBackendApi):
+    sync_api = ConnectionsApi
+
+
+class AsyncMetadataInstanceApi(AsyncBackendApi):
+    sync_api = MetadataInstanceApi
+
+
+class AsyncDataVerifyApi(AsyncBackendApi):
+    sync_api = DataVerifyApi
@@ -1,17 +1,112 @@
 import json
-from typing import Tuple
+import time
+from typing import Any, Iterator, Tuple
+
+import requests
+
+from tapflow.lib.http_cache import register_invalidation_hook
 from tapflow.lib.request import RequestSession
+from tapflow.lib.utils.json_stream import JsonItemStream
 from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.singleflight import SingleFlight
+
+# 流式读取列表响应时每次读取的字节数
+STREAM_CHUNK_SIZE = 65536
+
+
+# 合并相同的在途读请求, 例如多个线程同时轮询同一个任务的状态;
+# 可以设置 read_flight.ttl(秒) 让一个调度周期内的重复读取共享一次往返
+read_flight = SingleFlight()
+register_invalidation_hook("*", lambda event, **context: read_flight.forget())
+
+
+class ApiResult:
+    """
+    后端响应的统一解析结果, 响应体只解析一次
+
+    可以按 data, ok, code = result 解包;
+    body 为完整的响应体, 失败时各接口通常将其返回给调用方
+    """
+
+    __slots__ = ("data", "ok", "code", "body", "status_code")
+
+    def __init__(self, data: Any, ok: bool, code: str, body: Any, status_code: int):
+        self.data = data
+        self.ok = ok
+        self.code = code
+        self.body = body
+        self.status_code = status_code
+
+    def __iter__(self):
+        return iter((self.data, self.ok, self.code))
+
+    def __repr__(self):
+        return f"ApiResult(data={self.data!r}, ok={self.ok!r}, code={self.code!r})"
+
+
+def parse_result(res) -> ApiResult:
+    """
+    解析后端响应, 成功的条件为 HTTP 200 且 code == "ok"
+    :param res: requests.Response
+    :return: ApiResult
+    """
+    try:
+        body = res.json()
+    except ValueError:
+        return ApiResult(None, False, None, None, res.status_code)
+    if not isinstance(body, dict):
+        return ApiResult(body, False, None, body, res.status_code)
+    code = body.get("code")
+    ok = res.status_code == 200 and code == "ok"
+    return ApiResult(body.get("data"), ok, code, body, res.status_code)
+
 
 class BaseBackendApi:
 
     def __init__(self, req: RequestSession):
         self.req = req
 
+    def _result(self, res) -> ApiResult:
+        return parse_result(res)
+
+    def _coalesce(self, key: tuple, fn) -> Any:
+        """
+        合并相同的并发读请求, 调用方拿到的结果互不共享
+        :param key: 请求标识, 通常为 (方法名, 参数...)
+        :param fn: 发起请求并解析结果的函数
+        :return: fn 的结果
+        """
+        value, _ = read_flight.do((type(self).__name__, getattr(self.req, "server", None)) + key, fn)
+        return value
+
+    def _iter_items(self, url: str, params: dict = None) -> Iterator[dict]:
+        """
+        流式读取列表接口的 data.items, 边接收边解析, 不需要等待完整的响应
+        非 200 的响应按普通响应解析
+        :param url: 接口路径
+        :param params: 查询参数
+        :return: 逐个返回列表元素的生成器
+        """
+        res = self.req.get(url, params=params, stream=True)
+        if not isinstance(res, requests.Response) or res.status_code != 200:
+            yield from (self._result(res).data or {}).get("items", [])
+            return
+        # 缓存或录像构造的响应已经读取了响应体
+        chunks = [res.content] if getattr(res, "_content_consumed", False) else res.iter_content(STREAM_CHUNK_SIZE)
+        stream = JsonItemStream(chunks)
+        try:
+            yield from stream
+        finally:
+            res.close()
+        if stream.envelope.get("code") not in (None, "ok"):
+            logger.fdebug("request {} failed: {}, {}", url, stream.envelope.get("code"), stream.envelope.get("message"))
+
 
 class LoginResult:  
     token: str
     user_id: str
+    # token 过期时间(时间戳), 服务端没有返回 ttl 时为 None
+    expires_at: float = None
 
 
 class UserInfo:
@@ -22,22 +117,41 @@ class LoginApi(BaseBackendApi):
 
     def login(self, access_code: str) -> LoginResult:
         res = self.req.post("/users/generatetoken", json={"accesscode": access_code})
+        result = self._result(res)
         if res.status_code != 200:
             logger.warn("init get token request fail, err is: {}", res)
-            return res.json()
-        data = res.json()["data"]
+            return result.body
+        data = result.data
         login_result = LoginResult()
         login_result.token = data["id"]
         login_result.user_id = data["userId"]
+        if isinstance(data.get("ttl"), (int, float)) and data["ttl"] > 0:
+            login_result.expires_at = time.time() + data["ttl"]
         return login_result
     
+    def get_user(self, token: str, user_id: str) -> UserInfo:
+        """
+        只查询当前用户, 查询失败时退回到 get_user_info
+        :param token: 登录得到的 token
+        :param user_id: 当前用户 id
+        :return: UserInfo
+        """
+        res = self.req.get(f"/users/{user_id}", params={"access_token": token})
+        data, ok, _ = self._result(res)
+        if ok and isinstance(data, dict) and data.get("id") == user_id:
+            user_info = UserInfo()
+            user_info.username = data.get("username", "")
+            return user_info
+        return self.get_user_info(token, user_id)
+
     def get_user_info(self, token: str, user_id: str) -> UserInfo:
         res = self.req.get(f"/users", params={"access_token": token})
+        result = self._result(res)
         if res.status_code != 200:
-            logger.warn("get user info request fail, err is: {}", res.json())
-            return res.json()
+            logger.warn("get user info request fail, err is: {}", result.body)
+            return result.body
         user_info = UserInfo()
-        for user in res.json()["data"]["items"]:
+        for user in result.data["items"]:
             if user["id"] == user_id:
                 user_info.username = user.get("username", "")
                 break
@@ -53,7 +167,7 @@ class MdbInstanceAssignedApi(BaseBackendApi):
             str: connectionId
         """
         res = self.req.get("/mdb-instance-assigned")
-        return res.json().get("data", {}).get("connectionId", "")
+        return (self._result(res).data or {}).get("connectionId", "")
     
     def create_mdb_instance_assigned(self) -> str:
         """
@@ -62,14 +176,15 @@ class MdbInstanceAssignedApi(BaseBackendApi):
             str: connectionId
         """
         res = self.req.post("/mdb-instance-assigned/connection")
-        return res.json().get("data", "")
+        data = self._result(res).data
+        return "" if data is None else data
 
 
 class AgentApi(BaseBackendApi):
 
     def get_all_agents(self) -> list:
         res = self.req.get("/agent")
-        return res.json().get("data", {}).get("items", [])
+        return (self._result(res).data or {}).get("items", [])
     
     def get_running_agents(self) -> list:
         agents = self.get_all_agents()
@@ -77,23 +192,25 @@ class AgentApi(BaseBackendApi):
     
     def get_agent_count(self) -> Tuple[int, bool]:
         res = self.req.get("/agent/agentCount")
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json().get("data", {}).get("agentRunningCount", 0), True
-        return res.json(), False
+        result = self._result(res)
+        if result.ok:
+            return (result.data or {}).get("agentRunningCount", 0), True
+        return result.body, False
     
 
 class DatabaseTypesApi(BaseBackendApi):
 
     def get_all_connectors(self) -> list:
         res = self.req.get("/DatabaseTypes/getDatabases", params={"filter": json.dumps({"where":{"tag":"All","authentication":"All"},"order":"name ASC"})})
-        return res.json().get("data", {})
+        data = self._result(res).data
+        return {} if data is None else data
 
 
 class LogCollectorApi(BaseBackendApi):
 
     def get_all_log_collectors(self) -> list:
         res = self.req.get("/logcollector")
-        items = res.json().get("data", {}).get("items", [])
+        items = (self._result(res).data or {}).get("items", [])
         return items
 
 
@@ -101,24 +218,23 @@ class ShareCacheApi(BaseBackendApi):
 
     def get_all_share_caches(self) -> list:
         res = self.req.get("/shareCache")
-        return res.json().get("data", {}).get("items", [])
+        return (self._result(res).data or {}).get("items", [])
     
     def create_share_cache(self, data: dict) -> dict:
         res = self.req.post("/shareCache", json=data)
-        return res.json().get("data", {})
+        data = self._result(res).data
+        return {} if data is None else data
     
 
 class ExternalStorageApi(BaseBackendApi):
 
     def get_all_external_storages(self) -> Tuple[dict, bool]:
         res = self.req.get("/ExternalStorage/list")
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json(), True
-        return res.json(), False
+        result = self._result(res)
+        return result.body, result.ok
     
     def create_external_storage(self, data: dict) -> Tuple[dict, bool]:
         res = self.req.post("/ExternalStorage", json=data)
-        if res.status_code == 200 and res.json().get("code") == "ok":
-            return res.json(), True
-        return res.json(), False
+        result = self._result(res)
+        return result.body, result.ok
 
@@ -2,8 +2,13 @@
 
 
 import json
+from typing import Iterator
+
 from tapflow.lib.backend_apis.common import BaseBackendApi
 
+# 列表中不显示系统创建的连接
+USER_CONNECTIONS = {"createType": {"$ne": "System"}}
+
 
 class ConnectionsApi(BaseBackendApi):
 
@@ -14,8 +19,46 @@ class ConnectionsApi(BaseBackendApi):
         :param skip: int, default 0
         :return: list, connections
         """
-        res = self.req.get("/Connections", params={"filter": json.dumps({"limit": limit, "skip": skip, "order":"last_updated DESC","noSchema":1,"where":{"createType":{"$ne":"System"}}})})
-        return res.json().get("data", {}).get("items", [])
+        return list(self.iter_connections(limit, skip))
+
+    def iter_connections(self, limit: int = 10000, skip: int = 0) -> Iterator[dict]:
+        """
+        Stream connections, items are yielded while the response is still being received
+        :param limit: int, default 10000
+        :param skip: int, default 0
+        :return: iterator of connections
+        """
+        return self._iter_items("/Connections", params={"filter": json.dumps({"limit": limit, "skip": skip, "order":"last_updated DESC","noSchema":1,"where":USER_CONNECTIONS})})
+
+    def get_connections_updated_since(self, since: str, limit: int = 10000) -> list:
+        """
+        Get connections whose last_updated is not earlier than since, used by delta refresh
+        :param since: str, the largest last_updated seen by the last sync
+        :param limit: int, default 10000
+        :return: list, connections
+        """
+        where = dict(USER_CONNECTIONS, last_updated={"gte": since})
+        res = self.req.get("/Connections", params={"filter": json.dumps({"limit": limit, "order": "last_updated DESC", "noSchema": 1, "where": where})})
+        return (self._result(res).data or {}).get("items", [])
+
+    def count_connections(self) -> int:
+        """
+        Count connections
+        :return: int, total, None if the server does not return it
+        """
+        res = self.req.get("/Connections", params={"filter": json.dumps({"limit": 1, "noSchema": 1, "fields": {"id": True}, "where": USER_CONNECTIONS})})
+        return (self._result(res).data or {}).get("total")
+
+    def get_connection_ids(self) -> list:
+        """
+        Get ids of all connections, used to find deleted connections
+        :return: list, connection ids, None if the request failed
+        """
+        res = self.req.get("/Connections", params={"filter": json.dumps({"limit": 100000, "noSchema": 1, "fields": {"id": True}, "where": USER_CONNECTIONS})})
+        result = self._result(res)
+        if not result.ok:
+            return None
+        return [c["id"] for c in (result.data or {}).get("items", [])]
     
     def save_connection(self, connection: dict):
         """
@@ -41,7 +84,8 @@ class ConnectionsApi(BaseBackendApi):
         :return: dict, connections
         """
         res = self.req.get("/Connections")
-        return res.json().get("data", {})
+        data = self._result(res).data
+        return {} if data is None else data
     
     def get_connection(self, connection_id: str=None, connection_name: str=None) -> dict:
         """
@@ -63,7 +107,7 @@ class ConnectionsApi(BaseBackendApi):
                 }
             }
         res = self.req.get("/Connections", params={"filter": json.dumps(payload)})
-        items = res.json().get("data", {}).get("items", [])
+        items = (self._result(res).data or {}).get("items", [])
         if len(items) == 0:
             return None
         return items[0]
@@ -74,4 +118,4 @@ class ConnectionsApi(BaseBackendApi):
         :param connection_id: str, connection id
         :return: dict, connection
         """
-        return self.req.get("/Connections/" + connection_id).json()
+        return self._result(self.req.get("/Connections/" + connection_id)).body
@@ -1,6 +1,15 @@
 import json
+from typing import Iterator
+
 from .common import BaseBackendApi
 
+# 列出表时只需要的字段, 字段定义等通过 get_fields_instance_by_id 按需获取
+TABLE_LIST_FIELDS = {"id": True, "original_name": True, "meta_type": True}
+
+# 分页拉取表元数据时每页的数量
+DEFAULT_PAGE_SIZE = 1000
+
+
 class MetadataInstanceApi(BaseBackendApi):
 
     def get_metadata_instance(self, source_id: str) -> dict:
@@ -9,19 +18,76 @@ class MetadataInstanceApi(BaseBackendApi):
         :param source_id: 源id
         :return: 表格列表
         """
-        res = self.req.get("/MetadataInstances", params={
-            "filter": json.dumps({"where": {"source.id": source_id, "sourceType": "SOURCE", "is_deleted": False}, "limit": 999999})
-        })
-        return res.json()["data"]["items"]
+        def fetch():
+            res = self.req.get("/MetadataInstances", params={
+                "filter": json.dumps({"where": {"source.id": source_id, "sourceType": "SOURCE", "is_deleted": False}, "limit": 999999})
+            })
+            return self._result(res).data["items"]
+        return self._coalesce(("get_metadata_instance", source_id), fetch)
+
+    def iter_metadata_instances(self, source_id: str, fields: dict = None,
+                                page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[dict]:
+        """
+        分页获取 source_id 的表格元数据, 每次只请求一页
+        :param source_id: 源id
+        :param fields: 服务端返回的字段, 默认只返回 id, original_name, meta_type; 传入 {} 返回全部字段
+        :param page_size: 每页数量
+        :return: 逐个返回表格元数据的生成器
+        """
+        if fields is None:
+            fields = TABLE_LIST_FIELDS
+        skip = 0
+        while True:
+            payload = {
+                "where": {"source.id": source_id, "sourceType": "SOURCE", "is_deleted": False},
+                "order": "original_name ASC",
+                "skip": skip,
+                "limit": page_size,
+            }
+            if fields:
+                payload["fields"] = fields
+            count = 0
+            for item in self._iter_items("/MetadataInstances", params={"filter": json.dumps(payload)}):
+                count += 1
+                yield item
+            if count < page_size:
+                return
+            skip += count
+
+    def list_tables(self, source_id: str, page_size: int = DEFAULT_PAGE_SIZE) -> list:
+        """
+        获取 source_id 的表格列表, 只包含 id, original_name, meta_type
+        :param source_id: 源id
+        :param page_size: 每页数量
+        :return: 表格列表
+        """
+        return self._coalesce(("list_tables", source_id, page_size),
+                              lambda: list(self.iter_metadata_instances(source_id, page_size=page_size)))
     
+    def get_table_row_counts(self, source_id: str, tables: list = None) -> dict:
+        """
+        获取 source_id 下表的行数(tableAttr.numOfRows)
+        :param source_id: 源id
+        :param tables: 只返回这些表, 默认返回全部
+        :return: 表名 -> 行数, 按 tables 的顺序, 没有行数的表为 0
+        """
+        counts = {}
+        for item in self.iter_metadata_instances(source_id, fields={"original_name": True, "tableAttr": True}):
+            counts[item.get("original_name")] = int((item.get("tableAttr") or {}).get("numOfRows") or 0)
+        if tables is None:
+            return counts
+        return {table: counts.get(table, 0) for table in tables}
+
     def get_fields_instance_by_id(self, table_id: str) -> dict:
         """
         获取 表格id 的字段信息
         :param table_id: 表格id
         :return: 字段信息
         """
-        res = self.req.get(f"/MetadataInstances/{table_id}")
-        return res.json()["data"]["fields"]
+        def fetch():
+            res = self.req.get(f"/MetadataInstances/{table_id}")
+            return self._result(res).data["fields"]
+        return self._coalesce(("get_fields_instance_by_id", table_id), fetch)
     
     def get_table_id(self, table_name: str, source_id: str) -> str:
         """
@@ -40,13 +106,13 @@ class MetadataInstanceApi(BaseBackendApi):
             "fields": {"id": True, "original_name": True, "fields": True},
             "limit": 1
         }
-        res = self.req.get("/MetadataInstances", params={"filter": json.dumps(payload)})
-        table_id = None
-        for s in res.json()["data"]["items"]:
-            if s["original_name"] == table_name:
-                table_id = s["id"]
-                break
-        return table_id
+        def fetch():
+            res = self.req.get("/MetadataInstances", params={"filter": json.dumps(payload)})
+            for s in self._result(res).data["items"]:
+                if s["original_name"] == table_name:
+                    return s["id"]
+            return None
+        return self._coalesce(("get_table_id", table_name, source_id), fetch)
     
     def load_schema(self, node_id: str) -> dict:
         """
@@ -55,7 +121,7 @@ class MetadataInstanceApi(BaseBackendApi):
         :return: schema
         """
         res = self.req.get(f"/MetadataInstances/node/schema", params={"nodeId": node_id})
-        return res.json()["data"]
+        return self._result(res).body["data"]
     
     def schema_page(self, node_id: str) -> dict:
         """
@@ -64,7 +130,7 @@ class MetadataInstanceApi(BaseBackendApi):
         :return: schema 分页
         """
         res = self.req.get(f"/MetadataInstances/node/schemaPage", params={"nodeId": node_id})
-        return res.json()["data"]
+        return self._result(res).body["data"]
     
     def get_table_metadata(self, connection_id: str, table_name: str) -> dict:
         """
@@ -73,15 +139,15 @@ class MetadataInstanceApi(BaseBackendApi):
         :param table_name: 表格名
         :return: metadata
         """
-        res = self.req.post("/MetadataInstances/metadata/v3", json={
-            connection_id: {
-                "metaType": "table",
-                "tableNames": [table_name]
-            }
-        })
-        res = res.json()
-        meta = list(res["data"].items())[0][1][0]
-        return meta
+        def fetch():
+            res = self.req.post("/MetadataInstances/metadata/v3", json={
+                connection_id: {
+                    "metaType": "table",
+                    "tableNames": [table_name]
+                }
+            })
+            return list(self._result(res).data.items())[0][1][0]
+        return self._coalesce(("get_table_metadata", connection_id, table_name), fetch)
     
     def get_table_value(self, connection_id: str) -> dict:
         """
@@ -90,7 +156,7 @@ class MetadataInstanceApi(BaseBackendApi):
         :return: 表格值
         """
         res = self.req.get(f"/MetadataInstances/tablesValue", params={"connectionId": connection_id})
-        return res.json()["data"]
+        return self._result(res).body["data"]
     
     def get_fields_value(self, table_id: str) -> list:
         """
@@ -99,4 +165,4 @@ class MetadataInstanceApi(BaseBackendApi):
         :return: 字段值
         """
         res = self.req.get(f"/discovery/storage/overview/{table_id}")
-        return res.json()["data"]["fields"]
+        return self._result(res).data["fields"]
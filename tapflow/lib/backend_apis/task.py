@@ -1,35 +1,156 @@
 import json
+import threading
 import time
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Sequence, Tuple
 
 import requests
 
 from .common import BaseBackendApi
 
+# 任务列表(show_jobs)需要的字段
+TASK_LIST_FIELDS = {
+    "syncType": True,
+    "id": True,
+    "name": True,
+    "status": True,
+    "last_updated": True,
+    "createTime": True,
+    "user_id": True,
+    "startTime": True,
+    "agentId": True,
+    "statuses": True,
+    "type": True,
+    "desc": True,
+    "stats": True
+}
+
+# 等待任务状态时需要的字段: 状态, 里程碑(attrs.milestone, syncStatus)
+TASK_STATUS_FIELDS = {
+    "id": True,
+    "name": True,
+    "type": True,
+    "syncType": True,
+    "status": True,
+    "syncStatus": True,
+    "attrs": True,
+    "taskRecordId": True,
+    "last_updated": True,
+}
+
+# 任务指标(/measurement/batch)查询的字段
+MEASUREMENT_FIELDS = [
+    "inputInsertTotal",
+    "inputUpdateTotal",
+    "inputDeleteTotal",
+    "inputDdlTotal",
+    "inputOthersTotal",
+    "outputInsertTotal",
+    "outputUpdateTotal",
+    "outputDeleteTotal",
+    "outputDdlTotal",
+    "outputOthersTotal",
+    "tableTotal",
+    "createTableTotal",
+    "snapshotTableTotal",
+    "initialCompleteTime",
+    "sourceConnection",
+    "targetConnection",
+    "snapshotDoneAt",
+    "snapshotRowTotal",
+    "snapshotInsertRowTotal",
+    "inputQps",
+    "outputQps",
+    "currentSnapshotTableRowTotal",
+    "currentSnapshotTableInsertRowTotal",
+    "replicateLag",
+    "snapshotStartAt",
+    "snapshotTableTotal",
+    "currentEventTimestamp",
+    "snapshotDoneCost",
+    "outputQpsMax",
+    "outputQpsAvg",
+    "lastFiveMinutesQps",
+]
+
+# 一次 /measurement/batch 请求最多包含的子查询数
+MEASUREMENT_BATCH_SIZE = 100
+
+# 历史指标序列默认查询的字段
+SERIES_FIELDS = ("inputQps", "outputQps", "replicateLag")
+
+# 历史指标按这个时长(秒)分段查询, 各段并发请求
+SERIES_CHUNK_SECONDS = 6 * 3600
+SERIES_WORKERS = 4
+
+# (服务地址, 任务 id) -> taskRecordId, 任务每次启动都会生成新的 taskRecordId
+_task_record_ids = {}
+_task_record_lock = threading.Lock()
+
 
 class TaskApi(BaseBackendApi):
 
     def get_all_tasks(self) -> list:
+        return list(self.iter_all_tasks())
+
+    def iter_all_tasks(self) -> Iterator[dict]:
+        """
+        流式获取全部任务, 边接收边返回
+        """
         payload = {
             "limit": 10000,
-            "fields": {
-                "syncType": True,
-                "id": True,
-                "name": True,
-                "status": True,
-                "last_updated": True,
-                "createTime": True,
-                "user_id": True,
-                "startTime": True,
-                "agentId": True,
-                "statuses": True,
-                "type": True,
-                "desc": True,
-                "stats": True
-            }
+            "fields": TASK_LIST_FIELDS,
+        }
+        return self._iter_items("/Task", params={"filter": json.dumps(payload)})
+
+    def get_tasks_updated_since(self, since: str, limit: int = 10000) -> list:
+        """
+        获取 last_updated 不早于 since 的任务, 用于增量刷新
+        :param since: 上次同步得到的最大 last_updated
+        :param limit: 限制数量
+        :return: 任务列表, 按 last_updated 倒序
+        """
+        payload = {
+            "limit": limit,
+            "order": "last_updated DESC",
+            "fields": TASK_LIST_FIELDS,
+            "where": {"last_updated": {"gte": since}},
+        }
+        return list(self._iter_items("/Task", params={"filter": json.dumps(payload)}))
+
+    def get_tasks_status(self, task_ids: list, fields: dict = None) -> list:
+        """
+        一次查询多个任务的状态和里程碑
+        :param task_ids: 任务 id 列表
+        :param fields: 返回的字段, 默认为 TASK_STATUS_FIELDS
+        :return: 任务列表, 不存在的任务不返回
+        """
+        payload = {
+            "limit": len(task_ids),
+            "fields": fields if fields is not None else TASK_STATUS_FIELDS,
+            "where": {"id": {"in": list(task_ids)}},
         }
+        return list(self._iter_items("/Task", params={"filter": json.dumps(payload)}))
+
+    def count_tasks(self) -> int:
+        """
+        任务总数, 服务端没有返回 total 时返回 None
+        """
+        payload = {"limit": 1, "fields": {"id": True}}
         res = self.req.get("/Task", params={"filter": json.dumps(payload)})
-        return res.json()["data"]["items"]
+        return (self._result(res).data or {}).get("total")
+
+    def get_task_ids(self) -> list:
+        """
+        获取全部任务 id, 只返回 id 字段, 用于发现已删除的任务
+        :return: 任务 id 列表, 请求失败时返回 None
+        """
+        payload = {"limit": 100000, "fields": {"id": True}}
+        res = self.req.get("/Task", params={"filter": json.dumps(payload)})
+        result = self._result(res)
+        if not result.ok:
+            return None
+        return [task["id"] for task in (result.data or {}).get("items", [])]
     
     def filter_tasks_by_name(self, name: str, limit: int = 20, skip: int = 0) -> list:
         """
@@ -84,18 +205,19 @@ class TaskApi(BaseBackendApi):
         }
         
         res = self.req.get("/Task", params={"filter": json.dumps(payload)})
-        if res.status_code != 200 or res.json()["code"] != "ok":
+        result = self._result(res)
+        if not result.ok:
             return []
-        return res.json()["data"]["items"]
+        return result.data["items"]
     
     def list_heartbeat_tasks(self) -> list:
         filter_param = {"order": "createTime DESC", "limit": 1000, "skip": 0, "where": {"syncType": "connHeartbeat"}}
         res = self.req.get("/Task", params={"filter": json.dumps(filter_param)})
-        return res.json()["data"]["items"]
+        return self._result(res).data["items"]
     
     def reset_task(self, task_id: str) -> bool:
         res = self.req.patch(f"/Task/batchRenew", params={"taskIds": task_id})
-        return res.status_code == 200 and res.json()["code"] == "ok"
+        return self._result(res).ok
     
     def get_task_by_name(self, task_name: str) -> dict:
         """
@@ -110,7 +232,7 @@ class TaskApi(BaseBackendApi):
         param = param.replace("(", "%5C%5C(")
         param = param.replace(")", "%5C%5C)")
         res = self.req.get(f"/Task?filter={param}")
-        for task in res.json().get("data", {}).get("items", []):
+        for task in (self._result(res).data or {}).get("items", []):
             if task.get("name") == task_name:
                 return task
         return None
@@ -122,62 +244,68 @@ class TaskApi(BaseBackendApi):
         return task["id"]
     
     def get_task_by_id(self, task_id: str) -> dict:
-        res = self.req.get(f"/Task/{task_id}")
-        if res.status_code != 200:
-            return None
-        return res.json()["data"]
+        def fetch():
+            res = self.req.get(f"/Task/{task_id}")
+            if res.status_code != 200:
+                return None
+            return self._result(res).body["data"]
+        return self._coalesce(("get_task_by_id", task_id), fetch)
     
     def stop_task(self, task_id: str, force: bool = False) -> bool:
         res = self.req.put(f"/Task/batchStop", params={"taskIds": task_id, "force": force})
-        return res.status_code == 200 and res.json()["code"] == "ok"
+        return self._result(res).ok
     
     def delete_task(self, task_id: str) -> bool:
         res = self.req.delete(f"/Task/batchDelete", params={"taskIds": task_id})
-        return res.status_code == 200 and res.json()["code"] == "ok"
+        return self._result(res).ok
 
     def copy_task(self, task_id: str) -> Tuple[dict, bool]:
         res = self.req.put(f"/Task/copy/{task_id}")
-        ok = res.status_code == 200 and res.json()["code"] == "ok"
-        if ok:
-            return res.json()["data"], True
+        result = self._result(res)
+        if result.ok:
+            return result.data, True
         return None, False
     
     def get_task_relations(self, task_id: str) -> list:
         res = self.req.post("/task-console/relations", json={"taskId": task_id})
-        return res.json()["data"] if res.status_code == 200 and res.json()["code"] == "ok" else []
+        result = self._result(res)
+        return result.data if result.ok else []
     
     def update_task(self, task: dict) -> Tuple[dict, bool]:
         res = self.req.patch("/Task", json=task)
-        return res.json()["data"], res.status_code == 200 and res.json()["code"] == "ok"
+        result = self._result(res)
+        return result.body["data"], result.ok
     
     def create_task(self, task: dict) -> Tuple[dict, bool]:
         res = self.req.post("/Task", json=task)
-        ok = res.status_code == 200 and res.json()["code"] == "ok"
-        if ok:
-            return res.json()["data"], True
+        result = self._result(res)
+        if result.ok:
+            return result.data, True
         else:
-            if res.json()["code"] == "Task.RepeatName":
+            if result.code == "Task.RepeatName":
                 task_id = self.get_task_id_by_name(task["name"])
                 if task_id is None:
                     return None, False
                 task["id"] = task_id
                 return self.update_task(task), True
-        return res.json(), False
+        return result.body, False
     
     def confirm_task(self, task_id: str, task: dict) -> Tuple[dict, bool]:
         res = self.req.patch(f"/Task/confirm/{task_id}", json=task)
-        ok = res.status_code == 200 and res.json()["code"] == "ok"
-        if ok:
-            return res.json()["data"], True
+        result = self._result(res)
+        if result.ok:
+            return result.data, True
         return None, False
 
     def start_task(self, task_id: str) -> Tuple[dict, bool]:
         res = self.req.put("/Task/batchStart", params={"taskIds": task_id})
-        return res.json()["data"], res.status_code == 200 and res.json()["code"] == "ok"
+        result = self._result(res)
+        return result.body["data"], result.ok
 
     def rename_task(self, task_id: str, new_name: str) -> Tuple[dict, bool]:
         res = self.req.patch(f"/Task/rename/{task_id}", params={"newName": new_name})
-        return res.json()["data"], res.status_code == 200 and res.json()["code"] == "ok"
+        result = self._result(res)
+        return result.body["data"], result.ok
     
     def model_deduction(self, node_id: str, connection_id: str, node_config: dict) -> Tuple[dict, bool]:
         """
@@ -196,65 +324,174 @@ class TaskApi(BaseBackendApi):
                 node_config,
             ]
         })
-        return res.json()["data"], res.status_code == 200 and res.json()["code"] == "ok"
+        result = self._result(res)
+        return result.body["data"], result.ok
     
     def get_task_measurement(self, task_id: str, task_record_id: str) -> dict:
+        return self._coalesce(("get_task_measurement", task_id, task_record_id),
+                              lambda: self._get_task_measurement(task_id, task_record_id))
+
+    def _measurement_query(self, task_id: str, task_record_id: str) -> dict:
+        """
+        /measurement/batch 中查询一个任务最新指标的子查询
+        """
+        now = int(time.time() * 1000)
+        return {
+            "uri": "/api/measurement/query/v2",
+            "param": {
+                "startAt": now - 300000,
+                "endAt": now,
+                "samples": {
+                    "data": {
+                        "endAt": now,
+                        "fields": MEASUREMENT_FIELDS,
+                        "tags": {
+                            "taskId": task_id,
+                            "taskRecordId": task_record_id,
+                            "type": "task"
+                        },
+                        "type": "instant",
+                    }
+                }
+            }
+        }
+
+    def _get_task_measurement(self, task_id: str, task_record_id: str) -> dict:
+        payload = {"totalData": self._measurement_query(task_id, task_record_id)}
+        res = self.req.post("/measurement/batch", json=payload, timeout=3)
+        result = self._result(res)
+        return result.data if result.ok else None
+
+    def _get_series_chunk(self, task_id: str, task_record_id: str, start_at: int, end_at: int,
+                          fields: Sequence[str]) -> dict:
         payload = {
-            "totalData": {
+            "series": {
                 "uri": "/api/measurement/query/v2",
                 "param": {
-                    "startAt": int(time.time() * 1000)-300000,
-                    "endAt": int(time.time() * 1000),
+                    "startAt": start_at,
+                    "endAt": end_at,
                     "samples": {
                         "data": {
-                            "endAt": int(time.time() * 1000),
-                            "fields": [
-                                "inputInsertTotal",
-                                "inputUpdateTotal",
-                                "inputDeleteTotal",
-                                "inputDdlTotal",
-                                "inputOthersTotal",
-                                "outputInsertTotal",
-                                "outputUpdateTotal",
-                                "outputDeleteTotal",
-                                "outputDdlTotal",
-                                "outputOthersTotal",
-                                "tableTotal",
-                                "createTableTotal",
-                                "snapshotTableTotal",
-                                "initialCompleteTime",
-                                "sourceConnection",
-                                "targetConnection",
-                                "snapshotDoneAt",
-                                "snapshotRowTotal",
-                                "snapshotInsertRowTotal",
-                                "inputQps",
-                                "outputQps",
-                                "currentSnapshotTableRowTotal",
-                                "currentSnapshotTableInsertRowTotal",
-                                "replicateLag",
-                                "snapshotStartAt",
-                                "snapshotTableTotal",
-                                "currentEventTimestamp",
-                                "snapshotDoneCost",
-                                "outputQpsMax",
-                                "outputQpsAvg",
-                                "lastFiveMinutesQps"
-                            ],
+                            "startAt": start_at,
+                            "endAt": end_at,
+                            "fields": list(fields),
                             "tags": {
                                 "taskId": task_id,
                                 "taskRecordId": task_record_id,
                                 "type": "task"
                             },
-                            "type": "instant",
+                            "type": "continuous",
                         }
                     }
                 }
             }
         }
-        res = self.req.post("/measurement/batch", json=payload, timeout=3)
-        return res.json()["data"] if res.status_code == 200 and res.json()["code"] == "ok" else None
-    
+        res = self.req.post("/measurement/batch", json=payload, timeout=30)
+        result = self._result(res)
+        if not result.ok:
+            return {}
+        rows = (((result.data or {}).get("series") or {}).get("data") or {}).get("samples", {}).get("data") or []
+        return rows[0] if rows else {}
+
+    def get_task_measurement_series(self, task_id: str, task_record_id: str, start_at: int, end_at: int,
+                                    fields: Sequence[str] = SERIES_FIELDS,
+                                    chunk_seconds: int = SERIES_CHUNK_SECONDS,
+                                    workers: int = SERIES_WORKERS) -> dict:
+        """
+        获取任务的历史指标序列, 长时间范围按 chunk_seconds 分段并发查询后按时间拼接
+        :param start_at: 开始时间(毫秒)
+        :param end_at: 结束时间(毫秒)
+        :param fields: 指标字段
+        :return: {"time": [...], 字段: [...]}, 按时间排序, 缺失的值为 None
+        """
+        step = chunk_seconds * 1000
+        ranges = [(begin, min(begin + step, end_at)) for begin in range(start_at, end_at, step)]
+        series = {"time": []}
+        series.update({field: [] for field in fields})
+        if not ranges:
+            return series
+        with ThreadPoolExecutor(max_workers=max(min(workers, len(ranges)), 1)) as pool:
+            chunks = list(pool.map(lambda r: self._get_series_chunk(task_id, task_record_id, r[0], r[1], fields),
+                                   ranges))
+        last = None
+        for chunk in chunks:
+            for k, at in enumerate(chunk.get("time") or []):
+                # 相邻分段的边界点可能重复
+                if last is not None and at <= last:
+                    continue
+                series["time"].append(at)
+                for field in fields:
+                    values = chunk.get(field) or []
+                    series[field].append(values[k] if k < len(values) else None)
+                last = at
+        return series
+
+    def get_task_record_ids(self, task_ids: list, refresh: bool = False) -> dict:
+        """
+        获取任务当前的 taskRecordId, 已知的直接从缓存返回, 其余通过一次 /Task 查询获取
+        :param task_ids: 任务 id 列表
+        :param refresh: 是否忽略缓存重新查询
+        :return: 任务 id -> taskRecordId, 没有运行记录的任务不返回
+        """
+        server = getattr(self.req, "server", None)
+        records = {}
+        if not refresh:
+            with _task_record_lock:
+                records = {i: _task_record_ids[(server, i)] for i in task_ids if (server, i) in _task_record_ids}
+        missing = [i for i in task_ids if i not in records]
+        if not missing:
+            return records
+        payload = {
+            "limit": len(missing),
+            "fields": {"id": True, "taskRecordId": True},
+            "where": {"id": {"in": missing}},
+        }
+        for task in self._iter_items("/Task", params={"filter": json.dumps(payload)}):
+            if task.get("taskRecordId"):
+                records[task["id"]] = task["taskRecordId"]
+        with _task_record_lock:
+            for task_id in missing:
+                if task_id in records:
+                    _task_record_ids[(server, task_id)] = records[task_id]
+                else:
+                    _task_record_ids.pop((server, task_id), None)
+        return records
+
+    def get_tasks_measurement(self, task_records: dict) -> dict:
+        """
+        一次 /measurement/batch 请求查询多个任务的最新指标, 每个任务是一个以任务 id 命名的子查询
+        :param task_records: 任务 id -> taskRecordId
+        :return: 任务 id -> 指标, 没有指标的任务为空字典
+        """
+        samples = {}
+        items = list(task_records.items())
+        for i in range(0, len(items), MEASUREMENT_BATCH_SIZE):
+            chunk = items[i:i + MEASUREMENT_BATCH_SIZE]
+            payload = {task_id: self._measurement_query(task_id, task_record_id) for task_id, task_record_id in chunk}
+            res = self.req.post("/measurement/batch", json=payload, timeout=3)
+            result = self._result(res)
+            data = (result.data if result.ok else None) or {}
+            for task_id, _ in chunk:
+                rows = ((data.get(task_id) or {}).get("data") or {}).get("samples", {}).get("data") or []
+                samples[task_id] = rows[0] if rows else {}
+        return samples
+
+    def get_tasks_metrics(self, task_ids: list) -> dict:
+        """
+        查询多个任务的最新指标, 通常只需要一到两次请求
+        taskRecordId 会被缓存; 任务重新启动后旧的 taskRecordId 查不到指标, 此时重新获取 taskRecordId 再查询一次
+        :param task_ids: 任务 id 列表
+        :return: 任务 id -> 指标, 没有运行记录的任务为 None
+        """
+        server = getattr(self.req, "server", None)
+        with _task_record_lock:
+            cached = {i for i in task_ids if (server, i) in _task_record_ids}
+        samples = self.get_tasks_measurement(self.get_task_record_ids(task_ids))
+        stale = [i for i in task_ids if i in cached and samples.get(i) == {}]
+        if stale:
+            samples.update(self.get_tasks_measurement(self.get_task_record_ids(stale, refresh=True)))
+        return {i: samples.get(i) for i in task_ids}
+
     def get_task_logs(self, level: str, limit: int, task_id: str, task_record_id: str, start: int, end: int) -> Tuple[list, bool]:
         """
         获取任务日志
@@ -277,7 +514,8 @@ class TaskApi(BaseBackendApi):
             "end": end
         }
         res = self.req.post("/MonitoringLogs/query", json=payload)
-        return res.json()["data"] if res.status_code == 200 and res.json()["code"] == "ok" else [], res.status_code == 200 and res.json()["code"] == "ok"
+        result = self._result(res)
+        return result.data if result.ok else [], result.ok
     
     def task_preview(self, task: dict) -> Tuple[dict, bool]:
         """
@@ -294,7 +532,8 @@ class TaskApi(BaseBackendApi):
                 1
             ]
         })
-        return res.json()["data"], res.status_code == 200 and res.json()["code"] == "ok"
+        result = self._result(res)
+        return result.body["data"], result.ok
     
     def preview_task(self, connection_id: str, table_name: str) -> requests.Response:
         res = self.req.post("/proxy/call", json={
@@ -305,4 +544,4 @@ class TaskApi(BaseBackendApi):
                 table_name
             ]
         })
-        return res.json()
+        return self._result(res).body
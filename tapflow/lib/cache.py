@@ -1,16 +1,542 @@
-client_cache = {
-    "tables": {
-    },
-    "apis": {
-        "name_index": {}
-    },
-    "apiserver": {
-        "name_index": {}
-    },
-    "connectors": {},
-    "default_sink": None
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from tapflow.lib.http_cache import register_invalidation_hook
+from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.trie import Trie
+
+INDEXES = ("name_index", "id_index", "number_index", "short_id_index")
+
+# 命令行中显示和输入的短 id 长度
+SHORT_ID_LEN = 6
+
+# 各类实体缓存的有效期(秒), 过期后下次访问时重新加载, None 表示不过期
+DEFAULT_TTLS = {
+    "connections": 300,
+    "jobs": 60,
+    "tables": 600,
+    "apis": 300,
+    "apiserver": None,
+    "connectors": 3600,
 }
 
+# 短 id 或名称有多个匹配时, 最多提示的候选数量
+MAX_CANDIDATES = 5
+
+# 加载失败后, 间隔一段时间再重试, 避免循环中反复请求
+LOAD_RETRY_INTERVAL = 5
+
+# 增量刷新只能发现新增和修改, 删除通过定期核对 id 发现, 间隔(秒)
+TOMBSTONE_INTERVAL = 300
+
+
+class EntityStore(dict):
+    """
+    一类实体(连接, 任务, 表, API)的缓存, name_index, id_index, number_index, short_id_index 四个索引同时维护
+
+    兼容原来的字典用法, 如 client_cache["jobs"]["name_index"][name];
+    设置了 loader 时, 首次访问索引或缓存过期后自动加载, 单个实体的变更通过 upsert/remove 更新, 不需要重新拉取全部数据
+
+    设置了 delta_loader 时, 过期后只拉取 last_updated 不早于水位线的实体, 刷新的开销与变更量相关, 与实体总数无关;
+    删除的实体由 count_loader/ids_loader 定期核对发现
+    """
+
+    def __init__(self, kind: str, name_key: str = "name", ttl: Optional[float] = None,
+                 loader: Callable[[], Iterable[dict]] = None,
+                 fetch_one: Callable[[str, str], Optional[dict]] = None,
+                 delta_loader: Callable[[str], Iterable[dict]] = None,
+                 count_loader: Callable[[], Optional[int]] = None,
+                 ids_loader: Callable[[], Iterable[str]] = None,
+                 watermark_key: str = "last_updated",
+                 tombstone_interval: Optional[float] = TOMBSTONE_INTERVAL):
+        """
+        :param kind: 实体类型, 如 connections
+        :param name_key: 作为名称索引的字段, 表为 original_name
+        :param ttl: 有效期(秒)
+        :param loader: 加载全部实体的函数
+        :param fetch_one: 按 (索引类型, 值) 加载单个实体的函数, 索引中找不到时调用
+        :param delta_loader: 加载 watermark_key 不早于给定水位线的实体的函数
+        :param count_loader: 返回服务端实体总数的函数, 与本地数量一致时跳过 id 核对
+        :param ids_loader: 返回服务端全部实体 id 的函数, 用于发现删除; 请求失败时返回 None
+        :param watermark_key: 水位线字段
+        :param tombstone_interval: 删除核对的间隔(秒), None 表示每次增量刷新都核对
+        """
+        super().__init__((index, {}) for index in INDEXES)
+        self.kind = kind
+        self.name_key = name_key
+        self.ttl = ttl
+        self.loader = loader
+        self.fetch_one = fetch_one
+        self.delta_loader = delta_loader
+        self.count_loader = count_loader
+        self.ids_loader = ids_loader
+        self.watermark_key = watermark_key
+        self.tombstone_interval = tombstone_interval
+        self.watermark = None
+        self.loaded_at = None
+        # 各类刷新的次数, 用于观察增量刷新的效果
+        self.stats = {"full": 0, "delta": 0, "delta_items": 0, "tombstone_checks": 0, "removed": 0}
+        self._tombstone_at = 0
+        self._next_number = 0
+        # 实体对象(id(item)) -> 序号, number_index 的反向索引, 更新和删除时不需要遍历 number_index
+        self._numbers: Dict[int, str] = {}
+        # 按后缀匹配 id(短 id)和按前缀匹配名称, 第一次使用时构建, 之后与索引同时维护
+        self._tries = None
+        self._retry_at = 0
+        self._loading = False
+        self._lock = threading.RLock()
+
+    def _index(self, index: str) -> dict:
+        return dict.__getitem__(self, index)
+
+    def __getitem__(self, key):
+        if key in INDEXES:
+            self.ensure_loaded()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in INDEXES:
+            self.ensure_loaded()
+        return dict.get(self, key, default)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def expired(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        return self.ttl is not None and time.time() - self.loaded_at > self.ttl
+
+    def ensure_loaded(self):
+        if self.loader is None or self._loading or not self.expired() or time.time() < self._retry_at:
+            return
+        with self._lock:
+            if self._loading or not self.expired():
+                return
+            self._loading = True
+            try:
+                self._refresh()
+            except Exception as e:
+                self._retry_at = time.time() + LOAD_RETRY_INTERVAL
+                logger.fdebug("load {} cache failed: {}", self.kind, e)
+            finally:
+                self._loading = False
+
+    def refresh(self, full: bool = False):
+        """
+        立即刷新, 已加载且支持增量时只拉取变更
+        :param full: 强制全量加载
+        """
+        with self._lock:
+            self._loading = True
+            try:
+                self._refresh(full)
+            finally:
+                self._loading = False
+
+    def _refresh(self, full: bool = False):
+        if full or self.delta_loader is None or not self.loaded or self.watermark is None:
+            self.replace(self.loader())
+            return
+        self.apply_delta(self.delta_loader(self.watermark))
+        if self.tombstone_interval is None or time.time() >= self._tombstone_at:
+            self.check_tombstones()
+
+    def apply_delta(self, items: Iterable[dict]) -> int:
+        """
+        合并增量拉取到的实体, 并推进水位线
+        :return: 变更的实体数量
+        """
+        count = 0
+        with self._lock:
+            for item in items or []:
+                if not isinstance(item, dict) or self.name_key not in item:
+                    continue
+                self.upsert(item)
+                self._advance_watermark(item)
+                count += 1
+            self.loaded_at = time.time()
+            self._retry_at = 0
+            self.stats["delta"] += 1
+            self.stats["delta_items"] += count
+        return count
+
+    def check_tombstones(self) -> int:
+        """
+        核对服务端的 id, 移除已经被删除的实体; 服务端总数与本地一致时不拉取 id
+        拉取 id 失败时跳过这次核对, 不能当作全部实体都已删除
+        :return: 移除的实体数量
+        """
+        if self.ids_loader is None:
+            return 0
+        self._tombstone_at = time.time() + (self.tombstone_interval or 0)
+        if self.count_loader is not None:
+            total = self.count_loader()
+            if total is not None and total == len(self._index("id_index")):
+                return 0
+        ids = self.ids_loader()
+        if ids is None:
+            logger.fdebug("skip tombstone check of {}, failed to load ids", self.kind)
+            return 0
+        self.stats["tombstone_checks"] += 1
+        alive = set(ids)
+        removed = [entity_id for entity_id in list(self._index("id_index")) if entity_id not in alive]
+        for entity_id in removed:
+            self.remove(entity_id)
+        self.stats["removed"] += len(removed)
+        return len(removed)
+
+    def _advance_watermark(self, item: dict):
+        # ISO 格式的时间字符串可以直接比较大小
+        value = item.get(self.watermark_key)
+        if value is not None and (self.watermark is None or value > self.watermark):
+            self.watermark = value
+
+    def items_list(self) -> list:
+        return list(self._index("id_index").values())
+
+    def replace(self, items: Iterable[dict]):
+        """
+        用全部实体重建索引
+        """
+        indexes = {index: {} for index in INDEXES}
+        numbers = {}
+        count = 0
+        watermark = None
+        for number, item in enumerate(items or []):
+            count = number + 1
+            if not isinstance(item, dict) or self.name_key not in item:
+                continue
+            self._add(indexes, numbers, item, str(number))
+            value = item.get(self.watermark_key)
+            if value is not None and (watermark is None or value > watermark):
+                watermark = value
+        with self._lock:
+            for index, values in indexes.items():
+                dict.__setitem__(self, index, values)
+            self._numbers = numbers
+            self._tries = None
+            self._next_number = count
+            self.watermark = watermark
+            self.loaded_at = time.time()
+            self._retry_at = 0
+            self._tombstone_at = self.loaded_at + (self.tombstone_interval or 0)
+            self.stats["full"] += 1
+
+    def _add(self, indexes: dict, numbers: dict, item: dict, number: str):
+        indexes["name_index"][item[self.name_key]] = item
+        if item.get("id") is not None:
+            indexes["id_index"][item["id"]] = item
+            indexes["short_id_index"][item["id"][-SHORT_ID_LEN:]] = item
+        indexes["number_index"][number] = item
+        numbers[id(item)] = number
+        if self._tries is not None:
+            self._tries[1].insert(str(item[self.name_key]), item)
+            if item.get("id") is not None:
+                self._tries[0].insert(item["id"], item)
+
+    def tries(self) -> tuple:
+        """
+        (id 后缀树, 名称前缀树)
+        """
+        tries = self._tries
+        if tries is None:
+            with self._lock:
+                if self._tries is None:
+                    # 深度 4 已经足够把短 id 分散到很小的范围内, 更深只会增加构建开销
+                    ids, names = Trie(reverse=True, depth=4), Trie(depth=4)
+                    for item in self._index("id_index").values():
+                        ids.insert(item["id"], item)
+                    for name, item in self._index("name_index").items():
+                        names.insert(str(name), item)
+                    self._tries = (ids, names)
+                tries = self._tries
+        return tries
+
+    def upsert(self, item: dict) -> dict:
+        """
+        新增或更新单个实体, 已存在时保留原来的序号
+        """
+        with self._lock:
+            indexes = {index: self._index(index) for index in INDEXES}
+            old = indexes["id_index"].get(item.get("id")) or indexes["name_index"].get(item.get(self.name_key))
+            number = None
+            if old is not None:
+                number = self._remove(indexes, old)
+            if number is None:
+                number = str(self._next_number)
+                self._next_number += 1
+            self._add(indexes, self._numbers, item, number)
+        return item
+
+    def _remove(self, indexes: dict, item: dict) -> Optional[str]:
+        if indexes["name_index"].get(item.get(self.name_key)) is item:
+            del indexes["name_index"][item[self.name_key]]
+            if self._tries is not None:
+                self._tries[1].remove(str(item[self.name_key]))
+        if item.get("id") is not None:
+            indexes["id_index"].pop(item["id"], None)
+            if self._tries is not None:
+                self._tries[0].remove(item["id"])
+            if indexes["short_id_index"].get(item["id"][-SHORT_ID_LEN:]) is item:
+                del indexes["short_id_index"][item["id"][-SHORT_ID_LEN:]]
+        number = self._numbers.pop(id(item), None)
+        if number is not None and indexes["number_index"].get(number) is item:
+            del indexes["number_index"][number]
+        return number
+
+    def remove(self, entity_id: str) -> Optional[dict]:
+        with self._lock:
+            indexes = {index: self._index(index) for index in INDEXES}
+            item = indexes["id_index"].get(entity_id)
+            if item is not None:
+                self._remove(indexes, item)
+            return item
+
+    def lookup(self, signature: str, index_type: str = None) -> Optional[dict]:
+        """
+        按签名查找实体, 索引中找不到时尝试通过 fetch_one 单独加载
+        :param signature: 名称, id, 短 id 或序号
+        :param index_type: 索引类型, 不指定时依次尝试 id, 名称, 短 id, 序号
+        """
+        self.ensure_loaded()
+        index_types = [index_type] if index_type else ["id_index", "name_index", "short_id_index", "number_index"]
+        for index in index_types:
+            if index == "short_id_index":
+                item = self.resolve_short_id(signature) if isinstance(signature, str) else None
+            else:
+                item = self._index(index).get(signature)
+            if item is not None:
+                return item
+        if self.fetch_one is not None:
+            for index in index_types:
+                if index not in ("id_index", "name_index"):
+                    continue
+                try:
+                    item = self.fetch_one(index, signature)
+                except Exception as e:
+                    logger.fdebug("fetch {} {} failed: {}", self.kind, signature, e)
+                    item = None
+                if item is not None:
+                    return self.upsert(item)
+        if "name_index" in index_types and isinstance(signature, str):
+            names = self.complete(signature)
+            if names:
+                logger.fwarn("{} {} not found, did you mean: {}", self.kind, signature, ", ".join(names))
+        return None
+
+    def match_short_id(self, short_id: str, limit: int = MAX_CANDIDATES) -> list:
+        """
+        以 short_id 结尾的完整 id, 最多返回 limit 个
+        """
+        return [key for key, _ in self.tries()[0].matches(short_id, limit)]
+
+    def resolve_short_id(self, short_id: str) -> Optional[dict]:
+        """
+        按短 id 查找实体, 有多个实体的 id 以 short_id 结尾时给出提示并返回 None, 不会返回其中任意一个
+        """
+        ids = self.tries()[0]
+        matched = ids.unique(short_id)
+        if matched is not None:
+            return matched[1]
+        if ids.count(short_id) > 1:
+            logger.fwarn("{} id {} is ambiguous, matches: {}, please use a longer id",
+                         self.kind, short_id, ", ".join(self.match_short_id(short_id)))
+        return None
+
+    def complete(self, prefix: str, limit: int = MAX_CANDIDATES) -> list:
+        """
+        以 prefix 开头的名称, 最多返回 limit 个
+        """
+        return sorted(key for key, _ in self.tries()[1].matches(prefix, limit))
+
+    def invalidate(self):
+        """
+        标记为过期, 下次访问时重新全量加载
+        """
+        self.loaded_at = None
+        self._retry_at = 0
+
+
+class TableCache(dict):
+    """
+    按连接 id 保存各个连接的表缓存, client_cache["tables"][connection_id]["name_index"]
+
+    client_cache["tables"]["id_index"] 返回所有已加载表的 id 索引
+    """
+
+    def __init__(self, ttl: Optional[float] = None, loader_factory: Callable[[str], Callable] = None):
+        super().__init__()
+        self.ttl = ttl
+        self.loader_factory = loader_factory
+
+    def store_for(self, connection_id: str) -> EntityStore:
+        store = dict.get(self, connection_id)
+        if store is None:
+            loader = self.loader_factory(connection_id) if self.loader_factory is not None else None
+            store = EntityStore("tables", name_key="original_name", ttl=self.ttl, loader=loader)
+            self[connection_id] = store
+        return store
+
+    def __missing__(self, key):
+        if key in INDEXES:
+            merged = {}
+            for store in list(self.values()):
+                if isinstance(store, EntityStore):
+                    merged.update(store._index(key))
+            return merged
+        return self.store_for(key)
+
+    def match_short_id(self, short_id: str, limit: int = MAX_CANDIDATES) -> list:
+        """
+        所有已加载的表中, id 以 short_id 结尾的完整 id
+        """
+        ids = []
+        for store in list(self.values()):
+            if isinstance(store, EntityStore):
+                ids.extend(store.match_short_id(short_id, limit - len(ids)))
+                if len(ids) >= limit:
+                    break
+        return ids
+
+    def invalidate(self, connection_id: str = None):
+        if connection_id is None:
+            self.clear()
+        else:
+            self.pop(connection_id, None)
+
+
+class KeyedStore(dict):
+    """
+    按键保存的缓存, 如按小写名称保存的 connector, 首次访问或过期后通过 loader 加载
+    """
+
+    def __init__(self, kind: str, ttl: Optional[float] = None, loader: Callable[[], Dict[str, dict]] = None):
+        super().__init__()
+        self.kind = kind
+        self.ttl = ttl
+        self.loader = loader
+        self.loaded_at = None
+        self._loading = False
+        self._retry_at = 0
+
+    def ensure_loaded(self):
+        if self.loader is None or self._loading or time.time() < self._retry_at:
+            return
+        if self.loaded_at is not None and (self.ttl is None or time.time() - self.loaded_at <= self.ttl):
+            return
+        self._loading = True
+        try:
+            self.replace(self.loader())
+        except Exception as e:
+            self._retry_at = time.time() + LOAD_RETRY_INTERVAL
+            logger.fdebug("load {} cache failed: {}", self.kind, e)
+        finally:
+            self._loading = False
+
+    def replace(self, mapping: Dict[str, dict]):
+        dict.clear(self)
+        dict.update(self, mapping or {})
+        self.loaded_at = time.time()
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key):
+            self.ensure_loaded()
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        if not dict.__contains__(self, key):
+            self.ensure_loaded()
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        if not dict.__contains__(self, key):
+            self.ensure_loaded()
+        return dict.get(self, key, default)
+
+    def invalidate(self):
+        self.loaded_at = None
+        self._retry_at = 0
+
+
+class ClientCache(dict):
+    """
+    客户端缓存, 保存连接, 任务, 表, API 和 connector, 以及当前使用的连接(connection)和默认目标(default_sink)
+    """
+
+    def __init__(self, ttls: dict = None):
+        super().__init__()
+        ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self["connections"] = EntityStore("connections", ttl=ttls["connections"])
+        self["jobs"] = EntityStore("jobs", ttl=ttls["jobs"])
+        self["tables"] = TableCache(ttl=ttls["tables"])
+        self["apis"] = EntityStore("apis", ttl=ttls["apis"])
+        self["apiserver"] = EntityStore("apiserver", ttl=ttls["apiserver"])
+        self["connectors"] = KeyedStore("connectors", ttl=ttls["connectors"])
+        self["default_sink"] = None
+
+    @property
+    def connections(self) -> EntityStore:
+        return self["connections"]
+
+    @property
+    def jobs(self) -> EntityStore:
+        return self["jobs"]
+
+    @property
+    def tables(self) -> TableCache:
+        return self["tables"]
+
+    @property
+    def apis(self) -> EntityStore:
+        return self["apis"]
+
+    @property
+    def connectors(self) -> KeyedStore:
+        return self["connectors"]
+
+    def invalidate(self, kind: str = None):
+        """
+        标记缓存过期, kind 为 None 时全部过期
+        """
+        for key in ([kind] if kind else ["connections", "jobs", "tables", "apis", "apiserver", "connectors"]):
+            store = self.get(key)
+            if hasattr(store, "invalidate"):
+                store.invalidate()
+
+
+def upsert_entity(cache: dict, kind: str, item: dict, name_key: str = "name") -> dict:
+    """
+    更新缓存中的单个实体, 还没有这类实体的缓存时创建 EntityStore
+    """
+    store = cache.get(kind)
+    if store is None:
+        store = cache[kind] = EntityStore(kind, name_key=name_key)
+    return store.upsert(item)
+
+
+def remove_entity(cache: dict, kind: str, entity_id: str):
+    store = cache.get(kind)
+    if store is not None:
+        store.remove(entity_id)
+
+
+def _on_data_changed(event: str, id: str = None, **context):
+    if not isinstance(client_cache, ClientCache):
+        return
+    if event == "datasource.delete" and id is not None:
+        client_cache.connections.remove(id)
+        client_cache.tables.invalidate(id)
+    elif event == "connection.load_schema" and id is not None:
+        client_cache.tables.invalidate(id)
+
+
+client_cache = ClientCache()
+register_invalidation_hook("datasource.delete", _on_data_changed)
+register_invalidation_hook("connection.load_schema", _on_data_changed)
+
 system_server_conf = {
     "api": "",
     "access_code": "",
@@ -20,4 +546,4 @@ system_server_conf = {
     "cookies": {},
     "ws_uri": "",
     "auth_param": ""
-}
\ No newline at end of file
+}
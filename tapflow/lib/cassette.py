@@ -0,0 +1,204 @@
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Union
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+from tapflow.lib.http_cache import build_response
+
+
+# 每次请求都会变化的字段, 不参与匹配
+VOLATILE_FIELDS = frozenset(("ts", "nonce", "sign", "signVersion", "accessKey", "editVersion"))
+
+# 回放时需要还原的响应头, 其余响应头不写入录像
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMissError(Exception):
+    """
+    回放模式下录像中找不到匹配的请求
+    """
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def _normalize_body(body):
+    if body is None:
+        return None
+    if isinstance(body, (bytes, str)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+    return json.dumps(_strip_volatile(body), sort_keys=True, separators=(",", ":"), default=str)
+
+
+def interaction_key(method: str, path: str, params: dict = None, body=None) -> str:
+    """
+    请求的匹配 key: 方法, 路径, 参数和请求体, 签名/时间戳/editVersion 等字段被去掉
+    :param method: 请求方法
+    :param path: 接口路径, 不含服务地址, 可以带查询字符串
+    :param params: 查询参数
+    :param body: json 请求体或原始 data
+    :return: str
+    """
+    # 写在 url 中的查询参数(如 /Task?filter=...)与 params 一样参与匹配
+    url = urlsplit(path)
+    merged = dict(parse_qsl(url.query, keep_blank_values=True))
+    merged.update(params or {})
+    params = {k: str(v) for k, v in _strip_volatile(merged).items()}
+    query = "&".join("{}={}".format(k, v) for k, v in sorted(params.items()))
+    body = _normalize_body(body)
+    return "{} {}?{}#{}".format(method.upper(), url.path, query, body or "")
+
+
+class Cassette:
+    """
+    后端请求的录像: 录制模式下记录每一次请求和响应, 回放模式下从录像中返回响应, 不访问网络
+
+    同一个请求被调用多次时(如轮询任务状态), 按录制顺序依次返回, 超出录制次数后重复返回最后一次响应
+
+    文件格式为 JSON, 路径以 .gz 结尾时使用 gzip 压缩
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, latency: Union[float, str] = 0):
+        """
+        :param path: 录像文件路径
+        :param mode: record 或 replay
+        :param latency: 回放时注入的延迟(秒), 传入 "recorded" 时使用录制时的实际耗时
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError("cassette mode must be record or replay, got {}".format(mode))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.interactions: Dict[str, List[dict]] = defaultdict(list)
+        self.plays = 0
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self.load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def load(self):
+        with self._open("r") as f:
+            data = json.load(f)
+        self.interactions = defaultdict(list)
+        for item in data.get("interactions", []):
+            self.interactions[item["key"]].append(item)
+        self._cursor = defaultdict(int)
+
+    def save(self):
+        with self._lock:
+            data = {
+                "version": 1,
+                "interactions": [item for items in self.interactions.values() for item in items],
+            }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._open("w") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    def record(self, method: str, path: str, kwargs: dict, response: requests.Response, elapsed: float):
+        """
+        记录一次请求
+        :param elapsed: 请求耗时(秒)
+        """
+        key = interaction_key(method, path, kwargs.get("params"), kwargs.get("json", kwargs.get("data")))
+        content = response.content or b""
+        try:
+            body, encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        item = {
+            "key": key,
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+            "body": body,
+            "encoding": encoding,
+            "elapsed": round(elapsed, 4),
+        }
+        with self._lock:
+            self.interactions[key].append(item)
+
+    def play(self, method: str, path: str, kwargs: dict) -> requests.Response:
+        """
+        从录像中返回请求的响应
+        :raise CassetteMissError: 录像中没有匹配的请求
+        """
+        key = interaction_key(method, path, kwargs.get("params"), kwargs.get("json", kwargs.get("data")))
+        with self._lock:
+            items = self.interactions.get(key)
+            if not items:
+                raise CassetteMissError("no recorded interaction for {}".format(key))
+            index = min(self._cursor[key], len(items) - 1)
+            self._cursor[key] += 1
+            self.plays += 1
+        item = items[index]
+        delay = item["elapsed"] if self.latency == "recorded" else self.latency
+        if delay:
+            time.sleep(delay)
+        if item["encoding"] == "base64":
+            content = base64.b64decode(item["body"])
+        else:
+            content = item["body"].encode("utf-8")
+        # 与真实响应一样可以流式读取, 列表接口的 _iter_items 可以直接回放
+        response = build_response(item["status"], item["headers"], content, "utf-8", path,
+                                  "OK" if item["status"] < 400 else "Error")
+        return response
+
+    def rewind(self):
+        """
+        回放游标回到开头, 同一份录像可以重复回放
+        """
+        with self._lock:
+            self._cursor = defaultdict(int)
+            self.plays = 0
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = REPLAY, latency: Union[float, str] = 0, session=None):
+    """
+    在代码块内录制或回放后端请求, 录制模式退出时写入文件
+
+        with use_cassette("job_save.json.gz", mode="record"):
+            p.save()
+
+    :param session: RequestSession, 默认为全局的 req
+    """
+    if session is None:
+        from tapflow.lib.request import req as session
+    cassette = Cassette(path, mode=mode, latency=latency)
+    previous = session.cassette
+    session.cassette = cassette
+    try:
+        yield cassette
+    finally:
+        session.cassette = previous
+        if cassette.recording:
+            cassette.save()
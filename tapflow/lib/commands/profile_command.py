@@ -0,0 +1,31 @@
+from IPython.core.magic import Magics, magics_class, line_magic
+
+from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.profiler import profiler
+
+
+@magics_class
+class ProfileCommand(Magics):
+    @line_magic
+    def profile(self, line):
+        """
+        %profile              显示接口延迟统计和最近的操作耗时
+        %profile reset        清空统计
+        %profile json <path>  导出 JSON
+        """
+        args = line.split()
+        if len(args) == 0:
+            for l in profiler.report():
+                print(l)
+            return
+        if args[0] == "reset":
+            profiler.reset()
+            return
+        if args[0] == "json":
+            if len(args) < 2:
+                print(profiler.to_json())
+                return
+            profiler.to_json(args[1])
+            logger.info("profile saved to {}", args[1])
+            return
+        logger.warn("unknown profile command: {}, usage: %profile [reset | json <path>]", args[0])
@@ -304,7 +304,7 @@ class ShowCommand(Magics):
         table_id = ""
         index_type = get_index_type(line)
         if index_type == "short_id_index":
-            line = match_line(client_cache["tables"]["id_index"], line)
+            line = match_line(client_cache["tables"], line)
             index_type = "id_index"
         if index_type == "id_index":
             table_id = line
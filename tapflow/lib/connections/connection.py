@@ -2,15 +2,16 @@ import json
 import threading
 import time
 import asyncio
-import websockets
 
 from tapflow.lib.backend_apis.connections import ConnectionsApi
 from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
 from tapflow.lib.help_decorator import help_decorate
 from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.profiler import profiler, traced
 
 from tapflow.lib.cache import client_cache, system_server_conf
-from tapflow.lib.op_object import show_tables, get_index_type, match_line, show_connections
+from tapflow.lib.http_cache import notify
+from tapflow.lib.op_object import show_tables, get_index_type, match_line, show_connections, cache_connection
 from tapflow.lib.utils.ws import gen_ws_uri_with_id
 from tapflow.lib.request import req
 
@@ -35,14 +36,14 @@ def get_table_fields(t, whole=False, source=None, cache=True):
     index_type = get_index_type(t)
     if index_type == "short_id_index":
         try:
-            t = match_line(client_cache["tables"]["id_index"], t)
+            t = match_line(client_cache["tables"], t)
             index_type = "id_index"
         except KeyError as e:
             logger.warn("table {} not find in system", t)
             return
     if index_type == "id_index":
         table_id = t
-    if client_cache["tables"].get(t) is None:
+    if client_cache["tables"].get(source) is None:
         show_tables(quiet=True, source=source)
 
     table = client_cache["tables"][source][index_type].get(t, None)
@@ -88,7 +89,7 @@ def desc_table(line, quiet=True):
         line = line.split(".")[1]
     index_type = get_index_type(db)
     if index_type == "short_id_index":
-        db = match_line(client_cache["connections"]["id_index"], db)
+        db = match_line(client_cache["connections"], db)
         index_type = "id_index"
     if index_type == "id_index":
         client_cache["connection"] = db
@@ -144,10 +145,11 @@ class Connection:
     def save(self):
         # self.load_schema(quiet=False)
         res = self.connections_api.save_connection(self.c)
-        show_connections(quiet=True)
+        notify("datasource.save", id=self.c.get("id"))
         if res.status_code == 200 and res.json()["code"] == "ok":
             self.id = res.json()["data"]["id"]
             self.c = Connection.get(self.id)
+            cache_connection(self.c)
             self.load_schema(quiet=True)
             return True
         else:
@@ -156,6 +158,7 @@ class Connection:
 
     def delete(self):
         res = ConnectionsApi(req).delete_connection(self.id)
+        notify("datasource.delete", id=self.id)
         if res:
             # logger.finfo("delete {} Connection success", self.id)
             return True
@@ -194,6 +197,7 @@ class Connection:
     def test(self):
         return self.load_schema()
 
+    @traced("Connection.load_schema")
     def load_schema(self, quiet=True):
         # global global_load_schema_q
         global_lock.acquire(timeout=60)
@@ -207,6 +211,7 @@ class Connection:
         res = True
 
         async def load():
+            import websockets
             async with websockets.connect(gen_ws_uri_with_id()) as websocket:
                 data = self.c
                 data["database_password"] = self.c.get("plain_password")
@@ -254,7 +259,8 @@ class Connection:
 
         while True:
             try:
-                time.sleep(1)
+                with profiler.sleeping():
+                    time.sleep(1)
                 res = self.connections_api.get_connection_by_id(self.id)
                 if res["data"] is None:
                     break
@@ -272,5 +278,7 @@ class Connection:
         except Exception as e:
             print(__file__, e)
             pass
-        time.sleep(20)
+        notify("connection.load_schema", id=self.id)
+        with profiler.sleeping():
+            time.sleep(20)
         return res
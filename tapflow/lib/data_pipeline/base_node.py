@@ -100,7 +100,7 @@ class BaseNode:
         if not isinstance(connection, Connection):
             index_type = get_index_type(connection)
             if index_type == "short_id_index":
-                connection = match_line(client_cache["connections"]["id_index"], connection)
+                connection = match_line(client_cache["connections"], connection)
                 index_type = "id_index"
             if index_type == "name_index" and "." in connection:
                 connection_and_table = connection.split(".")
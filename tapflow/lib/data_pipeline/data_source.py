@@ -8,11 +8,13 @@ from requests import delete
 from tapflow.lib.backend_apis.common import AgentApi
 from tapflow.lib.backend_apis.dataSource import DataSourceApi
 from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.profiler import profiler, traced
 from tapflow.lib.check import ConfigCheck
 from tapflow.lib.help_decorator import help_decorate
 from tapflow.lib.params.datasource import pdk_config, DATASOURCE_CONFIG
 
 from tapflow.lib.cache import client_cache
+from tapflow.lib.http_cache import notify
 from tapflow.lib.system.ext_storage import get_default_external_storage_id
 from tapflow.lib.request import req
 from tapflow.lib.utils.datasource_field_map import reverse_datasource_field_map
@@ -208,6 +210,7 @@ class DataSource:
                 return data["items"][0]
         return None
 
+    @traced("DataSource.save")
     def save(self):
         # check agent running
         if req.mode == "cloud":
@@ -227,12 +230,12 @@ class DataSource:
         else:
             logger.info("datasource {} creating, please wait...", self.setting.get("name"))
             data, ok = DataSourceApi(req).create_data_source(data)
-
-        from tapflow.lib.op_object import show_connections
-        show_connections(quiet=True)
+        notify("datasource.save", id=data.get("id") if ok else None)
         if ok:
+            from tapflow.lib.op_object import cache_connection
             self.id = data["id"]
             self.setting = DataSource.get(self.id)
+            cache_connection(self.setting)
             logger.info("save datasource {} success, will load schema, please wait...", self.setting.get("name"))
             self.validate(quiet=False, load_schema=True)
             return True
@@ -245,6 +248,7 @@ class DataSource:
         if self.id is None:
             return False
         data, ok = DataSourceApi(req).delete_data_source(self.id)
+        notify("datasource.delete", id=self.id)
         if ok:
             #logger.finfo("delete {} Connection success", self.id)
             return True
@@ -253,6 +257,7 @@ class DataSource:
         return False
 
     @help_decorate("validate this datasource")
+    @traced("DataSource.validate")
     def validate(self, quiet=False, load_schema=False):
         res = True
         # save 的时候后端会自动加载模型，没有必要再通过WS再触发一次；直接通过http验证Connection进度和状态即可。
@@ -313,7 +318,8 @@ class DataSource:
         if self.id is not None:
             for _ in range(96):
                 try:
-                    time.sleep(5)
+                    with profiler.sleeping():
+                        time.sleep(5)
                     data, ok = DataSourceApi(req).get_data_source(self.id)
                     if not ok:
                         logger.fwarn("No data on load schema response")
@@ -8,12 +8,22 @@ from tapflow.lib.backend_apis.common import AgentApi
 from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
 from tapflow.lib.request import req
 from tapflow.lib.cache import system_server_conf
+from tapflow.lib.http_cache import notify
 
 from tapflow.lib.help_decorator import help_decorate
 from tapflow.lib.utils.log import logger
-from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.utils.lttb import lttb
+from tapflow.lib.utils.profiler import profiler, traced
+from tapflow.lib.backend_apis.task import SERIES_FIELDS, TaskApi
 from tapflow.lib.graph import Node, Graph
-from tapflow.lib.cache import client_cache
+from tapflow.lib.cache import client_cache, upsert_entity
+from tapflow.lib.task_events import task_events
+from tapflow.lib.data_pipeline.job_history import OUTPUT_FIELDS, JobStatsHistory, job_history
+from tapflow.lib.data_pipeline.lag_sketch import DEFAULT_QUANTILES, as_slo, lag_sketch, quantiles
+from tapflow.lib.data_pipeline.phase_profiler import phase_profiler
+
+# cdc_qps 计算速率时使用最近多少秒的采样
+CDC_QPS_WINDOW = 30
 
 
 class JobStats:
@@ -36,6 +46,49 @@ class JobStats:
     table_total = 0
     snapshot_table_total = 0
     last_five_minutes_qps = 0
+    snapshot_insert_row_total = 0
+    current_snapshot_table_row_total = 0
+    current_snapshot_table_insert_row_total = 0
+    snapshot_done_cost = 0
+
+    @classmethod
+    def from_measurement(cls, stats: dict) -> "JobStats":
+        """
+        :param stats: /measurement/batch 返回的一条指标
+        """
+        job_stats = cls()
+        job_stats.qps = stats.get("outputQps", 0)
+        job_stats.total = stats.get("tableTotal", 0)
+        job_stats.input_insert = stats.get("inputInsertTotal", 0)
+        job_stats.input_update = stats.get("inputUpdateTotal", 0)
+        job_stats.input_delete = stats.get("inputDeleteTotal", 0)
+        job_stats.output_insert = stats.get("outputInsertTotal", 0)
+        job_stats.output_update = stats.get("outputUpdateTotal", 0)
+        job_stats.output_Delete = stats.get("outputDeleteTotal", 0)
+        job_stats.snapshot_done_at = stats.get("snapshotDoneAt", 0)
+        job_stats.snapshot_start_at = stats.get("snapshotStartAt", 0)
+        job_stats.input_qps = stats.get("inputQps", 0)
+        job_stats.output_qps = stats.get("outputQps", 0)
+        job_stats.output_qps_avg = stats.get("outputQpsAvg", 0)
+        job_stats.output_qps_max = stats.get("outputQpsMax", 0)
+        job_stats.snapshot_row_total = stats.get("snapshotRowTotal", 0)
+        job_stats.replicate_lag = stats.get("replicateLag", 0)
+        job_stats.table_total = stats.get("tableTotal", 0)
+        job_stats.snapshot_table_total = stats.get("snapshotTableTotal", 0)
+        job_stats.last_five_minutes_qps = stats.get("lastFiveMinutesQps", 0)
+        job_stats.snapshot_insert_row_total = stats.get("snapshotInsertRowTotal", 0)
+        job_stats.current_snapshot_table_row_total = stats.get("currentSnapshotTableRowTotal", 0)
+        job_stats.current_snapshot_table_insert_row_total = stats.get("currentSnapshotTableInsertRowTotal", 0)
+        job_stats.snapshot_done_cost = stats.get("snapshotDoneCost", 0)
+        return job_stats
+
+
+def _record_stats(job_id, job_stats: JobStats):
+    """
+    记录一次采样: 统计历史和增量延迟分布
+    """
+    job_history(job_id).append(job_stats)
+    lag_sketch(job_id).add(job_stats.replicate_lag)
 
 
 class JobType:
@@ -113,6 +166,31 @@ class Job:
             jobs.append(Job(id=i["id"]))
         return jobs
 
+    @staticmethod
+    def stats_many(jobs) -> dict:
+        """
+        一次查询多个任务的统计, 所有任务的指标合并到一次 /measurement/batch 请求中
+        :param jobs: Job 或任务 id 的列表
+        :return: 任务 id -> JobStats, 没有运行记录的任务为 None
+        """
+        ids = [getattr(job, "id", job) for job in jobs]
+        metrics = TaskApi(req).get_tasks_metrics([i for i in ids if i is not None])
+        result = {}
+        for task_id, measurement in metrics.items():
+            result[task_id] = None
+            if measurement is not None:
+                result[task_id] = JobStats.from_measurement(measurement)
+                if measurement:
+                    _record_stats(task_id, result[task_id])
+        return result
+
+    @property
+    def history(self) -> JobStatsHistory:
+        """
+        stats() 和 stats_many() 得到的统计采样
+        """
+        return job_history(self.id)
+
     def reset(self, quiet=True):
         status = self.status()
         if status in ["running"]:
@@ -161,20 +239,17 @@ class Job:
         if self.id is None:
             return False
         self.task_api.stop_task(self.id, force)
-        s = time.time()
-        while True:
-            if time.time() - s > t:
-                if not quiet:
-                    logger.warn("{}", "Task stopped failed")
-                return False
-            time.sleep(1)
-            status = self.status()
-            if status in [JobStatus.stop, JobStatus.wait_run, JobStatus.error]:
-                if not quiet:
-                    logger.info("{}", "Task stopped successfully")
-                return True
-            if status == JobStatus.stopping and not sync:
-                return True
+        stopped = [JobStatus.stop, JobStatus.wait_run, JobStatus.error]
+        with task_events.watch(self.id) as watch:
+            task = watch.wait_for(lambda task: task.get("status") in stopped or
+                                  (not sync and task.get("status") == JobStatus.stopping), t)
+        if task is None:
+            if not quiet:
+                logger.warn("{}", "Task stopped failed")
+            return False
+        if task["status"] in stopped and not quiet:
+            logger.info("{}", "Task stopped successfully")
+        return True
 
     def delete(self, quiet=True):
         if self.id is None:
@@ -198,9 +273,7 @@ class Job:
         if not ok:
             logger.warn("{}", "Task copy failed")
             return False
-        client_cache["jobs"]["id_index"][task["id"]] = task
-        client_cache["jobs"]["name_index"][task["name"]] = task
-        client_cache["jobs"]["number_index"][str(len(client_cache["jobs"]["number_index"]))] = task
+        upsert_entity(client_cache, "jobs", task)
         copy_id = task["id"]
         job = Job(id=copy_id)
         job.name = task["name"]
@@ -227,16 +300,9 @@ class Job:
         if heartbeat_id is None:
             raise ValueError("Heartbeat task id is None")
 
-        begin_time = time.time()
-        heartbeat_job = Job(id=heartbeat_id)
-        while True:
-            last_status = heartbeat_job.status()
-            if last_status == status:
-                return
-            if time.time() - begin_time > timeout:
-                raise TimeoutError("Wait heartbeat task status timeout, current status: %s" % last_status)
-            logger.finfo("Wait heartbeat {} to status {} re-check after {} seconds", last_status, status, interval)
-            time.sleep(interval)
+        with task_events.watch(heartbeat_id, interval=interval) as watch:
+            if watch.wait_for(lambda task: task.get("status") == status, timeout) is None:
+                raise TimeoutError("Wait heartbeat task status timeout, current status: %s" % watch.task.get("status"))
 
     def log_cache_id(self):
         if self.id is None:
@@ -247,6 +313,7 @@ class Job:
                 return relation["id"]
         return None
 
+    @traced("Job.save")
     def save(self):
         final_dag = None
         try:
@@ -361,12 +428,14 @@ class Job:
 
                                 task, ok = self.task_api.update_task(payload)
 
-                                time.sleep(10)
+                                with profiler.sleeping():
+                                    time.sleep(10)
 
                                 node["tableName"] = old_table_name
 
                                 task, ok = self.task_api.update_task(payload)
-                                time.sleep(10)
+                                with profiler.sleeping():
+                                    time.sleep(10)
                                 break
                         schema = MetadataInstanceApi(req).load_schema(s.id)
                         node_schema = []
@@ -400,13 +469,17 @@ class Job:
         except Exception as e:
             pass
         data, ok = self.task_api.confirm_task(self.id, self.job)
+        notify("job.save", id=self.id)
         if not ok:
             logger.warn("save failed {}", data)
             return False
         self.job = data
         self.setting = data
+        if isinstance(data, dict) and data.get("id") and data.get("name"):
+            upsert_entity(client_cache, "jobs", data)
         return True
 
+    @traced("Job.start")
     def start(self, quiet=True, env={}):
         if env is not None and len(env) > 0:
             self.env = env
@@ -428,7 +501,8 @@ class Job:
             logger.fwarn("save job fail")
             return False
         # 等推演, 10s
-        time.sleep(3)
+        with profiler.sleeping():
+            time.sleep(3)
         data, ok = self.task_api.start_task(self.id)
         if not ok:
             if not quiet:
@@ -440,6 +514,8 @@ class Job:
                 return False
         except Exception as e:
             pass
+        # 跟踪到启动完成, 不需要调用方等待也能记录完整的里程碑时间线
+        phase_profiler.track(self.id)
         if not quiet:
             logger.info("{}", "Task start succeed")
         return True
@@ -476,39 +552,94 @@ class Job:
         return step
 
     def wait_milestone_to_step(self, step=MilestoneStep.CDC, timeout=30, interval=2):
-        begin_time = time.time()
-        while True:
-            current_step = self.get_milestone_step()
-            if step == current_step:
-                return
-            if time.time() - begin_time > timeout:
-                raise TimeoutError("Wait task milestone step timeout, current milestone step: %s" % current_step)
-            logger.finfo("Wait milestone {} to {}, re-check after {} seconds", current_step.value, step.value, interval)
-            time.sleep(interval)
+        waiting = [JobStatus.running, JobStatus.scheduled, JobStatus.wait_run]
+        with task_events.watch(self.id, interval=interval) as watch:
+            task = watch.wait_for(lambda task: task.get("status") not in waiting or
+                                  task.get("syncStatus") == step.value, timeout)
+            if task is None:
+                raise TimeoutError("Wait task milestone step timeout, current milestone step: %s"
+                                   % watch.task.get("syncStatus"))
+        if task.get("status") not in waiting:
+            raise ValueError(f"Task status error: {task.get('status')}")
 
     def full_qps(self):
-        full_qps = 0
-        for i in range(5):
-            stats = self.stats()
-            if stats.snapshot_done_at == 0 and stats.replicate_lag > 0:
-                stats.snapshot_done_at = int(time.time()) * 1000
-            full_qps = int(stats.snapshot_row_total / (stats.snapshot_done_at - stats.snapshot_start_at + 1) * 1000)
-            if full_qps > 0:
-                return full_qps
-            time.sleep(2)
-        if full_qps == 0:
-            stats = self.stats()
-            return stats.output_qps_avg
-        return full_qps
+        stats = self.stats()
+        if stats is None:
+            return 0
+        if stats.snapshot_done_at == 0 and stats.replicate_lag > 0:
+            stats.snapshot_done_at = int(time.time()) * 1000
+        full_qps = int(stats.snapshot_row_total / (stats.snapshot_done_at - stats.snapshot_start_at + 1) * 1000)
+        if full_qps > 0:
+            return full_qps
+        # 全量统计还没有时间信息时, 用历史采样中全量行数的增速
+        rate = self.history.rate("snapshot_row_total")
+        if rate:
+            return int(rate)
+        return stats.output_qps_avg
 
     def cdc_qps(self):
         stats = self.stats()
+        if stats is None:
+            return 0
+        # 最近的采样足够时, 用写入累计值的增速, 否则用服务端上报的 qps
+        rate = self.history.rate(OUTPUT_FIELDS, CDC_QPS_WINDOW)
+        if rate is not None:
+            return rate
         input_qps = stats.input_qps
         output_qps = stats.output_qps
         if output_qps > 0:
             return output_qps
         return input_qps
 
+    def lag_quantiles(self, window=600, qs=DEFAULT_QUANTILES):
+        """
+        最近 window 秒内采样到的增量延迟分位数(毫秒), 例如 {"p50": ..., "p95": ..., "p99": ...}
+        """
+        return quantiles(lag_sketch(self.id).sketch(window), qs)
+
+    def check_lag_slo(self, slo):
+        """
+        :param slo: LagSLO 或其文本, 例如 "p99 lag < 5s over 10m"
+        :return: SLOResult, 可以直接作为布尔值使用
+        """
+        return as_slo(slo).check(lag_sketch(self.id))
+
+    def phase_timeline(self):
+        """
+        最近一次启动的里程碑时间线(PhaseTimeline), 包含每个阶段的开始结束时间和耗时; 没有观察到时为 None
+        """
+        return phase_profiler.timeline(self.id)
+
+    def metrics_series(self, start=None, end=None, fields=SERIES_FIELDS, points=1000):
+        """
+        获取历史指标序列, 每个字段用 LTTB 降采样到不超过 points 个点, 便于查看和绘制很长时间范围的数据
+        :param start: 开始时间(秒), 默认为 end 之前一小时
+        :param end: 结束时间(秒), 默认为当前时间
+        :param fields: 指标字段, 默认为 inputQps, outputQps, replicateLag
+        :param points: 每个字段最多保留的点数
+        :return: {字段: [(时间(毫秒), 值), ...]}, 没有运行记录时返回 None
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        # 任务每次启动都会生成新的 taskRecordId, 缓存的可能属于上一次运行, 这里重新查询
+        task_record_id = self.task_api.get_task_record_ids([self.id], refresh=True).get(self.id)
+        if task_record_id is None:
+            return None
+        series = self.task_api.get_task_measurement_series(self.id, task_record_id, int(start * 1000),
+                                                           int(end * 1000), fields)
+        result = {}
+        for field in fields:
+            pairs = [(t, v) for t, v in zip(series["time"], series[field]) if v is not None]
+            times, values = lttb([t for t, _ in pairs], [v for _, v in pairs], points)
+            result[field] = list(zip(times, values))
+        return result
+
+    def lag_trend(self, window=300):
+        """
+        最近 window 秒内增量延迟的变化趋势(毫秒/秒), 大于 0 表示延迟在增加, 采样不足时返回 None
+        """
+        return self.history.trend("replicate_lag", window)
+
     def delay(self):
         stats = self.stats()
         return stats.replicate_lag
@@ -569,29 +700,8 @@ class Job:
         job_stats = JobStats()
         try:
             if len(measurement["totalData"]["data"]["samples"]["data"]) > 0:
-                stats = measurement["totalData"]["data"]["samples"]["data"][0]
-                job_stats.qps = stats.get("outputQps", 0)
-                job_stats.total = stats.get("tableTotal", 0)
-                job_stats.input_insert = stats.get("inputInsertTotal", 0)
-                job_stats.input_update = stats.get("inputUpdateTotal", 0)
-                job_stats.input_delete = stats.get("inputDeleteTotal", 0)
-                job_stats.output_insert = stats.get("outputInsertTotal", 0)
-                job_stats.output_update = stats.get("outputUpdateTotal", 0)
-                job_stats.output_Delete = stats.get("outputDeleteTotal", 0)
-                job_stats.snapshot_done_at = stats.get("snapshotDoneAt", 0)
-                job_stats.snapshot_start_at = stats.get("snapshotStartAt", 0)
-                job_stats.input_qps = stats.get("inputQps", 0)
-                job_stats.output_qps = stats.get("outputQps", 0)
-                job_stats.output_qps_avg = stats.get("outputQpsAvg", 0)
-                job_stats.output_qps_max = stats.get("outputQpsMax", 0)
-                job_stats.snapshot_row_total = stats.get("snapshotRowTotal", 0)
-                job_stats.replicate_lag = stats.get("replicateLag", 0)
-                job_stats.output_qps_avg = stats.get("outputQpsAvg", 0)
-                job_stats.output_qps_max = stats.get("outputQpsMax", 0)
-                job_stats.snapshot_row_total = stats.get("snapshotRowTotal", 0)
-                job_stats.table_total = stats.get("tableTotal", 0)
-                job_stats.snapshot_table_total = stats.get("snapshotTableTotal", 0)
-                job_stats.last_five_minutes_qps = stats.get("lastFiveMinutesQps", 0)
+                job_stats = JobStats.from_measurement(measurement["totalData"]["data"]["samples"]["data"][0])
+                _record_stats(self.id, job_stats)
         except Exception as e:
             print(__file__, e)
             pass
@@ -663,6 +773,12 @@ class Job:
         return nodeResult
 
     def wait(self, print_log=False, t=600):
+        if not print_log:
+            # 不需要打印统计时只关心状态, 由推送或批量轮询通知状态变化
+            with task_events.watch(self.id) as watch:
+                watch.wait_for(lambda task: task.get("status") not in
+                               [JobStatus.running, JobStatus.edit, JobStatus.scheduled], t)
+            return
         start_time = time.time()
         while True:
             if time.time() - start_time > t:
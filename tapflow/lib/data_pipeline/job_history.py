@@ -0,0 +1,259 @@
+import csv
+import io
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Union
+
+# 保存的 JobStats 字段
+STATS_FIELDS = (
+    "qps",
+    "total",
+    "input_insert",
+    "input_update",
+    "input_delete",
+    "output_insert",
+    "output_update",
+    "output_Delete",
+    "snapshot_done_at",
+    "snapshot_start_at",
+    "snapshot_row_total",
+    "input_qps",
+    "output_qps",
+    "output_qps_avg",
+    "output_qps_max",
+    "replicate_lag",
+    "table_total",
+    "snapshot_table_total",
+    "last_five_minutes_qps",
+    "snapshot_insert_row_total",
+    "current_snapshot_table_row_total",
+    "current_snapshot_table_insert_row_total",
+    "snapshot_done_cost",
+)
+
+# 只增不减的累计值, 任务重置后会从 0 重新开始
+COUNTER_FIELDS = ("input_insert", "input_update", "input_delete", "output_insert", "output_update", "output_Delete",
+                  "snapshot_row_total", "snapshot_insert_row_total")
+
+INPUT_FIELDS = ("input_insert", "input_update", "input_delete")
+OUTPUT_FIELDS = ("output_insert", "output_update", "output_Delete")
+
+# 每个任务保留的采样数, 每 5 秒采样一次时约为 1 小时
+DEFAULT_CAPACITY = 720
+
+# 字段名, 或多个字段之和
+Field = Union[str, Sequence[str]]
+
+
+class JobStatsHistory:
+    """
+    一个任务的 JobStats 采样, 按列保存在定长的环形数组中, 写满后覆盖最早的采样
+
+    速率, 滑动平均和趋势都在保留的采样上按列计算, 不需要重新请求或等待
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        :param capacity: 保留的最大采样数
+        """
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._columns = {field: array("d", bytes(8 * capacity)) for field in STATS_FIELDS}
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, stats, at: float = None):
+        """
+        添加一条采样
+        :param stats: JobStats
+        :param at: 采样时间(秒), 默认为当前时间
+        """
+        at = time.time() if at is None else at
+        with self._lock:
+            if self._size < self.capacity:
+                i = (self._start + self._size) % self.capacity
+                self._size += 1
+            else:
+                i = self._start
+                self._start = (self._start + 1) % self.capacity
+            self._times[i] = at
+            for field, column in self._columns.items():
+                column[i] = float(getattr(stats, field, 0) or 0)
+
+    def _positions(self, window: float = None, last: int = None) -> List[int]:
+        """
+        按时间顺序返回采样在数组中的位置
+        :param window: 只返回最近 window 秒内的采样
+        :param last: 只返回最近 last 条采样
+        """
+        positions = [(self._start + k) % self.capacity for k in range(self._size)]
+        if last is not None:
+            positions = positions[-last:] if last > 0 else []
+        if window is not None and positions:
+            since = self._times[positions[-1]] - window
+            positions = [i for i in positions if self._times[i] >= since]
+        return positions
+
+    def _column(self, field: Field, positions: List[int]) -> List[float]:
+        if isinstance(field, str):
+            column = self._columns[field]
+            return [column[i] for i in positions]
+        columns = [self._columns[f] for f in field]
+        return [sum(column[i] for column in columns) for i in positions]
+
+    def times(self, window: float = None) -> List[float]:
+        with self._lock:
+            return [self._times[i] for i in self._positions(window)]
+
+    def values(self, field: Field, window: float = None) -> List[float]:
+        """
+        :param field: 字段名, 或多个字段(取和)
+        :param window: 只返回最近 window 秒内的采样
+        """
+        with self._lock:
+            return self._column(field, self._positions(window))
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """
+        :return: 最近一条采样, 包含 timestamp 和各个字段
+        """
+        with self._lock:
+            if self._size == 0:
+                return None
+            i = (self._start + self._size - 1) % self.capacity
+            sample = {"timestamp": self._times[i]}
+            sample.update({field: column[i] for field, column in self._columns.items()})
+            return sample
+
+    def _deltas(self, field: Field, positions: List[int]) -> List[float]:
+        """
+        相邻采样的增量, 累计值变小(任务重置)时按从 0 重新开始计算
+        """
+        values = self._column(field, positions)
+        return [b - a if b >= a else b for a, b in zip(values, values[1:])]
+
+    def rates(self, field: Field, window: float = None) -> List[float]:
+        """
+        相邻采样之间累计值的每秒增量
+        """
+        with self._lock:
+            positions = self._positions(window)
+            times = [self._times[i] for i in positions]
+            deltas = self._deltas(field, positions)
+        return [d / (t1 - t0) if t1 > t0 else 0.0 for d, t0, t1 in zip(deltas, times, times[1:])]
+
+    def rate(self, field: Field, window: float = None) -> Optional[float]:
+        """
+        保留窗口内累计值的平均每秒增量
+        :return: 少于两条采样时返回 None
+        """
+        with self._lock:
+            positions = self._positions(window)
+            if len(positions) < 2:
+                return None
+            elapsed = self._times[positions[-1]] - self._times[positions[0]]
+            increase = sum(self._deltas(field, positions))
+        return increase / elapsed if elapsed > 0 else None
+
+    def moving_average(self, field: Field, n: int = 5, window: float = None) -> List[float]:
+        """
+        最近 n 条采样的滑动平均, 结果与采样一一对应, 开头不足 n 条时取已有采样的平均
+        """
+        values = self.values(field, window)
+        averages, total = [], 0.0
+        for k, value in enumerate(values):
+            total += value
+            if k >= n:
+                total -= values[k - n]
+            averages.append(total / min(k + 1, n))
+        return averages
+
+    def trend(self, field: Field, window: float = None) -> Optional[float]:
+        """
+        字段随时间变化的趋势, 用最小二乘拟合的斜率(每秒变化量)表示, 例如增量延迟是在增加还是减少
+        :return: 少于两条采样时返回 None
+        """
+        with self._lock:
+            positions = self._positions(window)
+            times = [self._times[i] for i in positions]
+            values = self._column(field, positions)
+        if len(times) < 2:
+            return None
+        mean_t = sum(times) / len(times)
+        mean_v = sum(values) / len(values)
+        var = sum((t - mean_t) ** 2 for t in times)
+        if var == 0:
+            return None
+        return sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / var
+
+    def idle(self, field: Field, intervals: int) -> bool:
+        """
+        最近 intervals 个采样间隔内累计值是否都没有变化
+        """
+        with self._lock:
+            positions = self._positions(last=intervals + 1)
+            if len(positions) < intervals + 1:
+                return False
+            return not any(self._deltas(field, positions))
+
+    def to_prometheus(self, labels: Dict[str, str] = None, prefix: str = "tapflow_job_") -> str:
+        """
+        以 Prometheus 文本格式导出最近一条采样, 累计值为 counter, 其余为 gauge
+        :param labels: 附加的标签, 例如 {"job_id": ..., "job_name": ...}
+        """
+        sample = self.latest()
+        if sample is None:
+            return ""
+        label = ",".join('{}="{}"'.format(k, _escape_label(v)) for k, v in (labels or {}).items())
+        label = "{" + label + "}" if label else ""
+        timestamp = int(sample["timestamp"] * 1000)
+        lines = []
+        for field in STATS_FIELDS:
+            counter = field in COUNTER_FIELDS
+            name = prefix + field.lower() + ("_total" if counter else "")
+            lines.append("# TYPE {} {}".format(name, "counter" if counter else "gauge"))
+            lines.append("{}{} {} {}".format(name, label, _format_number(sample[field]), timestamp))
+        return "\n".join(lines) + "\n"
+
+    def to_csv(self, window: float = None) -> str:
+        """
+        以 CSV 导出保留的采样, 第一列为采样时间(秒)
+        """
+        with self._lock:
+            positions = self._positions(window)
+            rows = [[self._times[i]] + [self._columns[field][i] for field in STATS_FIELDS] for i in positions]
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(("timestamp",) + STATS_FIELDS)
+        for row in rows:
+            writer.writerow([_format_number(value) for value in row])
+        return out.getvalue()
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+# 任务 id -> JobStatsHistory
+_histories: Dict[str, JobStatsHistory] = {}
+_histories_lock = threading.Lock()
+
+
+def job_history(job_id: str) -> JobStatsHistory:
+    """
+    获取任务的采样历史, 同一个任务的所有 Job 对象共用
+    """
+    with _histories_lock:
+        history = _histories.get(job_id)
+        if history is None:
+            history = _histories[job_id] = JobStatsHistory()
+        return history
@@ -0,0 +1,245 @@
+import math
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Sequence, Union
+
+# 分位数的相对误差
+RELATIVE_ACCURACY = 0.01
+
+# 每个分片覆盖的时间(秒), 滑动窗口的精度
+SLICE_SECONDS = 60
+
+# 保留多久(秒)的分片
+RETENTION_SECONDS = 6 * 3600
+
+# 默认报告的分位数
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# 判断 SLO 时窗口内最少需要的采样数, 避免只凭一两个采样下结论
+MIN_SAMPLES = 10
+
+
+class DDSketch:
+    """
+    DDSketch 分位数草图: 值按对数分桶计数, 任意分位数的相对误差不超过 relative_accuracy
+
+    空间只与值的范围有关, 与采样数无关; 同样精度的草图可以直接合并
+    """
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        # 小于等于 0 的值单独计数
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: int = 1):
+        if value > 0:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + weight
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("can not merge sketches with different relative accuracy")
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        :param q: 0 到 1 之间
+        :return: 分位数, 没有采样时返回 None
+        """
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return min(max(0, self.min), self.max)
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class WindowedSketch:
+    """
+    按时间分片保存的 DDSketch, 查询时合并窗口内的分片, 得到滑动窗口上的分位数
+    """
+
+    def __init__(self, slice_seconds: int = SLICE_SECONDS, retention: int = RETENTION_SECONDS,
+                 relative_accuracy: float = RELATIVE_ACCURACY):
+        self.slice_seconds = slice_seconds
+        self.retention = retention
+        self.relative_accuracy = relative_accuracy
+        self._slices: Dict[int, DDSketch] = {}
+        self._lock = threading.Lock()
+
+    def add(self, value: float, at: float = None):
+        """
+        :param value: 采样值
+        :param at: 采样时间(秒), 默认为当前时间
+        """
+        at = time.time() if at is None else at
+        index = int(at // self.slice_seconds)
+        with self._lock:
+            sketch = self._slices.get(index)
+            if sketch is None:
+                sketch = self._slices[index] = DDSketch(self.relative_accuracy)
+                oldest = index - self.retention // self.slice_seconds
+                for stale in [i for i in self._slices if i < oldest]:
+                    del self._slices[stale]
+            sketch.add(value)
+
+    def sketch(self, window: float = None, now: float = None) -> DDSketch:
+        """
+        合并最近 window 秒内的分片, 精度为一个分片
+        :param window: 窗口(秒), 默认为全部保留的分片
+        """
+        now = time.time() if now is None else now
+        merged = DDSketch(self.relative_accuracy)
+        since = -math.inf if window is None else (now - window) // self.slice_seconds
+        with self._lock:
+            for index, sketch in self._slices.items():
+                if index >= since:
+                    merged.merge(sketch)
+        return merged
+
+
+def quantiles(sketch: DDSketch, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Optional[float]]:
+    """
+    :return: 例如 {"p50": ..., "p95": ..., "p99": ...}
+    """
+    return {"p{:g}".format(q * 100): sketch.quantile(q) for q in qs}
+
+
+def merge_sketches(sketches: Iterable[WindowedSketch], window: float = None, now: float = None) -> DDSketch:
+    """
+    合并多个任务的延迟分布, 例如一个项目的全部 flow
+    """
+    merged = DDSketch()
+    for sketch in sketches:
+        merged.merge(sketch.sketch(window, now))
+    return merged
+
+
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "sec": 1, "second": 1, "seconds": 1, "m": 60, "min": 60, "minute": 60,
+                   "minutes": 60, "h": 3600, "hour": 3600, "hours": 3600}
+
+_SLO_PATTERN = re.compile(
+    r"^\s*p(?P<quantile>\d+(?:\.\d+)?)\s*(?:lag\s*)?(?P<op><=|<)\s*(?P<threshold>\d+(?:\.\d+)?)\s*(?P<unit>[a-z]*)"
+    r"\s+over\s+(?P<window>\d+(?:\.\d+)?)\s*(?P<window_unit>[a-z]+)\s*$", re.IGNORECASE)
+
+
+def _seconds(value: str, unit: str, default: str) -> float:
+    unit = (unit or default).lower()
+    if unit not in _DURATION_UNITS:
+        raise ValueError("unknown time unit: {}".format(unit))
+    return float(value) * _DURATION_UNITS[unit]
+
+
+class SLOResult:
+    def __init__(self, slo: "LagSLO", ok: bool, value: Optional[float], samples: int):
+        """
+        :param ok: 是否满足
+        :param value: 窗口内的分位数(毫秒)
+        :param samples: 窗口内的采样数
+        """
+        self.slo = slo
+        self.ok = ok
+        self.value = value
+        self.samples = samples
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        value = "n/a" if self.value is None else "{:g}ms".format(self.value)
+        return "<SLOResult {} {}: p{:g}={} samples={}>".format(
+            self.slo.text, "ok" if self.ok else "violated", self.slo.quantile * 100, value, self.samples)
+
+
+class LagSLO:
+    """
+    增量延迟的 SLO, 例如 "p99 lag < 5s over 10m": 最近 10 分钟内延迟的 p99 小于 5 秒
+    """
+
+    def __init__(self, quantile: float, threshold_ms: float, window: float, inclusive: bool = False,
+                 min_samples: int = MIN_SAMPLES):
+        """
+        :param quantile: 分位数, 0 到 1 之间
+        :param threshold_ms: 延迟上限(毫秒)
+        :param window: 窗口(秒)
+        :param inclusive: 是否允许等于上限
+        :param min_samples: 窗口内最少的采样数, 不足时不满足
+        """
+        self.quantile = quantile
+        self.threshold_ms = threshold_ms
+        self.window = window
+        self.inclusive = inclusive
+        self.min_samples = min_samples
+        self.text = "p{:g} lag {} {:g}ms over {:g}s".format(quantile * 100, "<=" if inclusive else "<",
+                                                          threshold_ms, window)
+
+    @classmethod
+    def parse(cls, text: str, min_samples: int = MIN_SAMPLES) -> "LagSLO":
+        """
+        :param text: 例如 "p99 lag < 5s over 10 minutes", "p95 <= 800ms over 1h", 延迟不写单位时为毫秒
+        """
+        m = _SLO_PATTERN.match(text)
+        if m is None:
+            raise ValueError("invalid lag SLO: {}, expect e.g. 'p99 lag < 5s over 10m'".format(text))
+        slo = cls(float(m.group("quantile")) / 100, _seconds(m.group("threshold"), m.group("unit"), "ms") * 1000,
+                  _seconds(m.group("window"), m.group("window_unit"), "s"), m.group("op") == "<=", min_samples)
+        slo.text = text.strip()
+        return slo
+
+    def check(self, sketch: Union[WindowedSketch, DDSketch], now: float = None) -> SLOResult:
+        """
+        :param sketch: 一个任务的 WindowedSketch, 或已经按窗口合并好的 DDSketch
+        """
+        if isinstance(sketch, WindowedSketch):
+            sketch = sketch.sketch(self.window, now)
+        value = sketch.quantile(self.quantile)
+        ok = sketch.count >= self.min_samples and value is not None and (
+            value <= self.threshold_ms if self.inclusive else value < self.threshold_ms)
+        return SLOResult(self, ok, value, sketch.count)
+
+
+def as_slo(slo: Union[str, LagSLO]) -> LagSLO:
+    return LagSLO.parse(slo) if isinstance(slo, str) else slo
+
+
+# 任务 id -> 增量延迟(毫秒)的分布
+_lag_sketches: Dict[str, WindowedSketch] = {}
+_lag_sketches_lock = threading.Lock()
+
+
+def lag_sketch(job_id: str) -> WindowedSketch:
+    """
+    获取任务增量延迟的分布, 同一个任务的所有 Job 对象共用
+    """
+    with _lag_sketches_lock:
+        sketch = _lag_sketches.get(job_id)
+        if sketch is None:
+            sketch = _lag_sketches[job_id] = WindowedSketch()
+        return sketch
@@ -4,7 +4,6 @@ import json
 import time
 
 import requests
-import websockets
 from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
 from tapflow.lib.help_decorator import help_decorate
 from tapflow.lib.op_object import show_connections, show_tables
@@ -175,6 +174,7 @@ class Source(BaseNode):
         })
         
         async def load():
+            import websockets
             if req.mode == "cloud":
                 ws_uri = f"{req.server.replace('https://', 'wss://')}/tm/ws/agent?id={self.id}"
                 cookies = req.cookies.get_dict()
@@ -0,0 +1,371 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from tapflow.lib.task_events import task_events
+from tapflow.lib.utils.log import logger
+
+# 任务启动的里程碑阶段, 与 job.MilestoneStep 的顺序一致
+PHASES = ("DEDUCTION", "DATA_NODE_INIT", "TABLE_INIT", "SNAPSHOT", "CDC")
+
+# 阶段已经开始的里程碑状态
+STARTED_STATUSES = ("RUNNING", "FINISH", "ERROR")
+
+# 每个任务保留的启动次数
+MAX_RUNS = 20
+
+# 报告默认的分位数
+DEFAULT_QUANTILES = (0.5, 0.95)
+
+# track 最长跟踪时间(秒)
+TRACK_TIMEOUT = 24 * 3600
+
+# 任务停止后不会再有里程碑变化
+_FINAL_STATUSES = ("complete", "error", "stop", "stopping", "edit")
+
+
+class PhaseTimeline:
+    """
+    一个任务一次启动的里程碑时间线: 每个阶段的开始和结束时间(毫秒), 以及观察到的每次状态变化
+
+    服务端在里程碑中给出 begin/end 时使用服务端时间, 否则使用观察到状态变化的时间
+    """
+
+    def __init__(self, task_id: str, run: str = None, name: str = None, labels: Dict[str, str] = None):
+        """
+        :param task_id: 任务 id
+        :param run: 这次启动的 taskRecordId, 可能为空
+        :param name: 任务名
+        :param labels: 分组用的标签, 例如 {"source_type": "Oracle"}
+        """
+        self.task_id = task_id
+        self.run = run
+        self.name = name
+        self.labels = labels if labels is not None else {}
+        # 阶段 -> [begin, end]
+        self.phases: Dict[str, List[Optional[int]]] = {}
+        # (时间, 阶段, 状态)
+        self.transitions: List[tuple] = []
+        self._status: Dict[str, str] = {}
+
+    def restarted(self, run: Optional[str], milestone: dict) -> bool:
+        """
+        任务是否已经重新启动: taskRecordId 变化, 服务端的阶段开始时间变化, 或已完成的阶段重新开始
+        """
+        if run and self.run and run != self.run:
+            return True
+        for phase, (begin, end) in self.phases.items():
+            entry = milestone.get(phase) or {}
+            if entry.get("begin") and begin and entry["begin"] != begin:
+                return True
+            if end is not None and entry and entry.get("status") != "FINISH":
+                return True
+        return False
+
+    def update(self, milestone: dict, sync_status: Optional[str], at: int):
+        """
+        :param milestone: attrs.milestone
+        :param sync_status: 任务的 syncStatus, 只有 syncStatus 没有里程碑时用来判断阶段
+        :param at: 观察到的时间(毫秒)
+        """
+        for phase in PHASES:
+            entry = milestone.get(phase) or {}
+            status = entry.get("status")
+            if status is None and sync_status == phase:
+                status = "RUNNING"
+            if status is None:
+                continue
+            begin, end = self.phases.get(phase, [None, None])
+            if status in STARTED_STATUSES:
+                begin = entry.get("begin") or begin or at
+            if status == "FINISH":
+                end = entry.get("end") or end or at
+            self.phases[phase] = [begin, end]
+            if self._status.get(phase) != status:
+                self._status[phase] = status
+                self.transitions.append((at, phase, status))
+        # 只有 syncStatus 时, 进入下一个阶段说明之前的阶段已经结束
+        begins = [(phase, self.phases[phase][0]) for phase in PHASES if phase in self.phases]
+        for (phase, _), (_, next_begin) in zip(begins, begins[1:]):
+            if self.phases[phase][1] is None and not milestone.get(phase) and next_begin:
+                self.phases[phase][1] = next_begin
+
+    def duration(self, phase: str, now: float = None) -> Optional[float]:
+        """
+        阶段耗时(秒)
+        :param now: 阶段还没有结束时, 计算到 now(秒)为止; 默认返回 None
+        """
+        begin, end = self.phases.get(phase, [None, None])
+        if begin is None:
+            return None
+        if end is None:
+            if now is None:
+                return None
+            end = now * 1000
+        return max(end - begin, 0) / 1000
+
+    def durations(self) -> Dict[str, float]:
+        """
+        已完成阶段的耗时(秒)
+        """
+        result = {}
+        for phase in PHASES:
+            duration = self.duration(phase)
+            if duration is not None:
+                result[phase] = duration
+        return result
+
+    @property
+    def total(self) -> Optional[float]:
+        """
+        从第一个阶段开始到最后一个完成的阶段结束的耗时(秒)
+        """
+        begins = [begin for begin, _ in self.phases.values() if begin is not None]
+        ends = [end for _, end in self.phases.values() if end is not None]
+        if not begins or not ends:
+            return None
+        return max(max(ends) - min(begins), 0) / 1000
+
+    def dominant(self) -> Optional[str]:
+        """
+        耗时最长的阶段
+        """
+        durations = self.durations()
+        return max(durations, key=durations.get) if durations else None
+
+    def to_dict(self) -> dict:
+        return {
+            "task_id": self.task_id,
+            "run": self.run,
+            "name": self.name,
+            "labels": dict(self.labels),
+            "phases": {phase: list(span) for phase, span in self.phases.items()},
+            "transitions": [list(item) for item in self.transitions],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PhaseTimeline":
+        timeline = cls(data["task_id"], data.get("run"), data.get("name"), dict(data.get("labels") or {}))
+        timeline.phases = {phase: list(span) for phase, span in (data.get("phases") or {}).items()}
+        timeline.transitions = [tuple(item) for item in data.get("transitions") or []]
+        for _, phase, status in timeline.transitions:
+            timeline._status[phase] = status
+        return timeline
+
+    def __repr__(self):
+        spans = ", ".join("{}={:.1f}s".format(phase, d) for phase, d in self.durations().items())
+        return "<PhaseTimeline {} {}>".format(self.name or self.task_id, spans)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """
+    线性插值的分位数, values 需要已排序
+    """
+    k = (len(values) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+# 标签名, 或者由时间线得到分组的函数
+GroupBy = Union[str, Callable[[PhaseTimeline], str], None]
+
+
+class PhaseProfiler:
+    """
+    记录每个任务里程碑阶段的时间线, 汇总多个任务各阶段耗时的分布, 用来找出启动过程中耗时最多的阶段,
+    例如 "Oracle 源的 TABLE_INIT p95 为 40s"
+
+    注册为 task_events 的监听者, 所有订阅或轮询到的任务变更都会被记录
+    """
+
+    def __init__(self, max_runs: int = MAX_RUNS, hub=None):
+        """
+        :param max_runs: 每个任务保留的启动次数
+        :param hub: track 使用的 TaskEventHub, 默认为全局的 task_events
+        """
+        self.max_runs = max_runs
+        self.hub = hub
+        self._runs: Dict[str, List[PhaseTimeline]] = {}
+        self._labels: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, task: dict, at: float = None):
+        """
+        记录一次任务变更
+        :param task: 包含 id 的任务字段, 使用 attrs.milestone, syncStatus, taskRecordId 和 name
+        :param at: 观察到的时间(秒), 默认为当前时间
+        """
+        task_id = task.get("id")
+        milestone = (task.get("attrs") or {}).get("milestone") or {}
+        sync_status = task.get("syncStatus")
+        if not task_id or not isinstance(milestone, dict) or (not milestone and sync_status not in PHASES):
+            return
+        at = int((time.time() if at is None else at) * 1000)
+        run = task.get("taskRecordId")
+        with self._lock:
+            runs = self._runs.setdefault(task_id, [])
+            if not runs or runs[-1].restarted(run, milestone):
+                labels = self._labels.setdefault(task_id, {})
+                runs.append(PhaseTimeline(task_id, run, task.get("name"), labels))
+                del runs[:-self.max_runs]
+            timeline = runs[-1]
+            timeline.run = timeline.run or run
+            timeline.name = task.get("name") or timeline.name
+            timeline.update(milestone, sync_status, at)
+
+    def label(self, task_id: str, **labels):
+        """
+        设置任务的分组标签, 例如 label(task_id, source_type="Oracle"), 对之前和之后的启动都生效
+        """
+        with self._lock:
+            self._labels.setdefault(task_id, {}).update({k: str(v) for k, v in labels.items()})
+            for timeline in self._runs.get(task_id, []):
+                timeline.labels = self._labels[task_id]
+
+    def track(self, task_id: str, timeout: float = TRACK_TIMEOUT):
+        """
+        订阅任务直到启动完成(CDC 开始, 或全量任务的全量完成)或任务停止, 不需要有其他等待者也能记录时间线
+        :return: TaskSubscription, 可以提前 close
+        """
+        deadline = time.time() + timeout
+
+        def settled(task: dict):
+            milestone = (task.get("attrs") or {}).get("milestone") or {}
+            if task.get("status") in _FINAL_STATUSES or time.time() > deadline:
+                return True
+            last = "CDC" if "cdc" in (task.get("type") or "cdc") else "SNAPSHOT"
+            return (milestone.get(last) or {}).get("status") == "FINISH"
+
+        sub = (self.hub or task_events).watch(task_id)
+        sub.callback = lambda task: sub.close() if settled(task) else None
+        return sub
+
+    def timeline(self, task_id: str) -> Optional[PhaseTimeline]:
+        """
+        任务最近一次启动的时间线
+        """
+        with self._lock:
+            runs = self._runs.get(task_id)
+            return runs[-1] if runs else None
+
+    def runs(self, task_id: str) -> List[PhaseTimeline]:
+        """
+        任务保留的所有启动的时间线, 按时间顺序
+        """
+        with self._lock:
+            return list(self._runs.get(task_id, []))
+
+    def timelines(self, task_ids: Sequence[str] = None, all_runs: bool = False) -> List[PhaseTimeline]:
+        """
+        :param task_ids: 只返回这些任务, 默认为全部
+        :param all_runs: 是否包含之前的启动, 默认只包含每个任务最近一次启动
+        """
+        with self._lock:
+            ids = list(self._runs) if task_ids is None else [i for i in task_ids if i in self._runs]
+            if all_runs:
+                return [timeline for i in ids for timeline in self._runs[i]]
+            return [self._runs[i][-1] for i in ids]
+
+    def report(self, group_by: GroupBy = None, task_ids: Sequence[str] = None, all_runs: bool = False,
+               qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Dict[str, dict]]:
+        """
+        按分组汇总各阶段耗时的分布, 只统计已完成的阶段
+        :param group_by: 标签名(例如 "source_type"), 或由时间线得到分组的函数; 默认所有任务为一组 "all"
+        :param task_ids: 只统计这些任务
+        :param all_runs: 是否包含每个任务之前的启动
+        :param qs: 分位数
+        :return: {分组: {阶段: {"count", "mean", "max", "share", "p50", "p95", ...}}}, 时间单位为秒,
+                 share 为该阶段在分组总耗时中的占比
+        """
+        samples: Dict[str, Dict[str, List[float]]] = {}
+        for timeline in self.timelines(task_ids, all_runs):
+            if group_by is None:
+                group = "all"
+            elif callable(group_by):
+                group = str(group_by(timeline))
+            else:
+                group = timeline.labels.get(group_by, "unknown")
+            for phase, duration in timeline.durations().items():
+                samples.setdefault(group, {}).setdefault(phase, []).append(duration)
+        result = {}
+        for group, phases in samples.items():
+            total = sum(sum(values) for values in phases.values())
+            result[group] = {}
+            for phase in PHASES:
+                values = sorted(phases.get(phase, []))
+                if not values:
+                    continue
+                stats = {
+                    "count": len(values),
+                    "mean": sum(values) / len(values),
+                    "max": values[-1],
+                    "share": sum(values) / total if total else 0.0,
+                }
+                for q in qs:
+                    stats["p{:g}".format(q * 100)] = _percentile(values, q)
+                result[group][phase] = stats
+        return result
+
+    def format_report(self, group_by: GroupBy = None, task_ids: Sequence[str] = None, all_runs: bool = False,
+                      qs: Sequence[float] = DEFAULT_QUANTILES) -> str:
+        """
+        以文本表格输出 report, 每个分组最后一行给出总耗时占比最高的阶段
+        """
+        names = ["p{:g}".format(q * 100) for q in qs]
+        header = "{:<20} {:<16} {:>6}".format("group", "phase", "count") + \
+                 "".join(" {:>10}".format(name) for name in names + ["max", "share"])
+        lines = [header]
+        for group, phases in sorted(self.report(group_by, task_ids, all_runs, qs).items()):
+            for phase, stats in phases.items():
+                lines.append("{:<20} {:<16} {:>6}".format(group, phase, stats["count"]) +
+                             "".join(" {:>10}".format("{:.1f}s".format(stats[name])) for name in names + ["max"]) +
+                             " {:>10}".format("{:.0%}".format(stats["share"])))
+            if phases:
+                dominant = max(phases, key=lambda phase: phases[phase]["share"])
+                lines.append("{:<20} dominant phase: {}".format(group, dominant))
+        return "\n".join(lines)
+
+    def save(self, path: str):
+        """
+        保存所有时间线到 JSON 文件
+        """
+        with self._lock:
+            data = [timeline.to_dict() for runs in self._runs.values() for timeline in runs]
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def load(self, path: str):
+        """
+        从 save 保存的文件中加载时间线, 追加到已有记录之前
+        """
+        with open(path) as f:
+            data = json.load(f)
+        with self._lock:
+            loaded: Dict[str, List[PhaseTimeline]] = {}
+            for item in data:
+                timeline = PhaseTimeline.from_dict(item)
+                labels = self._labels.setdefault(timeline.task_id, {})
+                labels.update(timeline.labels)
+                timeline.labels = labels
+                loaded.setdefault(timeline.task_id, []).append(timeline)
+            for task_id, runs in loaded.items():
+                self._runs[task_id] = (runs + self._runs.get(task_id, []))[-self.max_runs:]
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+            self._labels.clear()
+
+
+def _observe(task: dict):
+    try:
+        phase_profiler.observe(task)
+    except Exception as e:
+        logger.fdebug("record task {} milestone failed: {}", task.get("id"), e)
+
+
+# 全局实例, 记录 task_events 上所有任务的里程碑变化
+phase_profiler = PhaseProfiler()
+task_events.add_listener(_observe)
@@ -10,12 +10,19 @@ from tapflow.lib.data_pipeline.nodes.field_add_del import FieldAddDel
 from tapflow.lib.data_pipeline.nodes.field_calculate import FieldCalculate
 from tapflow.lib.data_pipeline.nodes.python import Python
 from tapflow.lib.help_decorator import help_decorate
-from tapflow.lib.request import InspectApi
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.lib.request import InspectApi, req
 from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.profiler import profiler, traced
 from tapflow.lib.params.job import job_config
 
 from tapflow.lib.op_object import show_jobs
 from tapflow.lib.data_pipeline.job import JobType, JobStatus, Job
+from tapflow.lib.data_pipeline.job_history import OUTPUT_FIELDS
+from tapflow.lib.data_pipeline.lag_sketch import as_slo
+from tapflow.lib.data_pipeline.phase_profiler import phase_profiler
+from tapflow.lib.data_pipeline.snapshot_progress import SnapshotProgress
+from tapflow.lib.task_events import task_events
 from tapflow.lib.data_pipeline.dag import Dag
 from tapflow.lib.op_object import QuickDataSourceMigrateJob
 from tapflow.lib.data_pipeline.nodes.source import Source
@@ -74,6 +81,14 @@ class SinkTableNumberError(Exception):
     pass
 
 
+def _database_types(nodes) -> str:
+    """
+    节点的数据库类型, 多个类型用 + 连接
+    """
+    types = sorted({str(node.databaseType) for node in nodes if getattr(node, "databaseType", None)})
+    return "+".join(types) or "unknown"
+
+
 @help_decorate("use to define a stream pipeline", "p = new Pipeline($name).readFrom($source).writeTo($sink)")
 class Pipeline:
     @help_decorate("__init__ method", args="p = Pipeline($name)")
@@ -1130,6 +1145,7 @@ class Pipeline:
         self.config(config)
         return self
 
+    @traced("Pipeline.save")
     def save(self):
         if self.job is not None:
             self.job.pipeline = self
@@ -1158,6 +1174,7 @@ class Pipeline:
         return self.config_cdc_start_time(start_time, tz)
 
     @help_decorate("start this pipeline as a running job", args="p.start()")
+    @traced("Pipeline.start")
     def start(self, env={}):
         if env is not None:
             format_env = {}
@@ -1169,6 +1186,7 @@ class Pipeline:
                 self.job.env = env
             self.job.config(self.dag.setting)
             self.job.start()
+            self._label_phases()
             return self
         job = Job(name=self.name, pipeline=self)
         job.validateConfig = self.validateConfig
@@ -1178,7 +1196,7 @@ class Pipeline:
         if (env != None and len(env) > 0):
             job.env = env
         if job.start():
-            pass
+            self._label_phases()
         else:
             logger.fwarn("job {} start failed!", self.name)
             print(job.logs(level=["debug", "error"]))
@@ -1236,21 +1254,18 @@ class Pipeline:
             return 0
         return int(self.job.cdc_qps())
 
-    def wait_cdc_0(self, t=100, threshold=20):
-        time.sleep(10)
-        zero_times = 0
+    def wait_cdc_0(self, t=100, threshold=20, interval=5):
+        if self.job is None:
+            return False
+        # 最近 threshold 次采样之间没有写入即认为增量已经停止, 之前的采样也会计入
         start_time = time.time()
         while True:
+            self.job.stats()
+            if self.job.history.idle(OUTPUT_FIELDS, threshold):
+                return True
             if time.time() - start_time > t:
                 return False
-            time.sleep(5)
-            if zero_times >= threshold:
-                return True
-            if self.cdc_qps() == 0:
-                zero_times += 1
-                continue
-            else:
-                zero_times = 0
+            time.sleep(interval)
 
     def replicate_lag(self):
         if self.job is None:
@@ -1259,6 +1274,52 @@ class Pipeline:
         stats = self.job.stats()
         return stats.replicate_lag
 
+    def _label_phases(self):
+        """
+        给里程碑时间线加上源和目标的数据库类型, 用于按数据库类型汇总启动各阶段的耗时
+        """
+        if self.job is None or not self.job.id:
+            return
+        sinks = [sink["sink"] for sink in self.sinks]
+        phase_profiler.label(self.job.id, source_type=_database_types(self.sources),
+                             target_type=_database_types(sinks))
+
+    def phase_timeline(self):
+        """
+        最近一次启动的里程碑时间线, 没有观察到时为 None
+        """
+        if self.job is None:
+            return None
+        return self.job.phase_timeline()
+
+    def lag_quantiles(self, window=600):
+        """
+        最近 window 秒内增量延迟的 p50/p95/p99(毫秒)
+        """
+        if self.job is None:
+            return {}
+        return self.job.lag_quantiles(window)
+
+    def wait_lag_slo(self, slo, t=None, interval=5):
+        """
+        持续采样, 直到增量延迟的分布满足 SLO, 适合作为切换前的检查
+        :param slo: LagSLO 或其文本, 例如 "p99 lag < 5s over 10m"
+        :param t: 超时时间(秒), 默认为 SLO 窗口的两倍
+        :param interval: 采样间隔(秒)
+        :return: 最后一次检查的 SLOResult, 可以直接作为布尔值使用
+        """
+        if self.job is None:
+            return False
+        slo = as_slo(slo)
+        t = slo.window * 2 if t is None else t
+        start_time = time.time()
+        while True:
+            self.job.stats()
+            result = self.job.check_lag_slo(slo)
+            if result or time.time() - start_time > t:
+                return result
+            time.sleep(interval)
+
     def wait_delay(self, delay=10000, t=120):
         start_time = time.time()
         while True:
@@ -1322,18 +1383,15 @@ class Pipeline:
         if self.job is None:
             #logger.fwarn("pipeline not start, no status can show")
             return self
-        s = time.time()
         if type(status) == type(""):
             status == [status]
-        while True:
-            if self.job.status() in status:
-                return True
-            if self.job.status() == JobStatus.error and JobStatus.error not in status:
-                return False
-            time.sleep(1)
-            if time.time() - s > t:
-                break
-        return False
+        if self.job.id is None:
+            return False
+        with task_events.watch(self.job.id) as watch, profiler.sleeping():
+            task = watch.wait_for(lambda task: task.get("status") in status or task.get("status") == JobStatus.error, t)
+        if task is None:
+            return False
+        return task["status"] in status
 
     def wait_stats(self, stats, t=30, quiet=True):
         if self.job is None:
@@ -1359,23 +1417,50 @@ class Pipeline:
     def wait_initial_complete(self, t=300, quiet=True):
         return self.wait_initial_sync(t, quiet)
 
-    def wait_initial_sync(self, t=300, quiet=True):
+    def snapshot_table_rows(self) -> dict:
+        """
+        源表的行数, 来自元数据, 用于估计全量进度
+        :return: 表名 -> 行数
+        """
+        rows = {}
+        for source in self.sources:
+            tables = source.table if isinstance(source.table, list) else [source.table] if source.table else None
+            try:
+                rows.update(MetadataInstanceApi(req).get_table_row_counts(source.connectionId, tables))
+            except Exception as e:
+                logger.fdebug("get table row counts of {} failed: {}", source.connectionId, e)
+        return rows
+
+    def snapshot_progress(self, callback=None) -> SnapshotProgress:
+        """
+        :param callback: 每次更新后调用, 参数为 SnapshotReport
+        :return: 按源表行数初始化的 SnapshotProgress, 之后用 update(job.stats()) 更新
+        """
+        return SnapshotProgress(self.snapshot_table_rows(), callback)
+
+    def wait_initial_sync(self, t=300, quiet=True, callback=None, interval=5):
+        """
+        等待全量完成
+        :param callback: 每次采样后调用, 参数为 SnapshotReport, 包含整体和每张表的进度, 速度和 ETA
+        :param interval: 采样间隔(秒)
+        """
         if self.job is None:
             return self
         s = time.time()
+        progress = self.snapshot_progress(callback)
         while True:
             status = self.job.status()
             stats = self.job.stats()
-            if (stats.snapshot_table_total > 0 and stats.snapshot_table_total == stats.table_total) or status in ["complete", "error"]:
+            if stats is not None:
+                report = progress.update(stats)
                 if not quiet:
-                    pass
-                    #logger.finfo("job {} initial sync finish, wait time is: {} seconds", self.job.name,
-                    #            int(time.time() - s))
+                    logger.finfo("job {} {}", self.job.name, report)
+            if (stats is not None and stats.snapshot_table_total > 0 and stats.snapshot_table_total == stats.table_total) or status in ["complete", "error"]:
                 if status == "running":
                     # 等几秒, 避免状态不一致
                     time.sleep(5)
                 return True
-            time.sleep(5)
+            time.sleep(interval)
             if time.time() - s > t:
                 break
         time.sleep(10)
@@ -14,12 +14,15 @@ from typing import List, Dict, Set, Tuple, Union
 import websockets
 import yaml
 
-from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.task_events import task_events
+from tapflow.lib.data_pipeline.lag_sketch import SLOResult, as_slo, lag_sketch, merge_sketches, quantiles
+from tapflow.lib.data_pipeline.phase_profiler import phase_profiler
 from tapflow.lib.data_pipeline.base_node import BaseNode
 from tapflow.lib.op_object import show_jobs
 from tapflow.lib.utils.boolean_parser import BooleanParser
 from .projectInterface import ProjectInterface
 from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.profiler import traced
 from tapflow.lib.data_pipeline.pipeline import Flow, Pipeline
 from tapflow.lib.request import req
 from tapflow.lib.cache import client_cache
@@ -72,6 +75,9 @@ class ProjectScheduler:
     def __init__(self, project: 'Project'):
         self.project = project
         self.executor = ThreadPoolExecutor(max_workers=project.parallelism)
+        # 每个 worker 线程都会访问后端, 连接池不小于并行度, 避免线程间争抢连接
+        if req.pool_size < project.parallelism * 2:
+            req.configure_transport(pool_size=project.parallelism * 2)
         # 消息队列
         self._event_queue: queue.Queue = queue.Queue()
         # 运行队列
@@ -199,88 +205,95 @@ class ProjectScheduler:
 
         key_error_times, key_error_times_limit = 0, 60
 
-        while True:
+        # 从订阅中读取任务状态, 由推送或所有 flow 共用的批量轮询更新
+        watch = task_events.watch(flow.id)
+        watch.wait_for(lambda task: "status" in task, 5)
+        try:
+            while True:
 
-            try:
-                data = TaskApi(req).get_task_by_id(flow.id)
-                status = data["status"]
-            except KeyError as e:
-                key_error_times += 1
-                if key_error_times > key_error_times_limit:
-                    logger.error("Flow {} start timeout, please check", flow.name)
-                    break
-                time.sleep(1)
-                continue
-
-            if status == "edit":
-                edit_times += 1
-            if edit_times > edit_times_limit:
-                logger.error("Flow {} start timeout or config error, please check", flow.name)
-                time.sleep(1)
-                break
-
-            try:
-                milestone = data["attrs"].get("milestone", "")
-            except KeyError as e:
-                key_error_times += 1
-                if key_error_times > 5:
-                    logger.error("Flow {} milestone not found, please check", flow.name)
+                try:
+                    data = dict(watch.task)
+                    status = data["status"]
+                except KeyError as e:
+                    key_error_times += 1
+                    if key_error_times > key_error_times_limit:
+                        logger.error("Flow {} start timeout, please check", flow.name)
+                        break
+                    time.sleep(1)
+                    continue
+
+                if status == "edit":
+                    edit_times += 1
+                if edit_times > edit_times_limit:
+                    logger.error("Flow {} start timeout or config error, please check", flow.name)
+                    time.sleep(1)
                     break
-                time.sleep(1)
-                continue
 
-            # 收集当前时刻所有需要发送的事件
-            current_events = set()
+                try:
+                    milestone = data["attrs"].get("milestone", "")
+                except KeyError as e:
+                    key_error_times += 1
+                    if key_error_times > 5:
+                        logger.error("Flow {} milestone not found, please check", flow.name)
+                        break
+                    time.sleep(1)
+                    continue
+
+                # 收集当前时刻所有需要发送的事件
+                current_events = set()
             
-            # 任务开始事件
-            if status == "running" and "{}.start".format(flow.name) not in self._occurred_events:
-                current_events.add("{}.start".format(flow.name))
+                # 任务开始事件
+                if status == "running" and "{}.start".format(flow.name) not in self._occurred_events:
+                    current_events.add("{}.start".format(flow.name))
             
-            if milestone:
-                flow_type = data["type"]
-                snapshot_status = milestone.get("SNAPSHOT", {}).get("status", "")
-                cdc_status = milestone.get("CDC", {}).get("status", "")
+                if milestone:
+                    flow_type = data["type"]
+                    snapshot_status = milestone.get("SNAPSHOT", {}).get("status", "")
+                    cdc_status = milestone.get("CDC", {}).get("status", "")
                 
-                # 根据不同类型的flow收集相应事件
-                if flow_type in ["initial_sync", "initial_sync+cdc"]:
-                    if snapshot_status in ["RUNNING", "FINISH"]:
-                        current_events.add(f"{flow.name}.initial_sync.start")
-                    if snapshot_status == "FINISH":
-                        current_events.add(f"{flow.name}.initial_sync.end")
+                    # 根据不同类型的flow收集相应事件
+                    if flow_type in ["initial_sync", "initial_sync+cdc"]:
+                        if snapshot_status in ["RUNNING", "FINISH"]:
+                            current_events.add(f"{flow.name}.initial_sync.start")
+                        if snapshot_status == "FINISH":
+                            current_events.add(f"{flow.name}.initial_sync.end")
                 
-                if flow_type in ["cdc", "initial_sync+cdc"]:
-                    if cdc_status == "FINISH":
-                        if status == "running":
-                            current_events.add(f"{flow.name}.cdc.start")
-                        current_events.add(f"{flow.name}.cdc.end")
-                        current_events.add(f"{flow.name}.end")
+                    if flow_type in ["cdc", "initial_sync+cdc"]:
+                        if cdc_status == "FINISH":
+                            if status == "running":
+                                current_events.add(f"{flow.name}.cdc.start")
+                            current_events.add(f"{flow.name}.cdc.end")
+                            current_events.add(f"{flow.name}.end")
             
-            # 任务结束事件
-            if status == "complete":
-                current_events.add(f"{flow.name}.end")
+                # 任务结束事件
+                if status == "complete":
+                    current_events.add(f"{flow.name}.end")
             
-            # 任务报错事件
-            if status == "error":
-                current_events.add(f"{flow.name}.error")
+                # 任务报错事件
+                if status == "error":
+                    current_events.add(f"{flow.name}.error")
             
-            # 批量发送新的事件
-            new_events = current_events - self._occurred_events
-            for event in new_events:
-                self._send_event(event)
+                # 批量发送新的事件
+                new_events = current_events - self._occurred_events
+                for event in new_events:
+                    self._send_event(event)
             
-            # 任务完成时退出循环
-            if status == "complete":
-                logger.info("Flow {} finished", flow.name)
-                break
-            if f"{flow.name}.cdc.start" in current_events:
-                logger.info("Flow {} cdc started", flow.name)
-                break
-            if status == "error":
-                logger.error("Flow {} error", flow.name)
-                break
+                # 任务完成时退出循环
+                if status == "complete":
+                    logger.info("Flow {} finished", flow.name)
+                    break
+                if f"{flow.name}.cdc.start" in current_events:
+                    logger.info("Flow {} cdc started", flow.name)
+                    break
+                if status == "error":
+                    logger.error("Flow {} error", flow.name)
+                    break
                 
-            # 避免频繁请求
-            time.sleep(1)
+                # 任务变化后立即处理, 最多等待 1 秒
+                updates = watch.updates
+                watch.wait_for(lambda task: watch.updates > updates, 1)
+        finally:
+            watch.close()
                 
         return True
 
@@ -590,6 +603,30 @@ class Project(ProjectInterface):
         logger.info("Project {} stopped", self.name)
         return True
 
+    def _lag_sketch(self, window: float = None):
+        return merge_sketches([lag_sketch(flow.id) for flow in self.flows if getattr(flow, "id", None)], window)
+
+    def lag_quantiles(self, window: float = 600) -> dict:
+        """
+        所有 flow 合并后的增量延迟 p50/p95/p99(毫秒)
+        """
+        return quantiles(self._lag_sketch(window))
+
+    def check_lag_slo(self, slo) -> SLOResult:
+        """
+        :param slo: LagSLO 或其文本, 例如 "p99 lag < 5s over 10m", 按所有 flow 合并后的延迟分布判断
+        """
+        slo = as_slo(slo)
+        return slo.check(self._lag_sketch(slo.window))
+
+    def phase_report(self, group_by="source_type") -> str:
+        """
+        项目中所有 flow 最近一次启动各里程碑阶段耗时的分布, 按 group_by 分组, 例如每种源数据库的 TABLE_INIT p95
+        :param group_by: 标签名(source_type, target_type), 或由 PhaseTimeline 得到分组的函数
+        """
+        ids = [flow.id for flow in self.flows if getattr(flow, "id", None)]
+        return phase_profiler.format_report(group_by, task_ids=ids)
+
     def to_dict(self) -> dict:
         """
         将项目转换为指定格式的 dict
@@ -762,6 +799,7 @@ class Project(ProjectInterface):
         # 如果访问的节点数小于总节点数,说明存在环
         return visited_count == len(self.flows)
 
+    @traced("Project.start")
     def start(self):
         """start project"""
         show_jobs(quiet=True)
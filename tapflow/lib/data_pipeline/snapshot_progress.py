@@ -0,0 +1,173 @@
+import math
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# 计算速度时使用最近多少秒的采样
+RATE_WINDOW = 120
+
+# ETA 置信区间对应的正态分布分位点(95%)
+CONFIDENCE_Z = 1.96
+
+
+class TableProgress:
+    def __init__(self, name: str, rows: int):
+        """
+        :param name: 表名
+        :param rows: 表的行数, 来自元数据或服务端统计
+        """
+        self.name = name
+        self.rows = rows
+        self.done_rows = 0
+        self.status = "waiting"
+        self.started_at = None
+        self.finished_at = None
+        # 行/秒, 还没有开始时为 None
+        self.throughput = None
+
+    @property
+    def percent(self) -> float:
+        if self.status == "done":
+            return 100.0
+        if not self.rows:
+            return 0.0
+        return min(self.done_rows / self.rows * 100, 100.0)
+
+    def __repr__(self):
+        return "<TableProgress {} {} {:.1f}%>".format(self.name, self.status, self.percent)
+
+
+class SnapshotReport:
+    """
+    某一时刻的全量进度
+    """
+
+    def __init__(self, at: float, rows_done: int, rows_total: int, tables_done: int, tables_total: int,
+                 throughput: Optional[float], eta: Optional[float], eta_low: Optional[float],
+                 eta_high: Optional[float], tables: List[TableProgress]):
+        """
+        :param throughput: 最近的全量速度(行/秒)
+        :param eta: 预计剩余时间(秒), 速度未知时为 None
+        :param eta_low: ETA 95% 置信区间下限(秒)
+        :param eta_high: ETA 95% 置信区间上限(秒), 速度可能为 0 时为 None
+        """
+        self.at = at
+        self.rows_done = rows_done
+        self.rows_total = rows_total
+        self.tables_done = tables_done
+        self.tables_total = tables_total
+        self.throughput = throughput
+        self.eta = eta
+        self.eta_low = eta_low
+        self.eta_high = eta_high
+        self.tables = tables
+
+    @property
+    def percent(self) -> float:
+        if not self.rows_total:
+            return 100.0 if self.tables_total and self.tables_done >= self.tables_total else 0.0
+        return min(self.rows_done / self.rows_total * 100, 100.0)
+
+    @property
+    def done(self) -> bool:
+        return self.tables_total > 0 and self.tables_done >= self.tables_total
+
+    def __str__(self):
+        eta = "unknown" if self.eta is None else "{}s".format(int(self.eta))
+        if self.eta is not None:
+            high = "?" if self.eta_high is None else int(self.eta_high)
+            eta += " ({}-{}s)".format(int(self.eta_low), high)
+        throughput = "unknown" if self.throughput is None else "{:.0f} rows/s".format(self.throughput)
+        return "snapshot {:.1f}%, tables {}/{}, rows {}/{}, {}, eta {}".format(
+            self.percent, self.tables_done, self.tables_total, self.rows_done, self.rows_total, throughput, eta)
+
+
+class SnapshotProgress:
+    """
+    根据 JobStats 的全量计数跟踪进度: 整体和每张表的完成比例, 速度, 以及带置信区间的 ETA
+
+    每张表的进度按 table_rows 的顺序估计: 前 snapshot_table_total 张表已完成, 下一张表使用
+    currentSnapshotTable* 计数; 没有表的行数时只报告整体进度
+    """
+
+    def __init__(self, table_rows: Dict[str, int] = None, callback: Callable[[SnapshotReport], None] = None,
+                 window: float = RATE_WINDOW):
+        """
+        :param table_rows: 表名 -> 行数, 通常来自元数据
+        :param callback: 每次 update 后调用, 参数为 SnapshotReport, 可用于显示进度条
+        :param window: 计算速度使用的时间窗口(秒)
+        """
+        self.tables = [TableProgress(name, rows or 0) for name, rows in (table_rows or {}).items()]
+        self.callback = callback
+        self.window = window
+        self._samples = deque()
+        self.report: Optional[SnapshotReport] = None
+
+    def _rates(self) -> List[float]:
+        samples = list(self._samples)
+        return [(b - a) / (tb - ta) for (ta, a), (tb, b) in zip(samples, samples[1:]) if tb > ta and b >= a]
+
+    def _throughput(self) -> Optional[float]:
+        if len(self._samples) < 2:
+            return None
+        (t0, v0), (t1, v1) = self._samples[0], self._samples[-1]
+        return (v1 - v0) / (t1 - t0) if t1 > t0 and v1 >= v0 else None
+
+    def _eta(self, remaining: int, throughput: Optional[float]):
+        """
+        :return: (eta, eta_low, eta_high), 由窗口内各采样间隔速度的均值和标准误差得到
+        """
+        if remaining <= 0:
+            return 0.0, 0.0, 0.0
+        if not throughput or throughput <= 0:
+            return None, None, None
+        rates = self._rates()
+        spread = 0.0
+        if len(rates) > 1:
+            mean = sum(rates) / len(rates)
+            std = math.sqrt(sum((r - mean) ** 2 for r in rates) / (len(rates) - 1))
+            spread = CONFIDENCE_Z * std / math.sqrt(len(rates))
+        high_rate, low_rate = throughput + spread, throughput - spread
+        return remaining / throughput, remaining / high_rate, remaining / low_rate if low_rate > 0 else None
+
+    def _update_tables(self, stats, at: float):
+        done = min(int(stats.snapshot_table_total or 0), len(self.tables))
+        for i, table in enumerate(self.tables):
+            if i < done:
+                if table.status != "done":
+                    table.status = "done"
+                    table.done_rows = table.rows
+                    table.finished_at = at
+                    if table.started_at is not None and at > table.started_at:
+                        table.throughput = table.rows / (at - table.started_at)
+            elif i == done and stats.snapshot_row_total:
+                if table.status != "running":
+                    table.status, table.started_at = "running", at
+                rows = stats.current_snapshot_table_row_total
+                if rows:
+                    table.rows = rows
+                inserted = stats.current_snapshot_table_insert_row_total or 0
+                if at > table.started_at and inserted > table.done_rows:
+                    table.throughput = inserted / (at - table.started_at)
+                table.done_rows = inserted
+
+    def update(self, stats, at: float = None) -> SnapshotReport:
+        """
+        :param stats: JobStats
+        :param at: 采样时间(秒), 默认为当前时间
+        """
+        at = time.time() if at is None else at
+        rows_done = int(stats.snapshot_insert_row_total or 0)
+        self._samples.append((at, rows_done))
+        while len(self._samples) > 2 and self._samples[0][0] < at - self.window:
+            self._samples.popleft()
+        self._update_tables(stats, at)
+        rows_total = int(stats.snapshot_row_total or 0) or sum(table.rows for table in self.tables)
+        tables_total = int(stats.table_total or 0) or len(self.tables)
+        throughput = self._throughput()
+        eta, eta_low, eta_high = self._eta(rows_total - rows_done, throughput) if rows_total else (None, None, None)
+        self.report = SnapshotReport(at, rows_done, rows_total, int(stats.snapshot_table_total or 0), tables_total,
+                                     throughput, eta, eta_low, eta_high, self.tables)
+        if self.callback is not None:
+            self.callback(self.report)
+        return self.report
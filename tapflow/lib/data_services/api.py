@@ -24,7 +24,7 @@ class Api:
 
         base_path = name
 
-        client_cache["apis"]["name_index"] = {}
+        client_cache["apis"].invalidate()
 
         db = table.split(".")[0]
         table2 = table.split(".")[1]
@@ -17,11 +17,11 @@ def show_apiserver(quite=False):
             "debug", "debug", "debug"
         )
     for i, v in enumerate(items):
-        client_cache["apiserver"]["name_index"][v["clientName"]] = {
+        client_cache["apiserver"].upsert({
             "id": v["id"],
             "name": v["clientName"],
             "uri": v["clientURI"],
-        }
+        })
         if not quite:
             logger.log(
                 "{} {} {}",
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional, Tuple
+
+from tapflow.lib.cache import ClientCache, EntityStore, KeyedStore
+from tapflow.lib.utils import fast_json
+from tapflow.lib.utils.log import logger
+
+# 数据格式变化时递增, 版本不一致的旧数据直接丢弃
+SCHEMA_VERSION = 1
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".tapflow", "cache.db")
+
+# 超过这个时间(秒)的数据不再用于启动
+MAX_AGE = 7 * 24 * 3600
+
+# 设置为 0 时不使用磁盘缓存
+ENV_SWITCH = "TAPFLOW_DISK_CACHE"
+
+TABLES_PREFIX = "tables:"
+
+
+class DiskCache:
+    """
+    保存在 ~/.tapflow/cache.db 中的元数据缓存, 按服务地址和用户隔离
+
+    启动时先用磁盘中的连接, connector, 任务和表结构填充 client_cache, 再在后台向服务端校验, 不需要等待全部元数据加载完成
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, scope: str = ""):
+        """
+        :param path: sqlite 文件路径
+        :param scope: 服务地址和用户, 见 scope_for
+        """
+        self.path = path
+        self.scope = scope
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != str(SCHEMA_VERSION):
+                self._conn.execute("DROP TABLE IF EXISTS entries")
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "scope TEXT NOT NULL, kind TEXT NOT NULL, payload BLOB NOT NULL, saved_at REAL NOT NULL, "
+                "PRIMARY KEY (scope, kind))"
+            )
+
+    def save(self, kind: str, data, saved_at: float = None):
+        """
+        保存一类元数据
+        :param kind: connections, jobs, connectors 或 tables:<连接 id>
+        :param data: 可以 JSON 序列化的数据
+        :param saved_at: 数据从服务端加载的时间, 默认为当前时间
+        """
+        payload = zlib.compress(fast_json.dumps(data), 1)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO entries (scope, kind, payload, saved_at) VALUES (?, ?, ?, ?)",
+                               (self.scope, kind, payload, saved_at or time.time()))
+
+    def load(self, kind: str, max_age: float = MAX_AGE) -> Optional[Tuple[object, float]]:
+        """
+        读取一类元数据
+        :return: (数据, 保存时间), 不存在或已超过 max_age 时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT payload, saved_at FROM entries WHERE scope = ? AND kind = ?",
+                                     (self.scope, kind)).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        try:
+            return fast_json.loads(zlib.decompress(row[0])), row[1]
+        except (zlib.error, ValueError) as e:
+            logger.fdebug("disk cache {} is broken: {}", kind, e)
+            return None
+
+    def kinds(self, prefix: str = "") -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind FROM entries WHERE scope = ? AND kind LIKE ?",
+                                      (self.scope, prefix + "%")).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, kind: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE scope = ? AND kind = ?", (self.scope, kind))
+
+    def clear(self):
+        """
+        删除当前服务地址和用户的全部数据
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE scope = ?", (self.scope,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def scope_for(server: str, user: str) -> str:
+    """
+    缓存的隔离范围, 用户标识(user_id 或 access key)只保存摘要
+    """
+    digest = hashlib.sha1((user or "").encode("utf-8")).hexdigest()[:16]
+    return "{}|{}".format(server, digest)
+
+
+def open_disk_cache(server: str, user: str, path: str = DEFAULT_PATH) -> Optional[DiskCache]:
+    """
+    打开磁盘缓存, 被禁用或打开失败时返回 None, 不影响正常启动
+    """
+    if os.environ.get(ENV_SWITCH, "1") == "0":
+        return None
+    try:
+        return DiskCache(path, scope_for(server, user))
+    except (sqlite3.Error, OSError) as e:
+        logger.fdebug("open disk cache {} failed: {}", path, e)
+        return None
+
+
+def _restore_store(store, data, saved_at: float):
+    store.replace(data)
+    # 保留数据实际加载的时间, 过期判断与从服务端加载时一致
+    store.loaded_at = saved_at
+
+
+def restore_client_cache(cache: ClientCache, disk: DiskCache) -> bool:
+    """
+    用磁盘中的数据填充 client_cache
+    :return: 是否恢复了连接和任务
+    """
+    restored = {}
+    for kind in ("connections", "jobs", "connectors"):
+        entry = disk.load(kind)
+        if entry is not None:
+            _restore_store(cache[kind], *entry)
+            restored[kind] = True
+    for kind in disk.kinds(TABLES_PREFIX):
+        entry = disk.load(kind)
+        if entry is not None:
+            _restore_store(cache.tables.store_for(kind[len(TABLES_PREFIX):]), *entry)
+    return restored.get("connections", False) and restored.get("jobs", False)
+
+
+def save_client_cache(cache: ClientCache, disk: DiskCache):
+    """
+    把 client_cache 中已加载的元数据写入磁盘
+    """
+    try:
+        for kind in ("connections", "jobs"):
+            store = cache[kind]
+            if isinstance(store, EntityStore) and store.loaded:
+                disk.save(kind, store.items_list(), store.loaded_at)
+        connectors = cache["connectors"]
+        if isinstance(connectors, KeyedStore) and connectors.loaded_at is not None:
+            disk.save("connectors", dict(connectors), connectors.loaded_at)
+        for connection_id, store in list(cache.tables.items()):
+            if isinstance(store, EntityStore) and store.loaded:
+                disk.save(TABLES_PREFIX + connection_id, store.items_list(), store.loaded_at)
+    except sqlite3.Error as e:
+        logger.fdebug("save disk cache failed: {}", e)
@@ -0,0 +1,240 @@
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from tapflow.lib.utils.log import logger
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 签名等每次请求都会变化的参数, 不参与缓存 key 的计算
+VOLATILE_PARAMS = ("ts", "nonce", "sign", "signVersion", "accessKey")
+
+
+class CacheRule:
+    """
+    缓存规则: path 以 * 结尾时按前缀匹配, 否则精确匹配; ttl 为 0 表示不缓存
+    带有 bypass_params 中任意查询参数的请求不匹配这条规则
+    """
+
+    def __init__(self, path: str, ttl: float, methods=("GET",), bypass_params=()):
+        self.prefix = path[:-1] if path.endswith("*") else path
+        self.exact = not path.endswith("*")
+        self.ttl = ttl
+        self.methods = {m.upper() for m in methods}
+        self.bypass_params = tuple(bypass_params)
+
+    def match(self, method: str, path: str, params=None) -> bool:
+        if method.upper() not in self.methods:
+            return False
+        if params and any(name in params for name in self.bypass_params):
+            return False
+        if self.exact:
+            return path == self.prefix
+        return path.startswith(self.prefix)
+
+
+# 元数据类接口的数据很少变化; 用于轮询加载进度的接口(如 /Connections/{id}, /MetadataInstances/node/*)不缓存
+# /Connections 只缓存不带过滤条件的列表, 按 id 查询, 计数和增量刷新(last_updated >= ...)需要最新数据
+DEFAULT_CACHE_RULES = [
+    CacheRule("/DatabaseTypes/getDatabases", ttl=600),
+    CacheRule("/Connections", ttl=30, bypass_params=("filter",)),
+    CacheRule("/MetadataInstances", ttl=60),
+    CacheRule("/MetadataInstances/*", ttl=60),
+    CacheRule("/MetadataInstances/node/*", ttl=0),
+    CacheRule("/MetadataInstances/metadata/v3", ttl=60, methods=("POST",)),
+]
+
+
+def build_response(status_code: int, headers, content: bytes, encoding: str = None, url: str = None,
+                   reason: str = None) -> requests.Response:
+    """
+    构造一个响应体已经读取完的 Response, 和真实响应一样可以 iter_content 和 close
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response._content_consumed = True
+    response.raw = io.BytesIO(content)
+    response.encoding = encoding
+    response.url = url
+    response.reason = reason
+    return response
+
+
+class CacheEntry:
+    __slots__ = ("path", "status_code", "headers", "content", "encoding", "url", "reason",
+                 "stored_at", "ttl", "etag", "last_modified")
+
+    def __init__(self, path: str, response: requests.Response, ttl: float):
+        self.path = path
+        self.status_code = response.status_code
+        self.headers = CaseInsensitiveDict(response.headers)
+        self.content = response.content
+        self.encoding = response.encoding
+        self.url = response.url
+        self.reason = response.reason
+        self.stored_at = time.monotonic()
+        self.ttl = ttl
+        self.etag = self.headers.get("ETag")
+        self.last_modified = self.headers.get("Last-Modified")
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def fresh(self) -> bool:
+        return time.monotonic() - self.stored_at < self.ttl
+
+    def revalidatable(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(self) -> requests.Response:
+        # 每次命中都构造新的 Response, 调用方解析出的对象互不共享
+        response = build_response(self.status_code, self.headers, self.content, self.encoding, self.url, self.reason)
+        response.from_cache = True
+        return response
+
+
+class HttpCache:
+    """
+    元数据接口的 HTTP 响应缓存
+
+    - 按接口配置 TTL, 过期后如果服务端返回过 ETag/Last-Modified, 使用条件请求重新验证
+    - 按响应体字节数限制总大小, 超出时按 LRU 淘汰
+    - 数据变更后通过 notify(event) 触发失效
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, rules: List[CacheRule] = None):
+        self.max_bytes = max_bytes
+        self.rules = list(DEFAULT_CACHE_RULES if rules is None else rules)
+        self.enabled = True
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rule_for(self, method: str, path: str, params=None) -> Optional[CacheRule]:
+        if not self.enabled:
+            return None
+        matched = None
+        for rule in self.rules:
+            if rule.match(method, path, params) and (matched is None or len(rule.prefix) > len(matched.prefix)
+                                             or (rule.exact and len(rule.prefix) == len(matched.prefix))):
+                matched = rule
+        if matched is None or matched.ttl <= 0:
+            return None
+        return matched
+
+    @staticmethod
+    def make_key(scope: tuple, method: str, path: str, params=None, body=None) -> tuple:
+        params = {k: str(v) for k, v in (params or {}).items() if k not in VOLATILE_PARAMS}
+        body = json.dumps(body, sort_keys=True, default=str) if body is not None else None
+        return scope + (method.upper(), path, tuple(sorted(params.items())), body)
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, path: str, response: requests.Response, ttl: float):
+        entry = CacheEntry(path, response, ttl)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def touch(self, key: tuple):
+        """
+        条件请求返回 304 后, 刷新条目的存储时间
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.monotonic()
+
+    def invalidate(self, *prefixes: str):
+        """
+        使路径以任意前缀开头的缓存失效, 不传前缀时清空全部
+        """
+        with self._lock:
+            if not prefixes:
+                self._entries.clear()
+                self.size = 0
+                return
+            for key in [k for k, e in self._entries.items() if e.path.startswith(prefixes)]:
+                self.size -= self._entries.pop(key).size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+
+http_cache = HttpCache()
+
+
+# 数据变更事件 -> 需要失效的接口前缀
+INVALIDATION_PREFIXES = {
+    "datasource.save": ("/Connections", "/MetadataInstances"),
+    "datasource.delete": ("/Connections", "/MetadataInstances"),
+    "connection.load_schema": ("/Connections", "/MetadataInstances"),
+    "job.save": ("/MetadataInstances",),
+}
+
+_invalidation_hooks: Dict[str, List[Callable]] = {}
+
+
+def register_invalidation_hook(event: str, hook: Callable):
+    """
+    注册数据变更事件的回调, event 为 "*" 时接收所有事件
+    :param event: 事件名, 如 datasource.save
+    :param hook: 回调, 以 hook(event, **context) 的形式调用
+    """
+    _invalidation_hooks.setdefault(event, []).append(hook)
+
+
+def notify(event: str, **context):
+    """
+    通知数据已变更, 使对应的缓存失效并调用已注册的回调
+    :param event: 事件名
+    :param context: 事件相关信息, 如 id
+    """
+    prefixes = INVALIDATION_PREFIXES.get(event)
+    if prefixes:
+        http_cache.invalidate(*prefixes)
+    for hook in _invalidation_hooks.get(event, []) + _invalidation_hooks.get("*", []):
+        try:
+            hook(event, **context)
+        except Exception as e:
+            logger.fwarn("invalidation hook for {} failed: {}", event, e)
@@ -1,42 +1,87 @@
 from datetime import datetime
+import time
+
 import requests
 
 from tapflow.lib.request import set_req
 from tapflow.lib.utils.log import logger
 from tapflow.lib.cache import system_server_conf
 from tapflow.lib.backend_apis.common import LoginApi, UserInfo, LoginResult
+from tapflow.lib.session_store import DEFAULT_TTL, SessionStore, open_session_store, session_key
 
 
-def login_with_access_code(server, access_code, interactive=True):
-    if interactive:
-        print(f"{datetime.now().strftime('%a %b %d %H:%M:%S CST %Y')} \033[36m connecting remote server: {server} \033[0m")
-        print(f"{datetime.now().strftime('%a %b %d %H:%M:%S CST %Y')} \033[36m Welcome to TapData Live Data Platform, Enjoy Your Data Trip ! \033[0m")
-    req = set_req(server)
-    api = "http://" + server + "/api"
+def _login(req, access_code) -> dict:
+    """
+    用 access code 换取 token, 并查询当前用户
+    :return: 登录信息, 失败时返回 None
+    """
     login_api = LoginApi(req)
     login_result = login_api.login(access_code)
-    if login_result is None:
+    if not isinstance(login_result, LoginResult):
         logger.fwarn("init get token request fail, err is: {}", login_result)
-        return False
-    user_info = login_api.get_user_info(login_result.token, login_result.user_id)
-    if user_info.username is None:
+        return None
+    user_info = login_api.get_user(login_result.token, login_result.user_id)
+    if getattr(user_info, "username", None) is None:
         logger.fwarn("init get user info request fail", user_info)
-        return False
-    req.params = {"access_token": login_result.token}
-    cookies = {"user_id": login_result.user_id}
-    req.cookies = requests.cookies.cookiejar_from_dict(cookies)
-    ws_uri = "ws://" + server + "/ws/agent?access_token=" + login_result.token
-    conf = {
-        "api": api,
-        "access_code": access_code,
+        return None
+    return {
         "token": login_result.token,
         "user_id": login_result.user_id,
         "username": user_info.username,
+        "expires_at": login_result.expires_at or time.time() + DEFAULT_TTL,
+    }
+
+
+def _apply_session(req, server, access_code, session: dict):
+    token = session["token"]
+    req.params = {"access_token": token}
+    cookies = {"user_id": session["user_id"]}
+    req.cookies = requests.cookies.cookiejar_from_dict(cookies)
+    conf = {
+        "api": "http://" + server + "/api",
+        "access_code": access_code,
+        "token": token,
+        "user_id": session["user_id"],
+        "username": session["username"],
         "cookies": cookies,
-        "ws_uri": ws_uri,
-        "auth_param": "?access_token=" + login_result.token
+        "ws_uri": "ws://" + server + "/ws/agent?access_token=" + token,
+        "auth_param": "?access_token=" + token
     }
     system_server_conf.update(conf)
+
+
+def login_with_access_code(server, access_code, interactive=True, store: SessionStore = None):
+    """
+    使用 access code 登录; 上次登录的 token 未过期时直接使用, 不请求服务端, 被服务端拒绝(401)后重新登录
+    :param store: 登录信息的保存位置, 默认为 ~/.tapflow/session.json
+    """
+    if interactive:
+        print(f"{datetime.now().strftime('%a %b %d %H:%M:%S CST %Y')} \033[36m connecting remote server: {server} \033[0m")
+        print(f"{datetime.now().strftime('%a %b %d %H:%M:%S CST %Y')} \033[36m Welcome to TapData Live Data Platform, Enjoy Your Data Trip ! \033[0m")
+    req = set_req(server)
+    store = store if store is not None else open_session_store()
+    key = session_key(server, access_code)
+    session = store.load(key) if store is not None else None
+    if session is None:
+        session = _login(req, access_code)
+        if session is None:
+            return False
+        if store is not None:
+            store.save(key, session)
+
+    def reauthenticate():
+        if store is not None:
+            store.delete(key)
+        fresh = _login(req, access_code)
+        if fresh is None:
+            return False
+        if store is not None:
+            store.save(key, fresh)
+        _apply_session(req, server, access_code, fresh)
+        return True
+
+    _apply_session(req, server, access_code, session)
+    req.reauthenticate = reauthenticate
     return True
 
 
@@ -1,4 +1,6 @@
+import builtins
 import json
+import keyword
 
 from tapflow.lib.backend_apis.common import AgentApi, DatabaseTypesApi
 from tapflow.lib.backend_apis.connections import ConnectionsApi
@@ -11,22 +13,34 @@ from tapflow.lib.help_decorator import pad
 from tapflow.lib.data_pipeline.data_source import DataSource
 from tapflow.lib.data_services.api import Api
 from tapflow.lib.data_pipeline.job import Job
-from tapflow.lib.cache import client_cache
+from tapflow.lib.cache import MAX_CANDIDATES, EntityStore, client_cache
+from tapflow.lib.disk_cache import restore_client_cache
 from tapflow.lib.request import req
 
 # a quick datasource migrate job create direct use db name
 # you can use A.syncTo(B) create a migrate job very fast
-# QuickDataSourceMigrateJon is called by show_connections() via exec() dynamically, they must be in the same file.
+# QuickDataSourceMigrateJob objects are created per connection name by connection_object(), and resolved lazily by resolve_connection_name().
 class QuickDataSourceMigrateJob:
     def __init__(self):
         self.__db__ = ""
         self.__p__ = None
 
     def __getattr__(self, key):
-        if key in dir(self):
-            return getattr(self, key)
+        # 只有不存在的属性才会进入这里, 按表名解析为 "库名.表名", 不需要为每张表预先设置属性
+        if key.startswith("__") and key.endswith("__"):
+            raise AttributeError(key)
         return self.__db__ + "." + key
 
+    def __dir__(self):
+        # 补全时列出已加载的表名, 不触发加载
+        names = list(object.__dir__(self))
+        connections = client_cache.get("connections")
+        connection = connections._index("name_index").get(self.__db__) if isinstance(connections, EntityStore) else None
+        tables = client_cache["tables"].get(connection.get("id")) if connection else None
+        if isinstance(tables, EntityStore):
+            names.extend(name for name in tables._index("name_index") if isinstance(name, str) and name.isidentifier())
+        return names
+
     def syncTo(self, target, table=None, prefix="", suffix=""):
         if table is None:
             table = ["_"]
@@ -126,45 +140,68 @@ def get_obj(object_type, signature):
 
 def get_signature_v(object_type, signature):
     cache_map_index = op_object_command_class[object_type]["cache"]
-    if client_cache.get(cache_map_index) is None or object_type == "api" or object_type == "job":
-        exec("show_" + cache_map_index + "(quiet=True)")
     index_type = get_index_type(signature)
+    store = client_cache.get(cache_map_index)
+    if isinstance(store, EntityStore):
+        # 缓存按 TTL 过期重新加载, 找不到时单独查询这一个实体, 不需要每次都拉取全部数据
+        return store.lookup(signature, index_type)
+    if store is None or object_type == "api" or object_type == "job":
+        exec("show_" + cache_map_index + "(quiet=True)")
     if index_type == "short_id_index":
-        signature = match_line(client_cache[cache_map_index]["id_index"], signature)
+        signature = match_line(client_cache[cache_map_index], signature)
         index_type = "id_index"
     return client_cache[cache_map_index][index_type].get(signature)
 
 
 # some global utils, direct relation with this tool
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+_SHORT_ID_DIGITS = frozenset("0123456789abcdef")
+
+
 # get signature index type
 def get_index_type(s):
+    if isinstance(s, str):
+        # 按字符判断, 不再通过 int()/ObjectId() 抛出异常来试探
+        digits = s.strip()
+        if digits[:1] in ("+", "-"):
+            digits = digits[1:]
+        if digits.isdecimal():
+            return "number_index"
+        if len(s) == 24 and _HEX_DIGITS.issuperset(s):
+            return "id_index"
+        if len(s) == 6 and _SHORT_ID_DIGITS.issuperset(s):
+            return "short_id_index"
+        return "name_index"
     try:
-        number_index = int(s)
+        int(s)
         return "number_index"
-    except Exception as e:
-        # print(__file__, "try number index", e)
+    except Exception:
         pass
     from bson.objectid import ObjectId
     try:
-        id_index = ObjectId(s)
+        ObjectId(s)
         return "id_index"
-    except Exception as e:
-        # print(__file__, "try id index", e)
+    except Exception:
         pass
-    if len(s) == 6:
-        for i in s:
-            if ("0" <= i <= "9") or ("a" <= i <= "f"):
-                continue
-            return "name_index"
-    else:
-        return "name_index"
-    return "short_id_index"
+    return "name_index"
 
 
 def match_line(m, line):
-    for i in m:
-        if i.endswith(line):
-            return i
+    """
+    按短 id 找到完整 id, 有多个 id 以 line 结尾时给出提示, 不会返回其中任意一个
+    :param m: EntityStore/TableCache(使用后缀索引), 或 id_index 字典
+    :param line: 短 id
+    :return: 唯一匹配的完整 id, 否则返回 line
+    """
+    if hasattr(m, "match_short_id"):
+        matches = m.match_short_id(line)
+    else:
+        m = m.get("id_index", m)
+        matches = [i for i in m if i.endswith(line)][:MAX_CANDIDATES]
+    if len(matches) == 1:
+        return matches[0]
+    if len(matches) > 1:
+        logger.fwarn("id {} is ambiguous, matches: {}, please use a longer id", line, ", ".join(matches))
     return line
 
 
@@ -181,11 +218,11 @@ def get_table(source, t):
     table_id = ""
     index_type = get_index_type(t)
     if index_type == "short_id_index":
-        t = match_line(client_cache["tables"]["id_index"], t)
+        t = match_line(client_cache["tables"], t)
         index_type = "id_index"
     if index_type == "id_index":
         table_id = t
-    if client_cache["tables"].get(t) is None:
+    if client_cache["tables"].get(source) is None:
         show_tables(quiet=True, source=source)
 
     table = client_cache["tables"][source][index_type].get(t, None)
@@ -212,9 +249,8 @@ def show_tables(source=None, quiet=False, query=None):
             "warn", "notice", "notice", "notice"
         )
         return
-    source_name = client_cache["connections"]["id_index"][source]["name"]
-    data = MetadataInstanceApi(req).get_metadata_instance(source)
-    client_cache["tables"][source] = {"name_index": {}, "id_index": {}, "number_index": {}}
+    data = MetadataInstanceApi(req).list_tables(source)
+    client_cache["tables"].store_for(source).replace(_table_items(data))
     tables = []
     each_line_table_count = 5
     each_line_tables = []
@@ -226,15 +262,6 @@ def show_tables(source=None, quiet=False, query=None):
         if query is not None and query not in item["original_name"]:
             continue
         tables.append(item)
-        client_cache["tables"][source]["name_index"][item["original_name"]] = item
-        client_cache["tables"][source]["id_index"][item["id"]] = item
-        client_cache["tables"][source]["number_index"][str(i)] = item
-
-        statement = f'{source_name}.{item["original_name"]}="{source_name}.{item["original_name"]}"'
-        try:
-            exec(statement, globals())
-        except Exception:
-            pass
         if not quiet:
             each_line_tables.append(pad(item["original_name"], max_table_name_len))
             if len(each_line_tables) == each_line_table_count:
@@ -273,8 +300,7 @@ def show_connections(f=None, quiet=False):
     if show_connections_last_time + 1 > int(time.time()):
         return {}
     show_connections_last_time = int(time.time())
-    data = ConnectionsApi(req).get_connections(limit=10000)
-    client_cache["connections"] = {"name_index": {}, "id_index": {}, "number_index": {}}
+    data = _refresh_entities("connections", by_last_updated=True)
     if not quiet:
         logger.log(
             "{} {} {} {}",
@@ -286,20 +312,9 @@ def show_connections(f=None, quiet=False):
         )
     local_vars = {}
     for i in range(len(data)):
-        try:
-            if "name" not in data[i]:
-                continue
-            client_cache["connections"]["name_index"][data[i]["name"]] = data[i]
-            client_cache["connections"]["id_index"][data[i]["id"]] = data[i]
-            client_cache["connections"]["number_index"][str(i)] = data[i]
-        except Exception as e:
+        if "name" not in data[i]:
             continue
-
-        try:
-            exec(data[i]["name"] + " = QuickDataSourceMigrateJob()", globals())
-            exec(data[i]["name"] + ".__db__ = " + '"' + data[i]["name"] + '"', globals())
-        except Exception as e:
-            pass
+        _bind_connection(data[i]["name"])
 
         if not quiet:
             status = data[i].get("status", "unknown")
@@ -315,19 +330,120 @@ def show_connections(f=None, quiet=False):
     return globals()
 
 
+def warm_start(disk):
+    """
+    用磁盘缓存中的连接, connector, 任务和表结构填充 client_cache, 并绑定连接名称
+    :param disk: DiskCache
+    :return: 与 show_connections 相同, 返回绑定了连接名称的命名空间; 未恢复时返回 None, 需要从服务端加载
+    """
+    if not restore_client_cache(client_cache, disk):
+        return None
+    for item in client_cache["connections"].items_list():
+        _bind_connection(item["name"])
+    return globals()
+
+
+_connection_objects = {}
+
+
+def connection_object(name):
+    """
+    连接名称对应的 QuickDataSourceMigrateJob, 同一个名称始终返回同一个对象, syncTo 创建的任务不会丢失
+    """
+    obj = _connection_objects.get(name)
+    if obj is None:
+        obj = QuickDataSourceMigrateJob()
+        obj.__db__ = name
+        _connection_objects[name] = obj
+    return obj
+
+
+def _is_bindable(name) -> bool:
+    return isinstance(name, str) and name.isidentifier() and not keyword.iskeyword(name)
+
+
+def _bind_connection(name):
+    if _is_bindable(name):
+        globals()[name] = connection_object(name)
+
+
+def resolve_connection_name(name):
+    """
+    交互式命令行中未定义的名称按连接名称从缓存中解析为 QuickDataSourceMigrateJob, 见 tapflow.cli.namespace
+    :return: 不是已缓存的连接名称时返回 None
+    """
+    # 内置函数优先, 连接名称不会覆盖 print 等内置名称
+    if _is_bindable(name) and name not in builtins.__dict__:
+        connections = client_cache.get("connections")
+        if isinstance(connections, EntityStore) and name in connections._index("name_index"):
+            return connection_object(name)
+    return None
+
+
+def complete_connection_names(text):
+    """
+    IPython 补全: 按前缀从连接名称索引中查找
+    """
+    connections = client_cache.get("connections")
+    if not text or not _is_bindable(text) or not isinstance(connections, EntityStore):
+        return []
+    return [name for name in connections.complete(text, limit=50) if _is_bindable(name)]
+
+
+def cache_connection(connection):
+    """
+    保存或修改连接后只更新这一个连接的缓存, 不重新拉取全部连接
+    """
+    if not isinstance(connection, dict) or "id" not in connection or "name" not in connection:
+        return
+    client_cache["connections"].upsert(connection)
+    _bind_connection(connection["name"])
+
+
+def _fetch_connection(index_type, signature):
+    if index_type == "id_index":
+        return ConnectionsApi(req).get_connection(connection_id=signature)
+    return ConnectionsApi(req).get_connection(connection_name=signature)
+
+
+def _fetch_job(index_type, signature):
+    if index_type == "id_index":
+        return TaskApi(req).get_task_by_id(signature)
+    return TaskApi(req).get_task_by_name(signature)
+
+
+def _table_items(data):
+    return [item for item in data if item.get("meta_type") != "database" and "original_name" in item]
+
+
+def _connector_entries(data):
+    return {item["name"].lower(): {
+        "pdkHash": item["pdkHash"],
+        "pdkId": item["pdkId"],
+        "pdkType": "pdk",
+        "name": item["name"],
+        "properties": item.get("properties", {}).get("connection", {}).get("properties", {}),
+    } for item in data}
+
+
+def _api_entries(data):
+    connections = client_cache["connections"]["id_index"]
+    return [{
+        "id": item["id"],
+        "table": item["tableName"],
+        "name": item["name"],
+        "tableName": item["tableName"],
+        "database": connections[item["datasource"]]["name"],
+    } for item in data]
+
+
 # show all connectors
 def show_connectors(quiet=True):
     data = DatabaseTypesApi(req).get_all_connectors()
+    client_cache["connectors"].replace(_connector_entries(data))
     o=0
     for i in range(len(data)):
         o += 1
-        client_cache["connectors"][data[i]["name"].lower()] = {
-            "pdkHash": data[i]["pdkHash"],
-            "pdkId": data[i]["pdkId"],
-            "pdkType": "pdk",
-            "name": data[i]["name"],
-            "properties": data[i].get("properties", {}).get("connection", {}).get("properties", {}),
-        }
         if not quiet:
             x = "Alpha"
             if "Authentication" in data[i]:
@@ -342,6 +458,24 @@ def get_all_jobs():
     return TaskApi(req).get_all_tasks()
 
 
+def _refresh_entities(kind: str, by_last_updated: bool = False) -> list:
+    """
+    刷新连接或任务缓存, 已加载过时只拉取上次刷新后变更的实体
+    :param kind: connections 或 jobs
+    :param by_last_updated: 按 last_updated 倒序返回, 否则按序号返回
+    :return: 缓存中的全部实体
+    """
+    store = client_cache[kind]
+    store.refresh()
+    items = store.items_list()
+    if by_last_updated:
+        items.sort(key=lambda item: item.get("last_updated") or "", reverse=True)
+    else:
+        numbers = {id(item): int(number) for number, item in store._index("number_index").items()}
+        items.sort(key=lambda item: numbers.get(id(item), 0))
+    return items
+
+
 # show all jobs
 def show_jobs(query=None, quiet=False):
 
@@ -354,18 +488,13 @@ def show_jobs(query=None, quiet=False):
         )
 
     if query is None:
-        data = get_all_jobs()
-        jobs = {"name_index": {}, "id_index": {}, "number_index": {}}
+        data = _refresh_entities("jobs")
         # logger.finfo("system has {} jobs", len(data))
         for i in range(len(data)):
             if "name" not in data[i]:
                 continue
             if not quiet:
                 print_job(data[i])
-            jobs["name_index"][data[i]["name"]] = data[i]
-            jobs["id_index"][data[i]["id"]] = data[i]
-            jobs["number_index"][str(i)] = data[i]
-        client_cache["jobs"] = jobs
     else:
         data = TaskApi(req).filter_tasks_by_name(query)
         for i in range(len(data)):
@@ -382,7 +511,7 @@ def show_flows(*args, **kwargs):
 # show all apis
 def show_apis(quiet=False):
     data = ApiServersApi(req).get_all_api_servers()
-    client_cache["apis"]["name_index"] = {}
+    client_cache["apis"].replace(_api_entries(data))
     if not quiet:
         logger.log(
             "{} {} {} {} {}",
@@ -393,14 +522,6 @@ def show_apis(quiet=False):
             "test url", "debug", "debug", "debug", "debug", "debug"
         )
     for i in range(len(data)):
-        client_cache["connections"]["id_index"][data[i]["datasource"]]["name"]
-        client_cache["apis"]["name_index"][data[i]["name"]] = {
-            "id": data[i]["id"],
-            "table": data[i]["tableName"],
-            "name": data[i]["name"],
-            "tableName": data[i]["tableName"],
-            "database": client_cache["connections"]["id_index"][data[i]["datasource"]]["name"],
-        }
         if not quiet:
             logger.log(
                 "{} {} {} {} {}",
@@ -413,3 +534,17 @@ def show_apis(quiet=False):
             )
 
 
+# 缓存冷启动或过期时按需加载
+client_cache["connections"].loader = lambda: ConnectionsApi(req).iter_connections(limit=10000)
+client_cache["connections"].fetch_one = _fetch_connection
+client_cache["connections"].delta_loader = lambda since: ConnectionsApi(req).get_connections_updated_since(since)
+client_cache["connections"].count_loader = lambda: ConnectionsApi(req).count_connections()
+client_cache["connections"].ids_loader = lambda: ConnectionsApi(req).get_connection_ids()
+client_cache["jobs"].loader = lambda: TaskApi(req).iter_all_tasks()
+client_cache["jobs"].fetch_one = _fetch_job
+client_cache["jobs"].delta_loader = lambda since: TaskApi(req).get_tasks_updated_since(since)
+client_cache["jobs"].count_loader = lambda: TaskApi(req).count_tasks()
+client_cache["jobs"].ids_loader = lambda: TaskApi(req).get_task_ids()
+client_cache["apis"].loader = lambda: _api_entries(ApiServersApi(req).get_all_api_servers())
+client_cache["connectors"].loader = lambda: _connector_entries(DatabaseTypesApi(req).get_all_connectors())
+client_cache["tables"].loader_factory = lambda source: lambda: _table_items(MetadataInstanceApi(req).iter_metadata_instances(source))
@@ -5,9 +5,16 @@ import hmac
 import hashlib
 import base64
 import uuid
+import threading
 import time
 import requests
 import urllib.parse
+from requests.adapters import HTTPAdapter
+
+from tapflow.lib.transport import CircuitBreaker, RetryPolicy, TimeoutPolicy, DEFAULT_POOL_SIZE
+from tapflow.lib.utils.fast_json import parse_once
+from tapflow.lib.http_cache import http_cache
+from tapflow.lib.utils.profiler import profiler
 
 class RequestSession(requests.Session):
     def sign(self, string_to_sign, access_key_secret):
@@ -30,7 +37,9 @@ class RequestSession(requests.Session):
 
     def generate_signed_params(self, request: requests.Request):
         import json
-        params = request.params
+        # 复制一份参数, 重试时不会带上上一次请求生成的签名
+        params = dict(request.params or {})
+        params.pop("sign", None)
         data = ""
         if request.json is not None:
             data = json.dumps(request.json)
@@ -61,8 +70,8 @@ class RequestSession(requests.Session):
         return params
 
 
-    def sign_request(self, request: requests.Request) -> requests.Request:
-        request.url = self.base_url + request.url
+    def sign_request(self, request: requests.Request, base_url: str = None) -> requests.Request:
+        request.url = (base_url or self.base_url) + request.url
         params = self.generate_signed_params(request)
         request.params = params
         return request
@@ -76,6 +85,43 @@ class RequestSession(requests.Session):
         self.params = {}
         super(RequestSession, self).__init__()
         self.mode = "op"
+        self.pool_size = DEFAULT_POOL_SIZE
+        self.retry_policy = RetryPolicy()
+        self.timeout_policy = TimeoutPolicy()
+        self.circuit_breaker = CircuitBreaker()
+        self.http_cache = http_cache
+        # 录制/回放后端请求, 见 tapflow.lib.cassette
+        self.cassette = None
+        # token 被拒绝(401)时调用, 重新登录成功返回 True, 见 tapflow.lib.login
+        self.reauthenticate = None
+        self._auth_lock = threading.RLock()
+        self._reauthenticating = False
+        self._mount_adapters()
+
+    def _mount_adapters(self):
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def configure_transport(self, pool_size: int = None, retry_policy: RetryPolicy = None,
+                            timeout_policy: TimeoutPolicy = None, circuit_breaker: CircuitBreaker = None):
+        """
+        调整传输层配置
+        :param pool_size: 连接池大小, 建议不小于并发线程数
+        :param retry_policy: 幂等请求重试策略
+        :param timeout_policy: 按接口的超时策略
+        :param circuit_breaker: 熔断器
+        """
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        if timeout_policy is not None:
+            self.timeout_policy = timeout_policy
+        if circuit_breaker is not None:
+            self.circuit_breaker = circuit_breaker
+        if pool_size is not None and pool_size != self.pool_size:
+            self.pool_size = pool_size
+            self._mount_adapters()
+        return self
 
     def prepare_request(self, request: requests.Request) -> requests.PreparedRequest:
         url_map = {
@@ -85,14 +131,20 @@ class RequestSession(requests.Session):
             "/agent/agentCount": "/api/tcm",
         }
         if self.mode == "cloud":
-            self.base_url = self.server + url_map.get(request.url, "/tm/api")
-            request = self.sign_request(request)
+            # 不修改 self.base_url, 避免多线程共享会话时相互覆盖
+            request = self.sign_request(request, self.server + url_map.get(request.url, "/tm/api"))
         else:
             request.url = self.base_url + request.url
         return super(RequestSession, self).prepare_request(request)
     
     def authentication_check(self, response: requests.Response):
-        res = response.json()
+        try:
+            res = response.json()
+        except ValueError:
+            # 非 JSON 响应(如网关错误页)不包含认证信息, 交给调用方处理
+            return True
+        if not isinstance(res, dict):
+            return True
         if self.mode == "cloud":
             if res.get("code") == "NotFoundAccessKey":
                 logger.error("{}", "Access key not found. Please verify your AK & SK in the configuration file.")
@@ -106,17 +158,154 @@ class RequestSession(requests.Session):
             else:
                 return True
     
+    def _renew_token(self, token) -> bool:
+        """
+        请求因 token 被拒绝而失败时重新登录
+        :param token: 发出请求时使用的 token
+        :return: 是否可以用新的 token 重试
+        """
+        with self._auth_lock:
+            if self.params.get("access_token") != token:
+                # 其他线程已经重新登录
+                return True
+            if self.reauthenticate is None or self._reauthenticating:
+                return False
+            self._reauthenticating = True
+            try:
+                return bool(self.reauthenticate())
+            finally:
+                self._reauthenticating = False
+
     def request(self, method, url, *args, **kwargs):
-        response = super().request(method, url, *args, **kwargs)
+        token = self.params.get("access_token")
+        response = self._request(method, url, *args, **kwargs)
+        if response.status_code == 401 and token is not None and self._renew_token(token):
+            logger.fdebug("token rejected, retrying {} {} with a new token", method, url)
+            response.close()
+            response = self._request(method, url, *args, **kwargs)
+        return response
+
+    def _request(self, method, url, *args, **kwargs):
+        path = url.split("?", 1)[0]
+        # 流式请求由调用方边接收边解析, 走缓存需要先读取完整的响应体, 因此不使用缓存
+        rule = self.http_cache.rule_for(method, path, kwargs.get("params")) \
+            if not args and not kwargs.get("stream") else None
+        start = time.time()
+        try:
+            if rule is None:
+                response = self._send(method, url, *args, **kwargs)
+            else:
+                response = self._cached_send(rule, method, url, path, **kwargs)
+        except Exception:
+            profiler.record_request(method, path, time.time() - start, ok=False)
+            raise
+        content = getattr(response, "_content", None)
+        profiler.record_request(method, path, time.time() - start, len(content) if isinstance(content, bytes) else 0,
+                                ok=response.status_code < 400, cached=getattr(response, "from_cache", False) is True)
+        parse_once(response)
+        if kwargs.get("stream") and response.status_code == 200:
+            # 流式响应由调用方边接收边解析, 这里读取响应体会失去流式读取的意义
+            return response
         if not self.authentication_check(response):
             os._exit(1)
         return response
 
+    def _cached_send(self, rule, method, url, path, **kwargs) -> requests.Response:
+        cache = self.http_cache
+        scope = (self.server, tuple(sorted(self.params.items())))
+        key = cache.make_key(scope, method, url, kwargs.get("params"), kwargs.get("json"))
+        entry = cache.get(key)
+        if entry is not None and entry.fresh():
+            cache.hits += 1
+            return entry.to_response()
+        if entry is not None and entry.revalidatable():
+            headers = dict(kwargs.get("headers") or {})
+            headers.update(entry.validators())
+            kwargs["headers"] = headers
+            response = self._send(method, url, **kwargs)
+            if response.status_code == 304:
+                cache.revalidations += 1
+                cache.touch(key)
+                return entry.to_response()
+            cache.misses += 1
+        else:
+            cache.misses += 1
+            response = self._send(method, url, **kwargs)
+        if response.status_code == 200:
+            cache.put(key, path, response, rule.ttl)
+        return response
+
+    def _send(self, method, url, *args, **kwargs) -> requests.Response:
+        cassette = self.cassette
+        if cassette is not None and not cassette.recording:
+            return cassette.play(method, url, kwargs)
+        start = time.time()
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout_policy.get(url)
+        retryable = self.retry_policy.is_retryable(method)
+        attempt = 0
+        while True:
+            self.circuit_breaker.before_request()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.circuit_breaker.record_failure()
+                if not retryable or attempt >= self.retry_policy.total:
+                    raise
+                logger.fwarn("request {} {} failed: {}, retrying", method, url, e)
+            except BaseException:
+                # 其他异常(如 ChunkedEncodingError, TooManyRedirects)不重试, 但也要结束半开状态的探测
+                self.circuit_breaker.record_failure()
+                raise
+            else:
+                if not self.retry_policy.should_retry_status(response.status_code):
+                    self.circuit_breaker.record_success()
+                    break
+                self.circuit_breaker.record_failure()
+                if not retryable or attempt >= self.retry_policy.total:
+                    break
+                logger.fwarn("request {} {} got status {}, retrying", method, url, response.status_code)
+            time.sleep(self.retry_policy.backoff(attempt))
+            attempt += 1
+        if cassette is not None:
+            cassette.record(method, url, kwargs, response, time.time() - start)
+        return response
+
     def set_ak_sk(self, ak, sk):
         self.ak = ak
         self.sk = sk
         self.mode = "cloud"
 
+    def clone(self) -> "RequestSession":
+        """
+        复制一个拥有相同服务地址和认证信息的新会话, 新会话拥有独立的连接池
+        :return: RequestSession
+        """
+        session = RequestSession(self.server)
+        session.base_url = self.base_url
+        session.params = dict(self.params)
+        session.cookies.update(self.cookies)
+        if self.mode == "cloud":
+            session.set_ak_sk(self.ak, self.sk)
+        # 副本访问的是同一个服务端, 共享传输策略和熔断状态
+        session.configure_transport(self.pool_size, self.retry_policy, self.timeout_policy, self.circuit_breaker)
+        session.http_cache = self.http_cache
+        session.cassette = self.cassette
+        return session
+
+    def fingerprint(self) -> tuple:
+        """
+        会话的认证指纹, 登录信息变化后指纹随之变化, 用于判断复制出的会话是否过期
+        :return: tuple
+        """
+        return (
+            self.server,
+            self.mode,
+            getattr(self, "ak", None),
+            tuple(sorted(self.params.items())),
+            tuple(sorted(self.cookies.items())),
+        )
+
 
 req = RequestSession("127.0.0.1:3030")
 def set_req(server):
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from tapflow.lib.disk_cache import scope_for
+from tapflow.lib.utils.log import logger
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".tapflow", "session.json")
+
+# 服务端没有返回有效期时, token 最多复用这么久(秒)
+DEFAULT_TTL = 24 * 3600
+
+# 距离过期不足这个时间(秒)的 token 不再复用, 避免在执行过程中过期
+EXPIRY_MARGIN = 300
+
+# 设置为 0 时每次启动都重新登录
+ENV_SWITCH = "TAPFLOW_SESSION_CACHE"
+
+
+class SessionStore:
+    """
+    保存在 ~/.tapflow/session.json 中的登录信息(token, user_id, username 及过期时间), 按服务地址和 access code 隔离
+
+    文件权限为 0600, access code 只保存摘要; 未过期的 token 在下次启动时直接使用, 被服务端拒绝后删除并重新登录
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.fdebug("read session file {} failed: {}", self.path, e)
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write(self, data: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        # 先以 0600 创建临时文件再替换, 文件内容任何时候都不会被其他用户读到
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def load(self, key: str) -> Optional[dict]:
+        """
+        读取登录信息
+        :param key: 见 session_key
+        :return: 登录信息, 不存在或即将过期时返回 None
+        """
+        with self._lock:
+            session = self._read().get(key)
+        if not isinstance(session, dict) or not session.get("token"):
+            return None
+        if session.get("expires_at", 0) - EXPIRY_MARGIN < time.time():
+            return None
+        return session
+
+    def save(self, key: str, session: dict):
+        """
+        保存登录信息, 同时清理已过期的记录
+        :param session: 包含 token, user_id, username, expires_at
+        """
+        now = time.time()
+        with self._lock:
+            data = {k: v for k, v in self._read().items() if isinstance(v, dict) and v.get("expires_at", 0) > now}
+            data[key] = session
+            try:
+                self._write(data)
+            except OSError as e:
+                logger.fdebug("write session file {} failed: {}", self.path, e)
+
+    def delete(self, key: str):
+        with self._lock:
+            data = self._read()
+            if data.pop(key, None) is not None:
+                try:
+                    self._write(data)
+                except OSError as e:
+                    logger.fdebug("write session file {} failed: {}", self.path, e)
+
+
+def session_key(server: str, access_code: str) -> str:
+    return scope_for(server, access_code)
+
+
+def open_session_store(path: str = DEFAULT_PATH) -> Optional[SessionStore]:
+    """
+    被禁用时返回 None, 每次启动都重新登录
+    """
+    if os.environ.get(ENV_SWITCH, "1") == "0":
+        return None
+    return SessionStore(path)
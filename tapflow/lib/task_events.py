@@ -0,0 +1,420 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from tapflow.lib.backend_apis.task import TASK_STATUS_FIELDS, TaskApi
+from tapflow.lib.cache import system_server_conf
+from tapflow.lib.utils.log import logger
+from tapflow.lib.utils.ws import gen_ws_uuid
+
+# 设置为 0 时不使用推送, 只批量轮询
+ENV_SWITCH = "TAPFLOW_TASK_PUSH"
+
+# 推送订阅的任务字段: 状态, 里程碑(attrs.milestone, syncStatus) 和统计
+WATCH_FIELDS = dict(TASK_STATUS_FIELDS, stats=True)
+
+# 建立连接并收到第一条推送的超时时间(秒), 超时后认为服务端不支持推送
+CONNECT_TIMEOUT = 3
+
+# 推送不可用后, 多久之后再尝试连接(秒)
+RETRY_INTERVAL = 60
+
+# 推送正常时也按这个间隔(秒)查询一次, 防止推送丢失导致一直等待
+RECHECK_INTERVAL = 30
+
+# 没有推送时默认的轮询间隔(秒)
+POLL_INTERVAL = 1
+
+# 一次查询的最大任务数, 避免查询参数过长
+POLL_BATCH_SIZE = 200
+
+# 连续连接失败这么多次后放弃推送
+MAX_CONNECT_FAILURES = 3
+
+# 接收推送时检查订阅变化的间隔(秒)
+_RECV_TIMEOUT = 0.2
+
+# websockets 14 起 connect 的请求头参数改名为 additional_headers
+_HEADERS_ARG = None
+
+
+def _headers_arg() -> str:
+    global _HEADERS_ARG
+    if _HEADERS_ARG is None:
+        import websockets
+        major = int(str(websockets.__version__).split(".")[0])
+        _HEADERS_ARG = "additional_headers" if major >= 14 else "extra_headers"
+    return _HEADERS_ARG
+
+
+def watch_message(task_ids: List[str]) -> dict:
+    """
+    /ws/agent 上订阅任务变更的消息; 服务端先推送每个任务的当前字段, 之后推送变更:
+    {"type": "watch", "data": {"operationType": "update", "documentKey": {"id": ...}, "fullDocument": {...}}}
+    """
+    return {
+        "type": "watch",
+        "collection": "Task",
+        "filter": {"where": {"id": {"$in": list(task_ids)}}, "fields": WATCH_FIELDS},
+    }
+
+
+class TaskSubscription:
+    """
+    一个任务的订阅, 保存服务端推送或批量轮询得到的最新任务字段
+
+    可以注册回调, 也可以同步等待或用 future 等待某个条件成立; 用完后调用 close 或使用 with 语句
+    """
+
+    def __init__(self, hub: "TaskEventHub", task_id: str, callback: Callable[[dict], None] = None,
+                 interval: float = POLL_INTERVAL):
+        """
+        :param hub: 所属的 TaskEventHub
+        :param task_id: 任务 id
+        :param callback: 任务字段变化时调用, 参数为最新的任务字段
+        :param interval: 没有推送时的轮询间隔(秒)
+        """
+        self.hub = hub
+        self.task_id = task_id
+        self.callback = callback
+        self.interval = interval
+        self.task = {}
+        self.updates = 0
+        self.pushed = False
+        self._cond = threading.Condition()
+        self._futures = []
+        self.closed = False
+
+    def _update(self, changes: dict, pushed: bool = False):
+        with self._cond:
+            self.pushed = self.pushed or pushed
+            self.task.update(changes)
+            self.updates += 1
+            snapshot = dict(self.task)
+            done = [(predicate, future) for predicate, future in self._futures if predicate(snapshot)]
+            self._futures = [item for item in self._futures if item not in done]
+            self._cond.notify_all()
+        for _, future in done:
+            if not future.done():
+                future.set_result(snapshot)
+        if self.callback is not None:
+            try:
+                self.callback(snapshot)
+            except Exception as e:
+                logger.fdebug("task {} callback failed: {}", self.task_id, e)
+
+    def wait_for(self, predicate: Callable[[dict], bool], timeout: float) -> Optional[dict]:
+        """
+        等待 predicate(任务字段) 成立
+        :param predicate: 判断条件
+        :param timeout: 超时时间(秒)
+        :return: 条件成立时的任务字段, 超时返回 None
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                if self.task and predicate(self.task):
+                    return dict(self.task)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def future(self, predicate: Callable[[dict], bool]) -> Future:
+        """
+        返回一个 future, predicate(任务字段) 成立时完成, 结果为任务字段
+        """
+        future = Future()
+        with self._cond:
+            if self.task and predicate(self.task):
+                future.set_result(dict(self.task))
+            else:
+                self._futures.append((predicate, future))
+        return future
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub.unwatch(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TaskPoller:
+    """
+    所有订阅共用的轮询线程: 每个周期把到期的任务合并成一次 /Task 查询(where id in [...], 只返回状态和里程碑字段),
+    结果分发给订阅者; 请求数只与轮询间隔有关, 与等待的任务数无关
+    """
+
+    def __init__(self, hub: "TaskEventHub"):
+        self.hub = hub
+        self._last = {}
+        self._thread = None
+        self._wake = threading.Event()
+
+    def wake(self):
+        """
+        启动轮询线程并立即查询一次, 新订阅的任务不需要等到下一个周期
+        """
+        with self.hub._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tapflow-task-poller", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def poll_once(self, now: float = None) -> int:
+        """
+        查询所有到期的任务
+        :return: 本次查询的任务数
+        """
+        now = time.time() if now is None else now
+        due = self.hub._poll_targets(now, self._last)
+        for i in range(0, len(due), POLL_BATCH_SIZE):
+            chunk = due[i:i + POLL_BATCH_SIZE]
+            try:
+                tasks = TaskApi(self.hub._session()).get_tasks_status(chunk)
+            except Exception as e:
+                logger.fdebug("poll task status failed: {}", e)
+                continue
+            self.hub.stats["polls"] += 1
+            for task_id in chunk:
+                self._last[task_id] = now
+            for task in tasks:
+                self.hub.publish(task)
+        return len(due)
+
+    def _run(self):
+        while True:
+            with self.hub._lock:
+                if not self.hub._subs:
+                    # 在锁内退出, 保证之后的订阅会启动新的线程
+                    self._thread = None
+                    self._last.clear()
+                    return
+            self._wake.clear()
+            self.poll_once()
+            self._wake.wait(self.hub._tick())
+
+
+class TaskEventHub:
+    """
+    任务状态, 里程碑和统计变更的订阅中心, 分发给各个 TaskSubscription
+
+    优先通过 /ws/agent websocket 接收推送, 所有订阅共用一个连接, 订阅的任务变化时重新发送 watch 消息;
+    推送不可用或还没有收到推送的任务由 TaskPoller 批量轮询
+    """
+
+    def __init__(self, session=None, ws_uri: str = None):
+        """
+        :param session: 轮询使用的 RequestSession, 默认使用全局 req
+        :param ws_uri: websocket 地址, 默认使用登录时生成的 system_server_conf["ws_uri"]
+        """
+        self.session = session
+        self.ws_uri = ws_uri
+        self._subs: Dict[str, List[TaskSubscription]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._unavailable_until = 0
+        self.connected = False
+        self.poller = TaskPoller(self)
+        self._listeners: List[Callable[[dict], None]] = []
+        self.stats = {"connects": 0, "pushed": 0, "polls": 0}
+
+    def _session(self):
+        if self.session is not None:
+            return self.session
+        from tapflow.lib.request import req
+        return req
+
+    def _target(self):
+        """
+        :return: (websocket 地址, 请求头)
+        """
+        if self.ws_uri is not None:
+            return self.ws_uri, []
+        session = self._session()
+        if session.mode == "cloud":
+            uri = "{}/tm/ws/agent?id={}".format(session.server.replace("https://", "wss://"), gen_ws_uuid())
+            cookies = session.cookies.get_dict()
+            return uri, [("Cookie", "; ".join("{}={}".format(k, v) for k, v in cookies.items()))]
+        uri = system_server_conf.get("ws_uri")
+        if not uri:
+            return None, []
+        return uri + "&id=" + gen_ws_uuid(), []
+
+    def available(self) -> bool:
+        """
+        推送是否可用
+        """
+        if os.environ.get(ENV_SWITCH, "1") == "0" or time.time() < self._unavailable_until:
+            return False
+        return self.ws_uri is not None or self._session().mode == "cloud" or bool(system_server_conf.get("ws_uri"))
+
+    def watch(self, task_id: str, callback: Callable[[dict], None] = None,
+              interval: float = POLL_INTERVAL) -> TaskSubscription:
+        """
+        订阅一个任务, 推送不可用时由 TaskPoller 轮询
+        :param task_id: 任务 id
+        :param callback: 任务字段变化时调用
+        :param interval: 没有推送时的轮询间隔(秒)
+        :return: TaskSubscription
+        """
+        if not task_id:
+            raise ValueError("task id is required")
+        sub = TaskSubscription(self, task_id, callback, interval)
+        push = self.available()
+        with self._lock:
+            self._subs.setdefault(task_id, []).append(sub)
+            if push and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tapflow-task-events", daemon=True)
+                self._thread.start()
+        self.poller.wake()
+        return sub
+
+    def unwatch(self, sub: TaskSubscription):
+        with self._lock:
+            subs = self._subs.get(sub.task_id, [])
+            if sub in subs:
+                subs.remove(sub)
+            if not subs:
+                self._subs.pop(sub.task_id, None)
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """
+        注册监听者, 收到任何任务的变更时调用, 参数为变更的任务字段; 不会增加轮询的任务
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def watched(self) -> List[str]:
+        with self._lock:
+            return sorted(self._subs)
+
+    def _pushing(self, sub: TaskSubscription) -> bool:
+        return self.connected and sub.pushed
+
+    def _poll_targets(self, now: float, last: Dict[str, float]) -> List[str]:
+        """
+        到期需要轮询的任务: 正在接收推送的任务按 RECHECK_INTERVAL, 其余按订阅中最小的 interval
+        """
+        with self._lock:
+            due = []
+            for task_id, subs in self._subs.items():
+                if all(self._pushing(sub) for sub in subs):
+                    interval = RECHECK_INTERVAL
+                else:
+                    interval = min(sub.interval for sub in subs)
+                if now - last.get(task_id, 0) >= interval:
+                    due.append(task_id)
+            return due
+
+    def _tick(self) -> float:
+        """
+        轮询线程的周期(秒)
+        """
+        with self._lock:
+            intervals = [sub.interval for subs in self._subs.values() for sub in subs if not self._pushing(sub)]
+        return min(intervals + [RECHECK_INTERVAL])
+
+    def publish(self, task: dict, pushed: bool = False):
+        """
+        把一个任务的变更分发给订阅者
+        :param task: 包含 id 的任务字段
+        :param pushed: 是否来自服务端推送
+        """
+        with self._lock:
+            subs = list(self._subs.get(task.get("id"), []))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(task)
+        for sub in subs:
+            sub._update(task, pushed)
+
+    def _on_message(self, raw) -> bool:
+        """
+        :return: 是否为任务变更的推送
+        """
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return False
+        if not isinstance(message, dict) or message.get("type") != "watch":
+            return False
+        data = message.get("data") or {}
+        task = dict(data.get("fullDocument") or {})
+        task.setdefault("id", (data.get("documentKey") or {}).get("id"))
+        if task.get("id"):
+            self.stats["pushed"] += 1
+            self.publish(task, pushed=True)
+        return True
+
+    def _give_up(self):
+        self._unavailable_until = time.time() + RETRY_INTERVAL
+        with self._lock:
+            self._thread = None
+        logger.fdebug("task push unavailable, polling task status")
+
+    def _run(self):
+        failures = 0
+        while True:
+            try:
+                if not asyncio.run(self._serve()):
+                    # 连接成功但服务端不推送
+                    self._give_up()
+                return
+            except Exception as e:
+                self.connected = False
+                failures += 1
+                logger.fdebug("task push connection failed: {}", e)
+            if failures >= MAX_CONNECT_FAILURES:
+                self._give_up()
+                return
+            time.sleep(POLL_INTERVAL)
+
+    async def _serve(self) -> bool:
+        """
+        :return: 没有订阅后退出时返回 True, 服务端在 CONNECT_TIMEOUT 内没有推送时返回 False
+        """
+        import websockets
+        uri, headers = self._target()
+        if uri is None:
+            raise ValueError("no websocket address, please login first")
+        kwargs = {"open_timeout": CONNECT_TIMEOUT}
+        if headers:
+            kwargs[_headers_arg()] = headers
+        async with websockets.connect(uri, **kwargs) as ws:
+            self.stats["connects"] += 1
+            self.connected = True
+            try:
+                sent, sent_at, confirmed = None, 0, False
+                while True:
+                    with self._lock:
+                        if not self._subs:
+                            # 在锁内退出, 保证之后的订阅会启动新的线程
+                            self._thread = None
+                            return True
+                        ids = sorted(self._subs)
+                    if ids != sent:
+                        await ws.send(json.dumps(watch_message(ids)))
+                        sent, sent_at = ids, time.time()
+                    if not confirmed and time.time() - sent_at > CONNECT_TIMEOUT:
+                        return False
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), _RECV_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        continue
+                    confirmed = self._on_message(raw) or confirmed
+            finally:
+                self.connected = False
+
+
+# 全局实例, 使用登录后的 req 和 ws_uri
+task_events = TaskEventHub()
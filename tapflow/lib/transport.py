@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+from typing import Dict, Tuple, Union
+
+import requests
+
+
+Timeout = Union[float, Tuple[float, float]]
+
+# 连接池默认大小, 与 ProjectScheduler 默认并行度相比留有余量
+DEFAULT_POOL_SIZE = 16
+
+# 按接口前缀配置的超时时间(连接超时, 读取超时), 最长前缀优先匹配
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    "/measurement/batch": 3,
+    "/proxy/call": (10, 300),
+    "/MetadataInstances": (10, 120),
+    "/Task/batchStart": (10, 120),
+    "/Task/batchStop": (10, 120),
+}
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    熔断器打开时快速失败抛出的异常, 继承自 ConnectionError, 已有的连接异常处理逻辑同样适用
+    """
+
+
+class RetryPolicy:
+    """
+    幂等请求的重试策略, 使用带抖动的指数退避(full jitter)
+    """
+
+    def __init__(self, total: int = 3, backoff_factor: float = 0.5, max_backoff: float = 10,
+                 methods=("GET", "HEAD", "OPTIONS"), status_forcelist=(429, 502, 503, 504)):
+        """
+        :param total: 最大重试次数, 0 表示不重试
+        :param backoff_factor: 退避基数(秒), 第 n 次重试最多等待 backoff_factor * 2^n 秒
+        :param max_backoff: 单次等待上限(秒)
+        :param methods: 允许重试的 HTTP 方法
+        :param status_forcelist: 需要重试的响应状态码
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.methods = {m.upper() for m in methods}
+        self.status_forcelist = set(status_forcelist)
+
+    def is_retryable(self, method: str) -> bool:
+        return str(method).upper() in self.methods
+
+    def should_retry_status(self, status_code: int) -> bool:
+        return status_code in self.status_forcelist
+
+    def backoff(self, attempt: int) -> float:
+        """
+        :param attempt: 已重试次数, 从 0 开始
+        :return: 本次重试前需要等待的秒数
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+
+class TimeoutPolicy:
+    """
+    按接口前缀选择超时时间
+    """
+
+    def __init__(self, rules: Dict[str, Timeout] = None, default: Timeout = DEFAULT_TIMEOUT):
+        self.rules = dict(DEFAULT_ENDPOINT_TIMEOUTS if rules is None else rules)
+        self.default = default
+
+    def get(self, url: str) -> Timeout:
+        path = url.split("?", 1)[0]
+        matched = None
+        for prefix in self.rules:
+            if path.startswith(prefix) and (matched is None or len(prefix) > len(matched)):
+                matched = prefix
+        if matched is None:
+            return self.default
+        return self.rules[matched]
+
+
+class CircuitBreaker:
+    """
+    熔断器: 连续失败次数达到阈值后打开, 在 recovery_timeout 秒内直接失败, 不再请求服务端;
+    到期后进入半开状态, 只放行一个探测请求, 成功则关闭, 失败则再次打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError("TapData Manager is unavailable, circuit breaker is open, retry after {}s".format(
+                max(0, int(self.recovery_timeout - (time.time() - self.opened_at)))))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def reset(self):
+        self.record_success()
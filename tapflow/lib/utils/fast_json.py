@@ -0,0 +1,58 @@
+import json
+
+# orjson 解析大体积响应比标准库快数倍, 未安装时退回标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """
+    解析 JSON, 优先使用 orjson
+    :param data: bytes 或 str
+    :return: 解析结果
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """
+    序列化为 UTF-8 编码的 JSON, 优先使用 orjson
+    :param obj: 待序列化的对象
+    :return: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def response_json(response):
+    """
+    解析 requests.Response 的 JSON 内容, 结果缓存在 response 上, 同一个响应只解析一次
+    :param response: requests.Response
+    :return: 解析结果
+    """
+    try:
+        return response.__dict__["_json_cache"]
+    except KeyError:
+        pass
+    encoding = response.encoding
+    if encoding is None or encoding.lower().replace("-", "") in ("utf8", "ascii"):
+        data = loads(response.content)
+    else:
+        data = loads(response.text)
+    response.__dict__["_json_cache"] = data
+    return data
+
+
+def parse_once(response):
+    """
+    让 response.json() 只解析一次, 之后的调用直接返回缓存结果
+    :param response: requests.Response
+    :return: response
+    """
+    response.json = lambda **kwargs: response_json(response)
+    return response
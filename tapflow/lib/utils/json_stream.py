@@ -0,0 +1,117 @@
+import re
+from typing import Iterable, Iterator, Tuple
+
+from tapflow.lib.utils.fast_json import loads
+
+# 完整的字符串或结构字符; 单独匹配到引号说明字符串还没有接收完整
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\],:"]', re.S)
+# 元素内部只需要关心括号, 一次跳过括号之间的普通字符和完整的字符串
+_SKIP = re.compile(rb'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.S)
+
+_OBJECT, _ARRAY = 0, 1
+
+# 已处理的内容超过这个大小时从缓冲区中移除
+_TRIM_SIZE = 65536
+
+
+class JsonItemStream:
+    """
+    从分块到达的 JSON 响应中逐个解析指定路径下的数组元素, 例如 {"code": "ok", "data": {"items": [...]}} 中的 data.items
+
+    已解析的元素及时从缓冲区中移除, 内存占用只与单个元素和分块的大小相关;
+    顶层的字符串字段(如 code, message)保存在 envelope 中, 遍历结束后可用于判断请求是否成功
+    """
+
+    def __init__(self, chunks: Iterable[bytes], path: Tuple[str, ...] = ("data", "items")):
+        """
+        :param chunks: 响应内容的分块, 如 response.iter_content()
+        :param path: 数组所在的路径
+        """
+        self.chunks = chunks
+        self.path = tuple(path)
+        self.envelope = {}
+        self.found = False
+
+    def __iter__(self) -> Iterator:
+        buf = bytearray()
+        # 数组之外的每一层: [类型, 当前 key, 是否等待 key]
+        stack = []
+        target = len(self.path)
+        pos = 0
+        # 目标数组中当前元素的起始位置, 不在目标数组中时为 None
+        element_start = None
+        # 当前元素内部的括号深度
+        nested = 0
+        for chunk in self.chunks:
+            if not chunk:
+                continue
+            buf += chunk
+            while True:
+                if nested:
+                    pos = _SKIP.match(buf, pos).end()
+                    if pos >= len(buf) or buf[pos] == 0x22:
+                        # 到达缓冲区末尾或字符串没有接收完整, 需要更多数据
+                        break
+                    nested += 1 if buf[pos] in b"{[" else -1
+                    pos += 1
+                    continue
+                match = _TOKEN.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                i = match.start()
+                char = buf[i]
+                if char == 0x22:  # "
+                    if match.end() - i == 1:
+                        pos = i
+                        break
+                    pos = match.end()
+                    top = stack[-1] if stack else None
+                    if element_start is None and top is not None and top[0] == _OBJECT:
+                        if top[2]:
+                            top[1] = loads(bytes(buf[i:pos]))
+                        elif len(stack) == 1:
+                            self.envelope[top[1]] = loads(bytes(buf[i:pos]))
+                    continue
+                pos = i + 1
+                if element_start is not None:
+                    # 目标数组这一层
+                    if char == 0x7b or char == 0x5b:
+                        nested = 1
+                    elif char == 0x2c or char == 0x5d:  # , ]
+                        item = bytes(buf[element_start:i]).strip()
+                        if item:
+                            yield loads(item)
+                        if char == 0x5d:
+                            element_start = None
+                            stack.pop()
+                        else:
+                            element_start = pos
+                            if pos > _TRIM_SIZE:
+                                del buf[:pos]
+                                pos = element_start = 0
+                    continue
+                if char == 0x7b or char == 0x5b:  # { [
+                    stack.append([_OBJECT if char == 0x7b else _ARRAY, None, char == 0x7b])
+                    if char == 0x5b and len(stack) == target + 1 and self._on_path(stack):
+                        self.found = True
+                        element_start = pos
+                elif char == 0x7d or char == 0x5d:  # } ]
+                    if stack:
+                        stack.pop()
+                elif char == 0x2c:  # ,
+                    if stack and stack[-1][0] == _OBJECT:
+                        stack[-1][2] = True
+                else:  # :
+                    if stack and stack[-1][0] == _OBJECT:
+                        stack[-1][2] = False
+            if element_start is None and pos > _TRIM_SIZE:
+                del buf[:pos]
+                pos = 0
+            elif element_start is not None and element_start > _TRIM_SIZE:
+                del buf[:element_start]
+                pos -= element_start
+                element_start = 0
+
+    def _on_path(self, stack: list) -> bool:
+        return all(stack[k][0] == _OBJECT and stack[k][1] == key for k, key in enumerate(self.path))
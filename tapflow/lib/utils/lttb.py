@@ -0,0 +1,41 @@
+from typing import List, Sequence, Tuple
+
+
+def lttb(times: Sequence[float], values: Sequence[float], threshold: int) -> Tuple[List[float], List[float]]:
+    """
+    Largest-Triangle-Three-Buckets 降采样: 保留首尾两点, 其余点分成 threshold - 2 个桶,
+    每个桶选与前一个选中点和下一个桶平均点组成的三角形面积最大的点, 能保留峰值和趋势
+    :param times: 按时间排序的横坐标
+    :param values: 与 times 一一对应的值
+    :param threshold: 目标点数, 点数不超过 threshold 时原样返回
+    :return: (times, values)
+    """
+    n = len(times)
+    if threshold >= n or threshold < 3:
+        return list(times), list(values)
+    out_t, out_v = [times[0]], [values[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # 下一个桶的平均点, 最后一个桶使用终点
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if next_start >= n - 1:
+            avg_t, avg_v = times[n - 1], values[n - 1]
+        else:
+            count = next_end - next_start
+            avg_t = sum(times[next_start:next_end]) / count
+            avg_v = sum(values[next_start:next_end]) / count
+        at, av = times[a], values[a]
+        best, best_area = start, -1.0
+        for k in range(start, min(end, n - 1)):
+            area = abs((at - avg_t) * (values[k] - av) - (at - times[k]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = k, area
+        out_t.append(times[best])
+        out_v.append(values[best])
+        a = best
+    out_t.append(times[n - 1])
+    out_v.append(values[n - 1])
+    return out_t, out_v
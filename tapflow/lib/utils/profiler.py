@@ -0,0 +1,257 @@
+import functools
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+
+# 直方图桶上界(毫秒)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+
+_ID_PATTERN = re.compile(r"/[0-9a-f]{24}(?=/|$)")
+
+
+def normalize_endpoint(method: str, url: str) -> str:
+    """
+    将请求归一化为接口名, 路径中的 ObjectId 替换为 {id}, 例如 GET /Task/{id}
+    """
+    path = url.split("?", 1)[0]
+    return "{} {}".format(method.upper(), _ID_PATTERN.sub("/{id}", path))
+
+
+class EndpointStats:
+    """
+    单个接口的调用次数, 字节数和延迟直方图
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.cached = 0
+        self.bytes = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def record(self, elapsed_ms: float, size: int, ok: bool, cached: bool):
+        self.count += 1
+        self.bytes += size
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if not ok:
+            self.errors += 1
+        if cached:
+            self.cached += 1
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, p: float) -> float:
+        """
+        根据直方图估算分位数, 返回所在桶的上界(毫秒), 最后一个桶返回最大值
+        """
+        if self.count == 0:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n > 0:
+                return round(min(LATENCY_BUCKETS_MS[i], self.max_ms), 2)
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "cached": self.cached,
+            "bytes": self.bytes,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": {("+Inf" if b == float("inf") else str(b)): n for b, n in zip(LATENCY_BUCKETS_MS, self.buckets)},
+        }
+
+
+class Span:
+    """
+    一次 SDK 操作的耗时记录, 包含其中的请求耗时和主动等待(sleep)耗时
+    """
+
+    def __init__(self, name: str, parent: "Span" = None):
+        self.name = name
+        self.parent = parent
+        self.children: List[Span] = []
+        self.start = time.time()
+        self.end = None
+        self.request_count = 0
+        self.request_ms = 0.0
+        self.sleep_ms = 0.0
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.time()
+        return (end - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 2),
+            "request_count": self.request_count,
+            "request_ms": round(self.request_ms, 2),
+            "sleep_ms": round(self.sleep_ms, 2),
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class Profiler:
+    """
+    记录每个后端接口的请求统计, 以及 SDK 操作(Pipeline.save, Job.start 等)的嵌套耗时
+    """
+
+    def __init__(self, max_spans: int = 200):
+        self.enabled = True
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _current(self) -> Span:
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def record_request(self, method: str, url: str, elapsed: float, size: int = 0, ok: bool = True, cached: bool = False):
+        """
+        :param elapsed: 耗时(秒)
+        :param size: 响应体字节数
+        """
+        if not self.enabled:
+            return
+        endpoint = normalize_endpoint(method, url)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.record(elapsed_ms, size, ok, cached)
+        span = self._current()
+        while span is not None:
+            span.request_count += 1
+            span.request_ms += elapsed_ms
+            span = span.parent
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        记录一段操作的耗时, 可以嵌套: with profiler.span("Job.start"): ...
+        """
+        if not self.enabled:
+            yield None
+            return
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1] if stack else None
+        span = Span(name, parent)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end = time.time()
+            stack.pop()
+            if parent is not None:
+                parent.children.append(span)
+            else:
+                with self._lock:
+                    self.spans.append(span)
+
+    @contextmanager
+    def sleeping(self):
+        """
+        标记一段主动等待, 耗时计入当前及所有上层 span: with profiler.sleeping(): time.sleep(3)
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.time() - start) * 1000
+            span = self._current()
+            while span is not None:
+                span.sleep_ms += elapsed_ms
+                span = span.parent
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.spans.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "endpoints": {k: v.to_dict() for k, v in sorted(self.endpoints.items())},
+                "spans": [span.to_dict() for span in self.spans],
+            }
+
+    def to_json(self, path: str = None, indent: int = 2) -> str:
+        """
+        导出 JSON, 指定 path 时同时写入文件
+        """
+        data = json.dumps(self.to_dict(), indent=indent)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(data)
+        return data
+
+    def report(self, limit: int = 20) -> List[str]:
+        """
+        生成可读的报表: 按总耗时排序的接口统计和最近的操作耗时
+        """
+        lines = ["{:<48} {:>7} {:>6} {:>10} {:>9} {:>9} {:>9}".format(
+            "endpoint", "count", "error", "bytes", "avg_ms", "p95_ms", "total_ms")]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items(), key=lambda item: item[1].total_ms, reverse=True)[:limit]
+            spans = list(self.spans)[-limit:]
+        for name, stats in endpoints:
+            d = stats.to_dict()
+            lines.append("{:<48} {:>7} {:>6} {:>10} {:>9} {:>9} {:>9}".format(
+                name[:48], d["count"], d["errors"], d["bytes"], d["avg_ms"], d["p95_ms"], d["total_ms"]))
+
+        def walk(span, depth):
+            lines.append("{}{:<40} total {:>10.0f}ms  requests {:>4} / {:>8.0f}ms  sleep {:>8.0f}ms".format(
+                "  " * depth, span.name, span.duration_ms, span.request_count, span.request_ms, span.sleep_ms))
+            for child in span.children:
+                walk(child, depth + 1)
+
+        if spans:
+            lines.append("")
+        for span in spans:
+            walk(span, 0)
+        return lines
+
+
+profiler = Profiler()
+
+
+def traced(name: str):
+    """
+    装饰器, 将函数调用记录为一个 span
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profiler.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
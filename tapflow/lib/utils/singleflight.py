@@ -0,0 +1,99 @@
+import copy
+import threading
+import time
+from typing import Any, Callable, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ("event", "value", "error", "waiters", "ttl", "done_at", "snapshot")
+
+    def __init__(self, ttl: float):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+        self.ttl = ttl
+        self.done_at = None
+        self.snapshot = None
+
+
+class SingleFlight:
+    """
+    合并相同的并发读请求: 同一个 key 同一时刻只执行一次 fn, 其余调用方等待并共享结果;
+    ttl > 0 时, 结果在 ttl 秒内继续复用, 一个调度周期内的突发请求只产生一次往返
+
+    调用方可能修改返回值, 共享的结果会深拷贝后再交给等待方
+    """
+
+    def __init__(self, ttl: float = 0, copy_fn: Callable[[Any], Any] = copy.deepcopy):
+        """
+        :param ttl: 结果复用时间(秒), 0 表示只合并在途请求
+        :param copy_fn: 共享结果时使用的复制函数, None 表示直接共享同一个对象
+        """
+        self.ttl = ttl
+        self.copy_fn = copy_fn
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _copy(self, value):
+        if self.copy_fn is None:
+            return value
+        return self.copy_fn(value)
+
+    def do(self, key: Hashable, fn: Callable[[], Any], ttl: float = None) -> Tuple[Any, bool]:
+        """
+        :param key: 请求标识, 相同 key 的请求会被合并
+        :param fn: 实际执行请求的函数
+        :param ttl: 覆盖默认的结果复用时间
+        :return: (结果, 是否为共享结果)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done_at is not None and time.monotonic() - call.done_at > call.ttl:
+                del self._calls[key]
+                call = None
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call(ttl)
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return self._copy(call.snapshot), True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+            raise
+
+        with self._lock:
+            # 快照在锁内生成, 之后登记的等待方一定能拿到快照, 调用方修改原值也不会影响等待方
+            if call.waiters > 0 or call.ttl > 0:
+                call.snapshot = self._copy(call.value)
+            if call.ttl > 0:
+                call.done_at = time.monotonic()
+            elif self._calls.get(key) is call:
+                del self._calls[key]
+        call.event.set()
+        return call.value, False
+
+    def forget(self, key: Hashable = None):
+        """
+        丢弃已缓存的结果, key 为 None 时丢弃全部
+        """
+        with self._lock:
+            if key is None:
+                self._calls = {k: c for k, c in self._calls.items() if c.done_at is None}
+            elif key in self._calls and self._calls[key].done_at is not None:
+                del self._calls[key]
@@ -0,0 +1,125 @@
+from typing import Any, List, Optional, Tuple
+
+# 节点结构: [子节点, 经过这个节点的 key 数量, 在这个节点结束的 {key: value}]
+_CHILDREN, _COUNT, _KEYS = 0, 1, 2
+
+
+def _node() -> list:
+    return [{}, 0, None]
+
+
+class Trie:
+    """
+    前缀树, 查找前缀匹配的 key 只与前缀长度有关, 与 key 的总数无关
+
+    reverse=True 时按后缀匹配, 用于从短 id(完整 id 的后几位)找到完整 id;
+    depth 限制树的深度, 更长的 key 保存在最深一层节点中, 构建大量 key 时节点数只与 depth 相关
+    """
+
+    def __init__(self, reverse: bool = False, depth: int = 8):
+        self.reverse = reverse
+        self.depth = depth
+        self._root = _node()
+        self._values = {}
+
+    def _path(self, key: str) -> str:
+        return key[:-self.depth - 1:-1] if self.reverse else key[:self.depth]
+
+    def _match(self, key: str, fragment: str) -> bool:
+        return key.endswith(fragment) if self.reverse else key.startswith(fragment)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def insert(self, key: str, value: Any = None):
+        if key in self._values:
+            self.remove(key)
+        node = self._root
+        node[_COUNT] += 1
+        for char in self._path(key):
+            children = node[_CHILDREN]
+            child = children.get(char)
+            if child is None:
+                child = children[char] = _node()
+            child[_COUNT] += 1
+            node = child
+        if node[_KEYS] is None:
+            node[_KEYS] = {}
+        node[_KEYS][key] = value
+        self._values[key] = value
+
+    def remove(self, key: str) -> bool:
+        if key not in self._values:
+            return False
+        del self._values[key]
+        node = self._root
+        node[_COUNT] -= 1
+        for char in self._path(key):
+            child = node[_CHILDREN][char]
+            child[_COUNT] -= 1
+            if child[_COUNT] == 0:
+                # 没有其他 key 经过这个分支, 整个分支删除
+                del node[_CHILDREN][char]
+                return True
+            node = child
+        del node[_KEYS][key]
+        return True
+
+    def _find(self, fragment: str) -> Optional[list]:
+        node = self._root
+        for char in self._path(fragment):
+            node = node[_CHILDREN].get(char)
+            if node is None:
+                return None
+        return node
+
+    def _iter(self, node: list, fragment: str):
+        # fragment 比树深时, 最深一层节点中的 key 需要再比较一次
+        exact = len(fragment) <= self.depth
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current[_KEYS]:
+                for key, value in current[_KEYS].items():
+                    if exact or self._match(key, fragment):
+                        yield key, value
+            stack.extend(current[_CHILDREN].values())
+
+    def count(self, fragment: str) -> int:
+        """
+        以 fragment 为前缀(reverse 时为后缀)的 key 数量
+        """
+        node = self._find(fragment)
+        if node is None:
+            return 0
+        if len(fragment) <= self.depth:
+            return node[_COUNT]
+        return sum(1 for _ in self._iter(node, fragment))
+
+    def matches(self, fragment: str, limit: int = 10) -> List[Tuple[str, Any]]:
+        """
+        以 fragment 为前缀(reverse 时为后缀)的 (key, value), 最多返回 limit 个
+        """
+        node = self._find(fragment)
+        result = []
+        if node is None or limit <= 0:
+            return result
+        for item in self._iter(node, fragment):
+            result.append(item)
+            if len(result) >= limit:
+                break
+        return result
+
+    def unique(self, fragment: str) -> Optional[Tuple[str, Any]]:
+        """
+        唯一匹配的 (key, value), 没有匹配或匹配多个时返回 None
+        """
+        found = self.matches(fragment, 2)
+        return found[0] if len(found) == 1 else None
+
+    def clear(self):
+        self._root = _node()
+        self._values = {}
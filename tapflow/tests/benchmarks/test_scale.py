@@ -0,0 +1,83 @@
+import os
+import time
+import unittest
+
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.utils.profiler import profiler
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+# 规模测试耗时较长, 设置 TAPFLOW_SCALE_BENCH=1 后运行, 规模可以通过环境变量调整
+ENABLED = os.environ.get("TAPFLOW_SCALE_BENCH") == "1"
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+@unittest.skipUnless(ENABLED, "set TAPFLOW_SCALE_BENCH=1 to run scale benchmarks")
+class TestScale(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        config = SimulatorConfig(
+            tasks=_env_int("TAPFLOW_BENCH_TASKS", 20000),
+            connections=_env_int("TAPFLOW_BENCH_CONNECTIONS", 5000),
+            tables=_env_int("TAPFLOW_BENCH_TABLES", 200000),
+            latency=float(os.environ.get("TAPFLOW_BENCH_LATENCY", 0.005)),
+            step_seconds=0.1,
+        )
+        cls.sim = ManagerSimulator(config).start()
+        cls.session = cls.sim.session()
+        profiler.reset()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+        print()
+        print("\n".join(profiler.report()))
+
+    def timed(self, name, fn):
+        start = time.time()
+        with profiler.span(name):
+            result = fn()
+        print("{:<40} {:>8.3f}s".format(name, time.time() - start))
+        return result
+
+    def test_list_all_tasks(self):
+        tasks = self.timed("TaskApi.get_all_tasks", TaskApi(self.session).get_all_tasks)
+        self.assertEqual(len(tasks), min(self.sim.config.tasks, 10000))
+
+    def test_list_all_connections(self):
+        connections = self.timed("ConnectionsApi.get_connections", ConnectionsApi(self.session).get_connections)
+        self.assertEqual(len(connections), self.sim.config.connections)
+
+    def test_tables_of_many_connections(self):
+        api = MetadataInstanceApi(self.session)
+        connections = ConnectionsApi(self.session).get_connections(limit=100)
+
+        def load():
+            return sum(len(api.get_metadata_instance(c["id"])) for c in connections)
+
+        total = self.timed("get_metadata_instance x{}".format(len(connections)), load)
+        self.assertEqual(len(connections), min(100, self.sim.config.connections))
+        self.assertEqual(total, len(connections) * self.sim.data.tables_per_connection)
+
+    def test_start_and_poll_tasks(self):
+        api = TaskApi(self.session)
+        task_ids = [t["id"] for t in api.get_all_tasks()[:200]]
+        self.timed("TaskApi.start_task x200", lambda: [api.start_task(i) for i in task_ids])
+
+        def poll():
+            while True:
+                statuses = [api.get_task_by_id(i)["status"] for i in task_ids]
+                if all(s == "running" for s in statuses):
+                    return
+                time.sleep(0.1)
+
+        self.timed("poll until running x200", poll)
+        self.timed("TaskApi.stop_task x200", lambda: [api.stop_task(i) for i in task_ids])
+
+
+if __name__ == "__main__":
+    unittest.main()
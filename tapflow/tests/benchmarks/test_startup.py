@@ -0,0 +1,135 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+from tapflow.cli import cli
+from tapflow.lib import op_object
+from tapflow.lib.cache import ClientCache, client_cache
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+# 计时部分与规模测试一起运行: TAPFLOW_SCALE_BENCH=1
+ENABLED = os.environ.get("TAPFLOW_SCALE_BENCH") == "1"
+
+# 只在交互式模式或真正用到时才导入的模块
+DEFERRED_MODULES = ("IPython", "prompt_toolkit", "jedi", "websockets", "yaml", "bson")
+
+_IMPORT_SCRIPT = """
+import sys, time
+sys.argv = ["tap"]
+start = time.perf_counter()
+import tapflow
+import tapflow.lib.data_pipeline.pipeline
+print(time.perf_counter() - start)
+print(",".join(m for m in {modules!r} if m in sys.modules))
+"""
+
+# 交互式启动 tap 时, 在 start_ipython 之前执行的导入
+_TAP_SCRIPT = """
+import sys
+sys.argv = ["tap"]
+import tapflow.cli.tap
+from tapflow.cli.namespace import LazyNamespace
+LazyNamespace()
+print(",".join(m for m in ("tapflow.lib", "tapflow.lib.op_object", "tapflow.lib.request") if m in sys.modules))
+"""
+
+
+def import_tapflow() -> tuple:
+    """
+    在新的解释器中导入 tapflow
+    :return: (导入耗时(秒), 已导入的延迟模块列表)
+    """
+    out = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT.format(modules=DEFERRED_MODULES)],
+                         check=True, capture_output=True, text=True).stdout.split("\n")
+    return float(out[0]), [m for m in out[1].split(",") if m]
+
+
+def fresh_cache() -> ClientCache:
+    """
+    返回一个空的 ClientCache, 加载函数与全局缓存相同
+    """
+    cache = ClientCache()
+    for kind in ("connections", "jobs", "connectors", "apis"):
+        for attr in ("loader", "delta_loader", "count_loader", "ids_loader"):
+            if hasattr(client_cache[kind], attr):
+                setattr(cache[kind], attr, getattr(client_cache[kind], attr))
+    cache["tables"].loader_factory = client_cache["tables"].loader_factory
+    return cache
+
+
+class StartupCase(unittest.TestCase):
+    config = SimulatorConfig(tasks=50, connections=5, tables=10)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(cls.config).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def revalidate(self, parallel: bool) -> ClientCache:
+        """
+        用空缓存执行一次启动时的元数据加载
+        """
+        session = self.sim.session()
+        cache = fresh_cache()
+        env = {"TAPFLOW_PARALLEL_STARTUP": "1" if parallel else "0"}
+        with patch.dict(os.environ, env), patch.object(op_object, "req", session), \
+                patch.object(cli, "req", session), patch.object(op_object, "client_cache", cache), \
+                patch.object(cli, "client_cache", cache), patch.object(op_object, "show_connections_last_time", 0):
+            cli._revalidate_metadata()
+        return cache
+
+
+class TestStartup(StartupCase):
+    def test_import_defers_heavy_modules(self):
+        """测试导入 tapflow 时不导入 IPython, websockets 等只在部分场景使用的模块"""
+        _, loaded = import_tapflow()
+        self.assertEqual(loaded, [])
+
+    def test_interactive_launch_defers_lib(self):
+        """测试交互式启动 tap 时, 启动 IPython 之前不导入 op_object 等后端模块"""
+        out = subprocess.run([sys.executable, "-c", _TAP_SCRIPT], check=True, capture_output=True, text=True)
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_parallel_revalidate_loads_everything(self):
+        """测试并发加载与串行加载的结果一致"""
+        serial = self.revalidate(parallel=False)
+        parallel = self.revalidate(parallel=True)
+        for kind in ("connections", "jobs"):
+            self.assertTrue(parallel[kind].loaded)
+            self.assertEqual(set(parallel[kind]["id_index"]), set(serial[kind]["id_index"]))
+        self.assertIsNotNone(parallel["connectors"].loaded_at)
+        self.assertEqual(set(dict.keys(parallel["connectors"])), set(dict.keys(serial["connectors"])))
+        self.assertEqual(len(parallel["jobs"]["id_index"]), 50)
+
+
+@unittest.skipUnless(ENABLED, "set TAPFLOW_SCALE_BENCH=1 to run startup benchmarks")
+class TestStartupBenchmark(StartupCase):
+    config = SimulatorConfig(tasks=2000, connections=500, tables=10,
+                             latency=float(os.environ.get("TAPFLOW_BENCH_LATENCY", 0.05)))
+
+    def test_import_time(self):
+        best = min(import_tapflow()[0] for _ in range(3))
+        print("\n{:<40} {:>8.3f}s".format("import tapflow", best))
+        budget = os.environ.get("TAPFLOW_BENCH_IMPORT_BUDGET")
+        if budget:
+            self.assertLess(best, float(budget))
+
+    def test_revalidate_serial_vs_parallel(self):
+        timings = {}
+        for parallel in (False, True):
+            start = time.time()
+            self.revalidate(parallel)
+            timings[parallel] = time.time() - start
+            print("\n{:<40} {:>8.3f}s".format("revalidate " + ("parallel" if parallel else "serial"),
+                                             timings[parallel]))
+        self.assertLess(timings[True], timings[False])
+
+
+if __name__ == "__main__":
+    unittest.main()
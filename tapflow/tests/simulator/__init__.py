@@ -0,0 +1,2 @@
+from .server import ManagerSimulator, SimulatorConfig
+from .data import SyntheticData, make_id, parse_id
@@ -0,0 +1,452 @@
+import math
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional
+
+# 合成数据的 id 都是 24 位十六进制, 与服务端 ObjectId 的格式一致, 前两位区分类型
+KIND_TASK = 0x01
+KIND_CONNECTION = 0x02
+KIND_TABLE = 0x03
+KIND_RECORD = 0x04
+KIND_OTHER = 0x05
+
+# 任务启动后依次经过的里程碑, 每个阶段持续 SimulatorConfig.step_seconds
+MILESTONES = ("DEDUCTION", "DATA_NODE_INIT", "TABLE_INIT", "SNAPSHOT", "CDC")
+
+# 历史指标序列的采样间隔(毫秒)
+SERIES_STEP_MS = 5000
+
+
+def make_id(kind: int, index: int) -> str:
+    return "{:02x}{:022x}".format(kind, index)
+
+
+def parse_id(value: str):
+    """
+    :return: (类型, 序号), 不是合成 id 时返回 (None, None)
+    """
+    if not isinstance(value, str) or len(value) != 24:
+        return None, None
+    try:
+        return int(value[:2], 16), int(value[2:], 16)
+    except ValueError:
+        return None, None
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def get_path(doc: dict, key: str):
+    value = doc
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _match_condition(value, cond) -> bool:
+    if not isinstance(cond, dict):
+        return value == cond
+    for op, arg in cond.items():
+        op = op.lstrip("$")
+        if op == "options":
+            continue
+        if op == "like" or op == "regexp":
+            flags = re.I if "i" in str(cond.get("options", "")) else 0
+            if value is None or re.search(arg, str(value), flags) is None:
+                return False
+        elif op in ("in", "inq"):
+            if value not in arg:
+                return False
+        elif op == "nin":
+            if value in arg:
+                return False
+        elif op in ("ne", "neq"):
+            if value == arg:
+                return False
+        elif op == "gt":
+            if value is None or not value > arg:
+                return False
+        elif op == "gte":
+            if value is None or not value >= arg:
+                return False
+        elif op == "lt":
+            if value is None or not value < arg:
+                return False
+        elif op == "lte":
+            if value is None or not value <= arg:
+                return False
+        elif op == "exists":
+            if (value is not None) != bool(arg):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def match_where(doc: dict, where: Optional[dict]) -> bool:
+    """
+    支持 SDK 用到的 loopback 风格查询: 等值, like, in/inq, nin, ne, gt/gte/lt/lte, and/or, 以及 a.b 形式的嵌套字段
+    """
+    for key, cond in (where or {}).items():
+        if key == "and":
+            if not all(match_where(doc, w) for w in cond):
+                return False
+        elif key == "or":
+            if not any(match_where(doc, w) for w in cond):
+                return False
+        elif not _match_condition(get_path(doc, key), cond):
+            return False
+    return True
+
+
+def project(doc: dict, fields: Optional[dict]) -> dict:
+    if not fields:
+        return doc
+    include = [k for k, v in fields.items() if v]
+    if include:
+        return {k: doc[k] for k in ["id"] + include if k in doc}
+    return {k: v for k, v in doc.items() if fields.get(k, True)}
+
+
+def query(docs: Iterable[dict], flt: Optional[dict], with_total: bool = True) -> dict:
+    """
+    按 filter 查询, 返回 {"items": [...], "total": n}
+    """
+    flt = flt or {}
+    where = flt.get("where")
+    skip = int(flt.get("skip") or 0)
+    limit = flt.get("limit")
+    limit = None if limit in (None, 0) else int(limit)
+    order = flt.get("order")
+    matched = (d for d in docs if match_where(d, where))
+    if order:
+        field, _, direction = order.partition(" ")
+        matched = sorted(matched, key=lambda d: (get_path(d, field) is None, get_path(d, field) or 0),
+                         reverse=direction.strip().upper() == "DESC")
+    items, total = [], 0
+    for doc in matched:
+        if total >= skip and (limit is None or len(items) < limit):
+            items.append(project(doc, flt.get("fields")))
+        total += 1
+        if not with_total and limit is not None and len(items) >= limit:
+            break
+    return {"items": items, "total": total}
+
+
+class SyntheticData:
+    """
+    模拟管理端的数据: 任务, 连接和表
+
+    连接和任务在内存中完整保存; 表数量可以到几十万, 按 (连接序号, 表序号) 即时生成, 只保存被修改过的表
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        self.created_at = time.time()
+        self.next_index = {KIND_TASK: config.tasks, KIND_CONNECTION: config.connections,
+                           KIND_RECORD: 0, KIND_OTHER: 0}
+        self.connections = {}
+        self.tasks = {}
+        self.inspects = {}
+        self.deleted_tables = set()
+        for i in range(config.connections):
+            conn = self._connection(i)
+            self.connections[conn["id"]] = conn
+        for i in range(config.tasks):
+            task = self._task(i)
+            self.tasks[task["id"]] = task
+
+    def new_id(self, kind: int) -> str:
+        with self.lock:
+            index = self.next_index[kind]
+            self.next_index[kind] = index + 1
+        return make_id(kind, index)
+
+    @property
+    def tables_per_connection(self) -> int:
+        if self.config.connections == 0:
+            return 0
+        return self.config.tables // self.config.connections
+
+    # 连接
+
+    def _connection(self, index: int) -> dict:
+        ts = self.created_at - index
+        return {
+            "id": make_id(KIND_CONNECTION, index),
+            "name": "conn_{}".format(index),
+            "database_type": "Mysql" if index % 2 == 0 else "MongoDB",
+            "pdkHash": "sim",
+            "connection_type": "source_and_target",
+            "status": "ready",
+            "loadFieldsStatus": "finished",
+            "loadCount": self.tables_per_connection,
+            "tableCount": self.tables_per_connection,
+            "createType": "User",
+            "config": {"host": "127.0.0.1", "database": "db_{}".format(index)},
+            "last_updated": iso(ts),
+            "createTime": iso(ts),
+        }
+
+    def new_connection(self, body: dict) -> dict:
+        conn = dict(body)
+        conn.setdefault("status", "testing")
+        conn.update({
+            "id": self.new_id(KIND_CONNECTION),
+            "loadFieldsStatus": "finished",
+            "loadCount": 0,
+            "tableCount": 0,
+            "last_updated": iso(time.time()),
+            "createTime": iso(time.time()),
+        })
+        with self.lock:
+            self.connections[conn["id"]] = conn
+        return conn
+
+    # 表
+
+    def table(self, conn_index: int, table_index: int) -> Optional[dict]:
+        conn_id = make_id(KIND_CONNECTION, conn_index)
+        conn = self.connections.get(conn_id)
+        if conn is None or table_index >= self.tables_per_connection:
+            return None
+        table_id = make_id(KIND_TABLE, conn_index * self.tables_per_connection + table_index)
+        if table_id in self.deleted_tables:
+            return None
+        name = "table_{}".format(table_index)
+        return {
+            "id": table_id,
+            "name": name,
+            "original_name": name,
+            "meta_type": "table",
+            "sourceType": "SOURCE",
+            "is_deleted": False,
+            "qualified_name": "T_{}_{}".format(conn_id, name),
+            "source": {"id": conn_id, "_id": conn_id, "name": conn["name"], "database_type": conn["database_type"]},
+            "fields": [self.field(i) for i in range(self.config.fields_per_table)],
+            "indices": [{"name": "PRIMARY", "unique": True, "columns": [{"columnName": "id", "columnIsAsc": True}]}],
+            "tableAttr": {"numOfRows": self.config.rows_per_table},
+            "last_updated": conn["last_updated"],
+        }
+
+    @staticmethod
+    def field(index: int) -> dict:
+        if index == 0:
+            return {"field_name": "id", "data_type": "BIGINT", "primary_key_position": 1, "primaryKey": True,
+                    "nullable": False, "columnPosition": 1}
+        return {"field_name": "col_{}".format(index), "data_type": "VARCHAR(64)", "primary_key_position": 0,
+                "primaryKey": False, "nullable": True, "columnPosition": index + 1}
+
+    def table_by_id(self, table_id: str) -> Optional[dict]:
+        kind, index = parse_id(table_id)
+        per = self.tables_per_connection
+        if kind != KIND_TABLE or per == 0:
+            return None
+        return self.table(index // per, index % per)
+
+    def tables(self, connection_id: str = None) -> Iterator[dict]:
+        if connection_id is not None:
+            kind, conn_index = parse_id(connection_id)
+            indexes = [conn_index] if kind == KIND_CONNECTION else []
+        else:
+            indexes = range(self.config.connections)
+        for conn_index in indexes:
+            for table_index in range(self.tables_per_connection):
+                table = self.table(conn_index, table_index)
+                if table is not None:
+                    yield table
+
+    def find_tables(self, where: dict) -> Iterator[dict]:
+        """
+        常见查询(按连接, 按表名)直接定位, 其余情况遍历全部表
+        """
+        source_id = (where or {}).get("source.id")
+        name = (where or {}).get("original_name")
+        if isinstance(source_id, str) and isinstance(name, str) and name.startswith("table_"):
+            kind, conn_index = parse_id(source_id)
+            try:
+                table = self.table(conn_index, int(name[len("table_"):])) if kind == KIND_CONNECTION else None
+            except ValueError:
+                table = None
+            return iter([table] if table is not None else [])
+        return self.tables(source_id if isinstance(source_id, str) else None)
+
+    # 任务
+
+    def _task(self, index: int) -> dict:
+        ts = self.created_at - index
+        conn_count = max(self.config.connections, 1)
+        source = make_id(KIND_CONNECTION, index % conn_count)
+        target = make_id(KIND_CONNECTION, (index + 1) % conn_count)
+        return {
+            "id": make_id(KIND_TASK, index),
+            "name": "task_{}".format(index),
+            "status": "edit",
+            "type": "initial_sync+cdc",
+            "syncType": "migrate",
+            "desc": "",
+            "editVersion": 1,
+            "user_id": "sim-user",
+            "agentId": "sim-agent",
+            "last_updated": iso(ts),
+            "createTime": iso(ts),
+            "attrs": {},
+            "dag": {
+                "nodes": [
+                    {"id": "src-{}".format(index), "type": "database", "connectionId": source, "name": "source"},
+                    {"id": "sink-{}".format(index), "type": "database", "connectionId": target, "name": "target"},
+                ],
+                "edges": [{"source": "src-{}".format(index), "target": "sink-{}".format(index)}],
+            },
+        }
+
+    def new_task(self, body: dict) -> dict:
+        task = dict(body)
+        task.update({
+            "id": self.new_id(KIND_TASK),
+            "status": "edit",
+            "editVersion": 1,
+            "attrs": task.get("attrs") or {},
+            "last_updated": iso(time.time()),
+            "createTime": iso(time.time()),
+        })
+        task.setdefault("type", "initial_sync+cdc")
+        with self.lock:
+            self.tasks[task["id"]] = task
+        return task
+
+    def start_task(self, task: dict):
+        task["status"] = "scheduled"
+        task["startedAt"] = time.time()
+        task["stoppedAt"] = None
+        task["taskRecordId"] = self.new_id(KIND_RECORD)
+        task["startTime"] = iso(task["startedAt"])
+        task["attrs"] = dict(task.get("attrs") or {}, milestone={})
+        self.touch(task)
+
+    def stop_task(self, task: dict):
+        if task["status"] in ("running", "scheduled", "wait_run", "wait_start"):
+            task["status"] = "stopping"
+            task["stoppedAt"] = time.time()
+            self.touch(task)
+
+    @staticmethod
+    def touch(task: dict):
+        task["last_updated"] = iso(time.time())
+
+    def advance(self, task: dict):
+        """
+        按启动后经过的时间推进任务状态和里程碑, 读取任务时调用
+        """
+        step = self.config.step_seconds
+        now = time.time()
+        if task.get("status") == "stopping":
+            if now - task["stoppedAt"] >= step:
+                task["status"] = "stop"
+                self.touch(task)
+            return
+        started = task.get("startedAt")
+        if started is None or task.get("status") not in ("scheduled", "wait_run", "running"):
+            return
+        elapsed = now - started
+        phase = int(elapsed // step) if step > 0 else len(MILESTONES) + self.config.snapshot_steps
+        with_cdc = "cdc" in task.get("type", "")
+        milestone = {}
+        # 前三个阶段各占一步, 全量阶段占 snapshot_steps 步
+        bounds = [0, 1, 2, 3, 3 + self.config.snapshot_steps]
+        sync_status = None
+        for name, begin in zip(MILESTONES, bounds):
+            if phase < begin or (name == "CDC" and not with_cdc):
+                break
+            end = bounds[MILESTONES.index(name) + 1] if name != "CDC" else begin
+            finished = phase >= end
+            milestone[name] = {
+                "status": "FINISH" if finished else "RUNNING",
+                "begin": int((started + begin * step) * 1000),
+                "end": int((started + end * step) * 1000) if finished else None,
+            }
+            sync_status = name
+        status = "scheduled" if phase < 1 else "wait_run" if phase < 2 else "running"
+        if not with_cdc and milestone.get("SNAPSHOT", {}).get("status") == "FINISH":
+            status = "complete"
+        if status != task["status"]:
+            task["status"] = status
+            self.touch(task)
+        task["syncStatus"] = sync_status
+        task["attrs"]["milestone"] = milestone
+
+    def measurement(self, task: dict) -> dict:
+        """
+        任务的瞬时统计, 全量阶段行数线性增长
+        """
+        cfg = self.config
+        rows = cfg.rows_per_table * max(self.tables_per_connection, 1)
+        started = task.get("startedAt")
+        if started is None:
+            return {}
+        step = cfg.step_seconds
+        snapshot_start = started + 3 * step
+        snapshot_span = cfg.snapshot_steps * step
+        now = task.get("stoppedAt") or time.time()
+        done = min(max(now - snapshot_start, 0) / snapshot_span, 1.0) if snapshot_span > 0 else 1.0
+        inserted = int(rows * done)
+        cdc_events = int(max(now - snapshot_start - snapshot_span, 0) * cfg.cdc_qps) if done >= 1 else 0
+        qps = rows / snapshot_span if 0 < done < 1 and snapshot_span > 0 else cfg.cdc_qps if done >= 1 else 0
+        return {
+            "inputInsertTotal": inserted + cdc_events,
+            "inputUpdateTotal": 0,
+            "inputDeleteTotal": 0,
+            "inputDdlTotal": 0,
+            "inputOthersTotal": 0,
+            "outputInsertTotal": inserted + cdc_events,
+            "outputUpdateTotal": 0,
+            "outputDeleteTotal": 0,
+            "outputDdlTotal": 0,
+            "outputOthersTotal": 0,
+            "tableTotal": self.tables_per_connection,
+            "createTableTotal": self.tables_per_connection,
+            "snapshotTableTotal": int(self.tables_per_connection * done),
+            "snapshotRowTotal": rows,
+            "snapshotInsertRowTotal": inserted,
+            "currentSnapshotTableRowTotal": cfg.rows_per_table if 0 < done < 1 else 0,
+            "currentSnapshotTableInsertRowTotal": inserted % cfg.rows_per_table if 0 < done < 1 else 0,
+            "snapshotStartAt": int(snapshot_start * 1000) if now >= snapshot_start else None,
+            "snapshotDoneAt": int((snapshot_start + snapshot_span) * 1000) if done >= 1 else None,
+            "inputQps": qps,
+            "outputQps": qps,
+            "outputQpsAvg": qps,
+            "outputQpsMax": qps,
+            "lastFiveMinutesQps": qps,
+            "replicateLag": cfg.replicate_lag_ms if done >= 1 else 0,
+            "currentEventTimestamp": int(now * 1000),
+        }
+
+    def measurement_series(self, start_at: int, end_at: int, fields: List[str]) -> dict:
+        """
+        任务的历史指标序列, [start_at, end_at) 内每 SERIES_STEP_MS 一个点, qps 和延迟以一小时为周期变化
+        """
+        cfg = self.config
+        first = -(-start_at // SERIES_STEP_MS) * SERIES_STEP_MS
+        times = list(range(first, end_at, SERIES_STEP_MS))
+        wave = [1 + 0.5 * math.sin(t / 3600000 * 2 * math.pi) for t in times]
+        values = {
+            "inputQps": [cfg.cdc_qps * w for w in wave],
+            "outputQps": [cfg.cdc_qps * w for w in wave],
+            "replicateLag": [cfg.replicate_lag_ms * w for w in wave],
+        }
+        series = {"time": times}
+        series.update({field: values.get(field, [0] * len(times)) for field in fields})
+        return series
+
+    def task_list(self) -> List[dict]:
+        with self.lock:
+            tasks = list(self.tasks.values())
+        for task in tasks:
+            self.advance(task)
+        return tasks
@@ -0,0 +1,625 @@
+import base64
+import copy
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from tapflow.lib.utils.profiler import normalize_endpoint
+from .data import KIND_OTHER, SyntheticData, iso, match_where, project, query
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class SimulatorConfig:
+    """
+    模拟管理端的规模, 状态推进速度和故障注入配置
+    """
+
+    def __init__(self, tasks: int = 100, connections: int = 20, tables: int = 400, fields_per_table: int = 8,
+                 rows_per_table: int = 1000, step_seconds: float = 0.2, snapshot_steps: int = 5,
+                 cdc_qps: float = 100, replicate_lag_ms: int = 500, latency: float = 0,
+                 endpoint_latency: Dict[str, float] = None, error_rate: float = 0, seed: int = 0,
+                 load_schema_seconds: float = 0):
+        """
+        :param tasks: 预置任务数
+        :param connections: 预置连接数
+        :param tables: 表总数, 平均分配到各个连接
+        :param step_seconds: 任务每个里程碑阶段的持续时间(秒)
+        :param snapshot_steps: 全量阶段持续的步数
+        :param latency: 每个请求注入的延迟(秒)
+        :param endpoint_latency: 按接口前缀(如 /Task/batchStart)覆盖注入的延迟
+        :param error_rate: 随机返回 503 的概率
+        :param seed: 随机数种子, 故障注入可复现
+        :param load_schema_seconds: websocket 加载 schema 的耗时(秒)
+        """
+        self.tasks = tasks
+        self.connections = connections
+        self.tables = tables
+        self.fields_per_table = fields_per_table
+        self.rows_per_table = rows_per_table
+        self.step_seconds = step_seconds
+        self.snapshot_steps = snapshot_steps
+        self.cdc_qps = cdc_qps
+        self.replicate_lag_ms = replicate_lag_ms
+        self.latency = latency
+        self.endpoint_latency = dict(endpoint_latency or {})
+        self.error_rate = error_rate
+        self.seed = seed
+        self.load_schema_seconds = load_schema_seconds
+
+
+def ok(data=None) -> Tuple[int, dict]:
+    return 200, {"code": "ok", "data": data}
+
+
+def fail(code: str, message: str = "", status: int = 200) -> Tuple[int, dict]:
+    return status, {"code": code, "message": message, "data": None}
+
+
+def _ids(params: dict) -> list:
+    return [i for i in params.get("taskIds", "").split(",") if i]
+
+
+class ManagerSimulator:
+    """
+    进程内的 TapData 管理端模拟服务, 覆盖 SDK 用到的接口和 /ws/agent websocket, 用于规模测试和基准测试
+
+        with ManagerSimulator(SimulatorConfig(tasks=20000)) as sim:
+            session = sim.session()
+            TaskApi(session).get_all_tasks()
+
+    任务启动后按 step_seconds 推进状态和里程碑; 可注入延迟, 随机错误和指定接口的错误
+    """
+
+    def __init__(self, config: SimulatorConfig = None):
+        self.config = config or SimulatorConfig()
+        self.data = SyntheticData(self.config)
+        self.requests = Counter()
+        self._random = random.Random(self.config.seed)
+        self._faults = []
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._routes = [
+            ("GET", r"/Task", self.list_tasks),
+            ("POST", r"/Task", self.create_task),
+            ("PATCH", r"/Task", self.update_task),
+            ("PUT", r"/Task/batchStart", self.batch_start),
+            ("PUT", r"/Task/batchStop", self.batch_stop),
+            ("DELETE", r"/Task/batchDelete", self.batch_delete),
+            ("PATCH", r"/Task/batchRenew", self.batch_renew),
+            ("PATCH", r"/Task/confirm/(?P<id>\w+)", self.confirm_task),
+            ("PATCH", r"/Task/rename/(?P<id>\w+)", self.rename_task),
+            ("PUT", r"/Task/copy/(?P<id>\w+)", self.copy_task),
+            ("GET", r"/Task/(?P<id>\w+)", self.get_task),
+            ("POST", r"/task-console/relations", lambda m, p, b: ok([])),
+            ("GET", r"/Connections", self.list_connections),
+            ("POST", r"/Connections", self.create_connection),
+            ("GET", r"/Connections/(?P<id>\w+)", self.get_connection),
+            ("PATCH", r"/Connections/(?P<id>\w+)", self.update_connection),
+            ("DELETE", r"/Connections/(?P<id>\w+)", self.delete_connection),
+            ("GET", r"/MetadataInstances", self.list_tables),
+            ("POST", r"/MetadataInstances/metadata/v3", self.tables_metadata),
+            ("GET", r"/MetadataInstances/tablesValue", self.tables_value),
+            ("GET", r"/MetadataInstances/node/schema", lambda m, p, b: ok([])),
+            ("GET", r"/MetadataInstances/node/schemaPage", lambda m, p, b: ok({"items": [], "total": 0})),
+            ("GET", r"/MetadataInstances/(?P<id>\w+)", self.get_table),
+            ("POST", r"/measurement/batch", self.measurement),
+            ("POST", r"/MonitoringLogs/query", self.monitoring_logs),
+            ("POST", r"/Inspects", self.create_inspect),
+            ("PUT", r"/Inspects/update", self.update_inspect),
+            ("DELETE", r"/Inspects/(?P<id>\w+)", self.delete_inspect),
+            ("GET", r"/InspectResults", self.inspect_results),
+            ("POST", r"/proxy/call", self.proxy_call),
+            ("POST", r"/users/generatetoken", lambda m, p, b: ok({"id": "sim-token", "userId": "sim-user", "ttl": 1209600})),
+            ("GET", r"/users", lambda m, p, b: ok({"items": [{"id": "sim-user", "username": "simulator"}]})),
+            ("GET", r"/users/(?P<id>[\w-]+)", lambda m, p, b: ok({"id": m.group("id"), "username": "simulator"})),
+            ("GET", r"/agent", lambda m, p, b: ok({"items": [{"id": "sim-agent", "status": "Running"}]})),
+            ("GET", r"/agent/agentCount", lambda m, p, b: ok({"agentRunningCount": 1})),
+            ("GET", r"/DatabaseTypes/getDatabases", self.database_types),
+            ("GET", r"/logcollector", lambda m, p, b: ok({"items": [], "total": 0})),
+            ("GET", r"/shareCache", lambda m, p, b: ok({"items": [], "total": 0})),
+            ("GET", r"/ExternalStorage/list", lambda m, p, b: ok({"items": [], "total": 0})),
+            ("GET", r"/Modules", lambda m, p, b: ok({"items": [], "total": 0})),
+        ]
+        self._compiled = [(method, re.compile(pattern + "$"), fn) for method, pattern, fn in self._routes]
+
+    # 生命周期
+
+    def start(self) -> "ManagerSimulator":
+        simulator = self
+
+        class Handler(_Handler):
+            sim = simulator
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="manager-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def server(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return "{}:{}".format(host, port)
+
+    @property
+    def ws_uri(self) -> str:
+        return "ws://{}/ws/agent?access_token=sim-token".format(self.server)
+
+    def session(self):
+        """
+        返回指向模拟服务的 RequestSession, 已带上 access_token
+        使用默认缓存规则, 每个 session 有自己的 HttpCache, 测试之间不会共享缓存
+        """
+        from tapflow.lib.http_cache import HttpCache
+        from tapflow.lib.request import RequestSession
+        session = RequestSession(self.server)
+        session.params = {"access_token": "sim-token"}
+        session.http_cache = HttpCache()
+        return session
+
+    # 故障注入
+
+    def fail_next(self, path_prefix: str, times: int = 1, status: int = 503, method: str = None):
+        """
+        让接下来 times 次匹配的请求返回 status
+        """
+        with self._lock:
+            self._faults.append([path_prefix, method and method.upper(), times, status])
+
+    def _injected_status(self, method: str, path: str) -> Optional[int]:
+        with self._lock:
+            for fault in self._faults:
+                prefix, fault_method, times, status = fault
+                if path.startswith(prefix) and fault_method in (None, method) and times > 0:
+                    fault[2] -= 1
+                    return status
+            if self.config.error_rate and self._random.random() < self.config.error_rate:
+                return 503
+        return None
+
+    def _latency(self, path: str) -> float:
+        best, latency = -1, self.config.latency
+        for prefix, value in self.config.endpoint_latency.items():
+            if path.startswith(prefix) and len(prefix) > best:
+                best, latency = len(prefix), value
+        return latency
+
+    # 分发
+
+    def dispatch(self, method: str, raw_path: str, body: bytes) -> Tuple[int, dict]:
+        parts = urlsplit(raw_path)
+        path = parts.path
+        if path.startswith("/api/"):
+            path = path[len("/api"):]
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.requests[normalize_endpoint(method, path)] += 1
+        latency = self._latency(path)
+        if latency:
+            time.sleep(latency)
+        status = self._injected_status(method, path)
+        if status is not None:
+            return fail("SystemError", "injected failure", status)
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            return fail("InvalidJson", status=400)
+        for route_method, pattern, fn in self._compiled:
+            if route_method != method:
+                continue
+            match = pattern.match(path)
+            if match is not None:
+                with self.data.lock:
+                    return fn(match, params, payload)
+        return fail("NotFound", path, 404)
+
+    @staticmethod
+    def _filter(params: dict) -> dict:
+        try:
+            return json.loads(params.get("filter") or "{}")
+        except ValueError:
+            return {}
+
+    # 任务
+
+    def list_tasks(self, match, params, body):
+        return ok(query(self.data.task_list(), self._filter(params)))
+
+    def get_task(self, match, params, body):
+        task = self.data.tasks.get(match.group("id"))
+        if task is None:
+            return fail("Task.NotFound", status=404)
+        self.data.advance(task)
+        return ok(task)
+
+    def create_task(self, match, params, body):
+        name = body.get("name")
+        if any(t["name"] == name for t in self.data.tasks.values()):
+            return fail("Task.RepeatName", "task name already exists")
+        return ok(self.data.new_task(body))
+
+    def update_task(self, match, params, body):
+        task = self.data.tasks.get(body.get("id"))
+        if task is None:
+            return fail("Task.NotFound")
+        task.update({k: v for k, v in body.items() if k not in ("status", "editVersion")})
+        task["editVersion"] = task.get("editVersion", 0) + 1
+        self.data.touch(task)
+        return ok(task)
+
+    def confirm_task(self, match, params, body):
+        task = self.data.tasks.get(match.group("id"))
+        if task is None:
+            return fail("Task.NotFound")
+        task.update({k: v for k, v in (body or {}).items() if k not in ("id", "status")})
+        self.data.touch(task)
+        return ok(task)
+
+    def rename_task(self, match, params, body):
+        task = self.data.tasks.get(match.group("id"))
+        if task is None:
+            return fail("Task.NotFound")
+        task["name"] = params.get("newName", task["name"])
+        return ok(task)
+
+    def copy_task(self, match, params, body):
+        task = self.data.tasks.get(match.group("id"))
+        if task is None:
+            return fail("Task.NotFound")
+        copied = {k: v for k, v in task.items() if k not in ("id", "startedAt", "stoppedAt", "taskRecordId")}
+        copied["name"] = task["name"] + " - Copy"
+        return ok(self.data.new_task(copied))
+
+    def batch_start(self, match, params, body):
+        results = []
+        for task_id in _ids(params):
+            task = self.data.tasks.get(task_id)
+            if task is None:
+                results.append({"id": task_id, "code": "Task.NotFound"})
+                continue
+            self.data.advance(task)
+            if task["status"] not in ("running", "scheduled", "wait_run"):
+                self.data.start_task(task)
+            results.append({"id": task_id, "code": "ok"})
+        return ok(results)
+
+    def batch_stop(self, match, params, body):
+        results = []
+        for task_id in _ids(params):
+            task = self.data.tasks.get(task_id)
+            if task is None:
+                results.append({"id": task_id, "code": "Task.NotFound"})
+                continue
+            self.data.advance(task)
+            self.data.stop_task(task)
+            if params.get("force") in ("True", "true"):
+                task["status"] = "stop"
+            results.append({"id": task_id, "code": "ok"})
+        return ok(results)
+
+    def batch_delete(self, match, params, body):
+        for task_id in _ids(params):
+            self.data.tasks.pop(task_id, None)
+        return ok([{"id": i, "code": "ok"} for i in _ids(params)])
+
+    def batch_renew(self, match, params, body):
+        for task_id in _ids(params):
+            task = self.data.tasks.get(task_id)
+            if task is not None:
+                task.update({"status": "edit", "startedAt": None, "stoppedAt": None, "taskRecordId": None,
+                             "attrs": {}, "syncStatus": None})
+        return ok([{"id": i, "code": "ok"} for i in _ids(params)])
+
+    def measurement(self, match, params, body):
+        # 每个 key 是一个独立的查询, 与服务端一样逐个返回
+        data = {}
+        for key, item in (body or {}).items():
+            param = item.get("param", {})
+            sample = param.get("samples", {}).get("data", {})
+            tags = sample.get("tags", {})
+            task = self.data.tasks.get(tags.get("taskId"))
+            samples = []
+            if task is not None and task.get("taskRecordId") == tags.get("taskRecordId"):
+                if sample.get("type") == "continuous":
+                    samples.append(self.data.measurement_series(param["startAt"], param["endAt"], sample["fields"]))
+                else:
+                    self.data.advance(task)
+                    samples.append(self.data.measurement(task))
+            data[key] = {"code": "ok", "data": {"samples": {"data": samples}}}
+        return ok(data)
+
+    def monitoring_logs(self, match, params, body):
+        limit = int((body or {}).get("pageSize") or 20)
+        now = int(time.time() * 1000)
+        items = [{"level": "INFO", "timestamp": now - i * 1000, "taskId": body.get("taskId"),
+                  "message": "simulated log {}".format(i)} for i in range(min(limit, 20))]
+        return ok({"items": items, "total": len(items)})
+
+    # 连接
+
+    def list_connections(self, match, params, body):
+        with self.data.lock:
+            connections = list(self.data.connections.values())
+        return ok(query(connections, self._filter(params)))
+
+    def get_connection(self, match, params, body):
+        conn = self.data.connections.get(match.group("id"))
+        if conn is None:
+            return fail("Datasource.NotFound", status=404)
+        if conn.get("status") == "testing":
+            conn["status"] = "ready"
+        return ok(conn)
+
+    def create_connection(self, match, params, body):
+        if any(c["name"] == body.get("name") for c in self.data.connections.values()):
+            return fail("Datasource.RepeatName", "connection name already exists")
+        return ok(self.data.new_connection(body))
+
+    def update_connection(self, match, params, body):
+        conn = self.data.connections.get(match.group("id"))
+        if conn is None:
+            return fail("Datasource.NotFound")
+        conn.update({k: v for k, v in (body or {}).items() if k != "id"})
+        conn["last_updated"] = iso(time.time())
+        return ok(conn)
+
+    def delete_connection(self, match, params, body):
+        conn = self.data.connections.pop(match.group("id"), None)
+        if conn is None:
+            return fail("Datasource.NotFound")
+        return ok(conn)
+
+    # 元数据
+
+    def list_tables(self, match, params, body):
+        flt = self._filter(params)
+        return ok(query(self.data.find_tables(flt.get("where")), flt))
+
+    def get_table(self, match, params, body):
+        table = self.data.table_by_id(match.group("id"))
+        if table is None:
+            return fail("MetadataInstances.NotFound", status=404)
+        return ok(table)
+
+    def tables_metadata(self, match, params, body):
+        data = {}
+        for conn_id, item in (body or {}).items():
+            names = set(item.get("tableNames") or [])
+            data[conn_id] = [t for t in self.data.find_tables({"source.id": conn_id}) if t["original_name"] in names]
+        return ok(data)
+
+    def tables_value(self, match, params, body):
+        return ok([t["original_name"] for t in self.data.tables(params.get("connectionId"))])
+
+    def database_types(self, match, params, body):
+        return ok([{"name": name, "pdkHash": "sim", "pdkId": name.lower(), "type": name,
+                    "connectionType": "source_and_target", "properties": {}}
+                   for name in ("Mysql", "MongoDB", "PostgreSQL", "Oracle")])
+
+    # 校验
+
+    def create_inspect(self, match, params, body):
+        inspect = dict(body or {}, id=self.data.new_id(KIND_OTHER), status="scheduling")
+        self.data.inspects[inspect["id"]] = inspect
+        return ok(inspect)
+
+    def update_inspect(self, match, params, body):
+        try:
+            where = json.loads(params.get("where") or "{}")
+        except ValueError:
+            where = {}
+        inspect = self.data.inspects.get(where.get("id"))
+        if inspect is None:
+            return fail("Inspect.NotFound")
+        inspect.update(body or {})
+        return ok(inspect)
+
+    def delete_inspect(self, match, params, body):
+        self.data.inspects.pop(match.group("id"), None)
+        return ok({})
+
+    def inspect_results(self, match, params, body):
+        where = self._filter(params).get("where", {})
+        inspect = self.data.inspects.get(where.get("inspect_id"))
+        if inspect is None:
+            return ok({"items": [], "total": 0})
+        result = {"inspect_id": inspect["id"], "status": "done", "source_total": 1000, "target_total": 1000,
+                  "stats": [{"status": "done", "result": "passed", "source_total": 1000, "target_total": 1000}]}
+        return ok({"items": [result], "total": 1})
+
+    def proxy_call(self, match, params, body):
+        class_name = (body or {}).get("className")
+        if class_name == "QueryDataBaseDataService":
+            fields = [self.data.field(i)["field_name"] for i in range(self.config.fields_per_table)]
+            rows = [{f: (i if f == "id" else "v{}".format(i)) for f in fields} for i in range(10)]
+            return ok({"sampleData": rows, "tableName": body["args"][1]})
+        if class_name == "TaskPreviewService":
+            return ok({"nodeResult": {}, "taskId": None})
+        return ok({})
+
+    # websocket
+
+    def on_ws_message(self, message: dict):
+        """
+        处理 /ws/agent 上的消息, 返回需要推送给客户端的消息列表
+        """
+        if message.get("type") == "testConnection":
+            if self.config.load_schema_seconds:
+                time.sleep(self.config.load_schema_seconds)
+            conn_id = (message.get("data") or {}).get("id")
+            conn = self.data.connections.get(conn_id)
+            if conn is not None:
+                conn["status"] = "ready"
+                conn["loadFieldsStatus"] = "finished"
+            return [{"type": "pipe", "data": {"type": "testConnectionResult",
+                                              "result": {"status": "ready", "id": conn_id}}}]
+        return []
+
+    def watch_documents(self, flt: dict) -> Dict[str, dict]:
+        """
+        watch 消息订阅的任务的当前字段, 读取时推进任务状态
+        :param flt: watch 消息中的 filter, 包含 where 和 fields
+        :return: {任务 id: 任务字段}
+        """
+        where, fields = (flt or {}).get("where"), (flt or {}).get("fields")
+        with self.data.lock:
+            tasks = [task for task in self.data.tasks.values() if match_where(task, where)]
+            for task in tasks:
+                self.data.advance(task)
+            return {task["id"]: copy.deepcopy(project(task, fields)) for task in tasks}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    sim: ManagerSimulator = None
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出, 不关闭 Nagle 时 keep-alive 连接上每个请求会多等一个 delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        if self.path.split("?", 1)[0].endswith("/ws/agent") and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._websocket()
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, payload = self.sim.dispatch(self.command, self.path, body)
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def _websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_MAGIC).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.sim.requests["WS /ws/agent"] += 1
+        self._send_lock = threading.Lock()
+        self._watch = None
+        self._closed = threading.Event()
+        try:
+            self._serve_websocket()
+        finally:
+            self._closed.set()
+        self.close_connection = True
+
+    def _serve_websocket(self):
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                break
+            opcode, payload = frame
+            if opcode == 0x8:
+                self._send_frame(0x8, payload[:2])
+                break
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                message = json.loads(payload)
+            except ValueError:
+                continue
+            if message.get("type") == "watch":
+                self.sim.requests["WS watch"] += 1
+                start = self._watch is None
+                self._watch = message.get("filter") or {}
+                if start:
+                    threading.Thread(target=self._push_changes, daemon=True).start()
+                continue
+            for reply in self.sim.on_ws_message(message):
+                self._send_frame(0x1, json.dumps(reply).encode("utf-8"))
+
+    def _push_changes(self):
+        """
+        推送订阅任务的变更, 新订阅的任务先推送一次当前字段
+        """
+        interval = min(max(self.sim.config.step_seconds / 4, 0.01), 0.5)
+        sent = {}
+        while not self._closed.is_set():
+            for task_id, doc in self.sim.watch_documents(self._watch).items():
+                if sent.get(task_id) == doc:
+                    continue
+                message = {"type": "watch", "data": {"operationType": "update" if task_id in sent else "replace",
+                                                     "documentKey": {"id": task_id}, "fullDocument": doc}}
+                sent[task_id] = doc
+                self.sim.requests["WS push"] += 1
+                try:
+                    self._send_frame(0x1, json.dumps(message).encode("utf-8"))
+                except OSError:
+                    return
+            self._closed.wait(interval)
+
+    def _read_exact(self, n: int) -> Optional[bytes]:
+        data = self.rfile.read(n)
+        return data if len(data) == n else None
+
+    def _read_frame(self) -> Optional[Tuple[int, bytes]]:
+        header = self._read_exact(2)
+        if header is None:
+            return None
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            ext = self._read_exact(2)
+            if ext is None:
+                return None
+            length = struct.unpack("!H", ext)[0]
+        elif length == 127:
+            ext = self._read_exact(8)
+            if ext is None:
+                return None
+            length = struct.unpack("!Q", ext)[0]
+        mask = self._read_exact(4) if masked else b"\x00\x00\x00\x00"
+        payload = self._read_exact(length) if length else b""
+        if mask is None or payload is None:
+            return None
+        if masked:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 1 << 16:
+            header += bytes([126]) + struct.pack("!H", length)
+        else:
+            header += bytes([127]) + struct.pack("!Q", length)
+        with self._send_lock:
+            self.wfile.write(header + payload)
+            self.wfile.flush()
@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from tapflow.lib.async_request import AsyncRequestSession, run_async
+from tapflow.lib.backend_apis.asyncApis import AsyncTaskApi
+from tapflow.lib.request import RequestSession
+
+
+class TestAsyncApis(unittest.TestCase):
+    def setUp(self):
+        self.template = RequestSession("127.0.0.1:3030")
+        self.template.params = {"access_token": "token"}
+
+    def test_thread_session_is_cloned(self):
+        """测试工作线程使用模板会话的副本, 并继承认证信息"""
+        areq = AsyncRequestSession(self.template, limit=2)
+        session = run_async(areq.run(lambda s: s))
+        self.assertIsNot(session, self.template)
+        self.assertEqual(session.params, {"access_token": "token"})
+        self.assertEqual(session.base_url, self.template.base_url)
+        areq.close()
+
+    def test_thread_session_refresh_after_login(self):
+        """测试模板会话认证信息变化后副本重新生成"""
+        areq = AsyncRequestSession(self.template, limit=1)
+        first = run_async(areq.run(lambda s: s))
+        self.template.params = {"access_token": "new_token"}
+        second = run_async(areq.run(lambda s: s))
+        self.assertIsNot(first, second)
+        self.assertEqual(second.params, {"access_token": "new_token"})
+        areq.close()
+
+    def test_async_api_same_result_as_sync(self):
+        """测试异步 API 复用同步 API 的解析逻辑"""
+        response = Mock(status_code=200, json=lambda: {"code": "ok", "data": {"id": "task_id", "status": "running"}})
+        with patch.object(RequestSession, "get", return_value=response) as mock_get:
+            areq = AsyncRequestSession(self.template, limit=4)
+            data = run_async(AsyncTaskApi(areq).get_task_by_id("task_id"))
+            areq.close()
+        self.assertEqual(data, {"id": "task_id", "status": "running"})
+        mock_get.assert_called_once_with("/Task/task_id")
+
+    def test_map_respects_limit(self):
+        """测试并发数不超过 limit, 并且结果顺序与参数一致"""
+        lock = threading.Lock()
+        state = {"running": 0, "max": 0}
+
+        def fake_get(url, **kwargs):
+            with lock:
+                state["running"] += 1
+                state["max"] = max(state["max"], state["running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+            task_id = url.split("/")[-1]
+            return Mock(status_code=200, json=lambda: {"code": "ok", "data": {"id": task_id}})
+
+        with patch.object(RequestSession, "get", side_effect=fake_get):
+            areq = AsyncRequestSession(self.template, limit=3)
+            ids = [str(i) for i in range(20)]
+            results = run_async(AsyncTaskApi(areq).map("get_task_by_id", ids))
+            areq.close()
+        self.assertEqual([r["id"] for r in results], ids)
+        self.assertLessEqual(state["max"], 3)
+
+    def test_unknown_method(self):
+        """测试访问不存在的方法时抛出 AttributeError"""
+        with self.assertRaises(AttributeError):
+            AsyncTaskApi(AsyncRequestSession(self.template)).not_exists
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            AsyncRequestSession(self.template, limit=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
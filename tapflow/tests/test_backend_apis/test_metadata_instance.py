@@ -0,0 +1,45 @@
+import unittest
+
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+
+class TestMetadataInstancePaging(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=1, connections=2, tables=20)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.session = self.sim.session()
+        self.source_id = ConnectionsApi(self.session).get_connections()[0]["id"]
+
+    def test_paged_and_projected(self):
+        """测试分页拉取, 默认只返回列表需要的字段"""
+        api = MetadataInstanceApi(self.session)
+        before = self.sim.requests["GET /MetadataInstances"]
+        tables = list(api.iter_metadata_instances(self.source_id, page_size=3))
+        self.assertEqual(len(tables), 10)
+        self.assertEqual(len({t["id"] for t in tables}), 10)
+        self.assertEqual(set(tables[0]), {"id", "original_name", "meta_type"})
+        self.assertEqual(self.sim.requests["GET /MetadataInstances"] - before, 4)
+
+    def test_generator_is_lazy_and_fields_on_demand(self):
+        """测试生成器按需请求下一页, 字段定义单独获取"""
+        api = MetadataInstanceApi(self.session)
+        before = self.sim.requests["GET /MetadataInstances"]
+        first = next(api.iter_metadata_instances(self.source_id, page_size=2))
+        self.assertEqual(self.sim.requests["GET /MetadataInstances"] - before, 1)
+        self.assertNotIn("fields", first)
+        self.assertTrue(api.get_fields_instance_by_id(first["id"]))
+        full = list(api.iter_metadata_instances(self.source_id, fields={}))
+        self.assertIn("fields", full[0])
+        self.assertEqual(len(api.list_tables(self.source_id)), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from tapflow.lib.backend_apis.common import parse_result, AgentApi
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.utils import fast_json
+
+
+def make_response(body: bytes, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.encoding = "utf-8"
+    return response
+
+
+class TestParseOnce(unittest.TestCase):
+    def test_json_parsed_once(self):
+        """测试同一个响应多次调用 json() 只解析一次"""
+        response = fast_json.parse_once(make_response(b'{"code": "ok", "data": {"id": "1"}}'))
+        with patch('tapflow.lib.utils.fast_json.loads', wraps=fast_json.loads) as mock_loads:
+            first = response.json()
+            second = response.json()
+        self.assertIs(first, second)
+        self.assertEqual(mock_loads.call_count, 1)
+        self.assertEqual(first["data"]["id"], "1")
+
+    def test_non_utf8_encoding(self):
+        response = make_response('{"name": "数据"}'.encode("gbk"))
+        response.encoding = "gbk"
+        self.assertEqual(fast_json.response_json(response), {"name": "数据"})
+
+    def test_invalid_json_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            fast_json.response_json(make_response(b"<html>502 Bad Gateway</html>"))
+
+
+class TestApiResult(unittest.TestCase):
+    def test_unpack(self):
+        """测试 ApiResult 解包为 (data, ok, code)"""
+        data, ok, code = parse_result(make_response(b'{"code": "ok", "data": [1, 2]}'))
+        self.assertEqual((data, ok, code), ([1, 2], True, "ok"))
+
+    def test_failed_code(self):
+        result = parse_result(make_response(b'{"code": "Task.RepeatName", "data": null}'))
+        self.assertFalse(result.ok)
+        self.assertEqual(result.code, "Task.RepeatName")
+        self.assertEqual(result.body, {"code": "Task.RepeatName", "data": None})
+
+    def test_http_error(self):
+        result = parse_result(make_response(b'{"code": "ok", "data": 1}', status_code=500))
+        self.assertFalse(result.ok)
+        self.assertEqual(result.status_code, 500)
+
+    def test_non_json_body(self):
+        data, ok, code = parse_result(make_response(b"<html></html>", status_code=502))
+        self.assertEqual((data, ok, code), (None, False, None))
+
+
+class TestBackendApisParseOnce(unittest.TestCase):
+    def test_update_task_parses_once(self):
+        """测试 update_task 只调用一次 json()"""
+        response = Mock(status_code=200)
+        response.json.return_value = {"code": "ok", "data": {"id": "1"}}
+        req = Mock()
+        req.patch.return_value = response
+        data, ok = TaskApi(req).update_task({"id": "1"})
+        self.assertEqual((data, ok), ({"id": "1"}, True))
+        self.assertEqual(response.json.call_count, 1)
+
+    def test_agent_count_failed(self):
+        response = Mock(status_code=200)
+        response.json.return_value = {"code": "SystemError", "data": None}
+        req = Mock()
+        req.get.return_value = response
+        body, ok = AgentApi(req).get_agent_count()
+        self.assertFalse(ok)
+        self.assertEqual(body["code"], "SystemError")
+        self.assertEqual(response.json.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
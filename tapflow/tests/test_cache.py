@@ -0,0 +1,271 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.cache import ClientCache, EntityStore, TableCache, remove_entity, upsert_entity
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+from tapflow.tests.simulator.data import iso
+
+JOB_A = {"id": "6721f8a0b1c2d3e4f5aaaaaa", "name": "job_a"}
+JOB_B = {"id": "6721f8a0b1c2d3e4f5bbbbbb", "name": "job_b"}
+
+
+class TestEntityStore(unittest.TestCase):
+    def test_indexes_maintained_together(self):
+        """测试 replace/upsert/remove 同时维护四个索引"""
+        store = EntityStore("jobs")
+        store.replace([JOB_A, {"id": "x"}, JOB_B])
+        self.assertIs(store["name_index"]["job_a"], JOB_A)
+        self.assertIs(store["id_index"][JOB_B["id"]], JOB_B)
+        self.assertIs(store["short_id_index"]["bbbbbb"], JOB_B)
+        self.assertIs(store["number_index"]["2"], JOB_B)
+
+        renamed = dict(JOB_A, name="job_a2")
+        store.upsert(renamed)
+        self.assertNotIn("job_a", store["name_index"])
+        self.assertIs(store["number_index"]["0"], renamed)
+        new = {"id": "6721f8a0b1c2d3e4f5cccccc", "name": "job_c"}
+        store.upsert(new)
+        self.assertIs(store["number_index"]["3"], new)
+
+        store.remove(JOB_B["id"])
+        for index in ("name_index", "id_index", "short_id_index", "number_index"):
+            self.assertNotIn(JOB_B, store[index].values())
+
+    @patch('tapflow.lib.cache.time.time')
+    def test_lazy_load_and_ttl(self, mock_time):
+        """测试首次访问时加载, 过期后重新加载"""
+        mock_time.return_value = 1000
+        loader = Mock(return_value=[JOB_A])
+        store = EntityStore("jobs", ttl=60, loader=loader)
+        loader.assert_not_called()
+        self.assertIn("job_a", store["name_index"])
+        store["name_index"].get("job_a")
+        self.assertEqual(loader.call_count, 1)
+        mock_time.return_value = 1061
+        loader.return_value = [JOB_A, JOB_B]
+        self.assertIn("job_b", store["name_index"])
+        self.assertEqual(loader.call_count, 2)
+
+    def test_load_failure_keeps_data(self):
+        """测试加载失败时保留原有数据, 不抛出异常"""
+        store = EntityStore("jobs", loader=Mock(side_effect=ConnectionError("down")))
+        store.upsert(JOB_A)
+        self.assertIs(store["name_index"]["job_a"], JOB_A)
+        self.assertEqual(store.loader.call_count, 1)
+        store["id_index"]
+        self.assertEqual(store.loader.call_count, 1)
+
+    def test_lookup_fetches_single_entity_on_miss(self):
+        """测试索引中找不到时只查询单个实体"""
+        fetch_one = Mock(side_effect=lambda index, value: JOB_B if value == "job_b" else None)
+        loader = Mock(return_value=[JOB_A])
+        store = EntityStore("jobs", loader=loader, fetch_one=fetch_one)
+        self.assertIs(store.lookup("bbbbbb", "short_id_index"), None)
+        self.assertIs(store.lookup("job_b", "name_index"), JOB_B)
+        self.assertIs(store.lookup(JOB_B["id"]), JOB_B)
+        self.assertIs(store.lookup("aaaaaa"), JOB_A)
+        self.assertEqual(loader.call_count, 1)
+        fetch_one.assert_called_once_with("name_index", "job_b")
+
+
+class TestSignatureResolution(unittest.TestCase):
+    def setUp(self):
+        self.store = EntityStore("jobs")
+        self.store.replace([JOB_A, JOB_B, {"id": "6721f8a0b1c2d3e4f6bbbbbb", "name": "job_b2"}])
+
+    def test_ambiguous_short_id(self):
+        """测试短 id 有多个匹配时不返回任意一个"""
+        self.assertIs(self.store.lookup("aaaaaa", "short_id_index"), JOB_A)
+        with patch('tapflow.lib.cache.logger') as mock_logger:
+            self.assertIsNone(self.store.lookup("bbbbbb", "short_id_index"))
+        self.assertIn("ambiguous", mock_logger.fwarn.call_args[0][0])
+        self.assertEqual(len(self.store.match_short_id("bbbbbb")), 2)
+        self.assertIs(self.store.lookup("e4f5bbbbbb", "short_id_index"), JOB_B)
+        self.store.remove(JOB_B["id"])
+        self.assertEqual(self.store.lookup("bbbbbb", "short_id_index")["name"], "job_b2")
+
+    def test_name_candidates(self):
+        """测试名称找不到时提示前缀匹配的名称"""
+        self.assertEqual(self.store.complete("job_b"), ["job_b", "job_b2"])
+        with patch('tapflow.lib.cache.logger') as mock_logger:
+            self.assertIsNone(self.store.lookup("job_", "name_index"))
+        self.assertIn("job_a", mock_logger.fwarn.call_args[0][3])
+
+    def test_index_type_and_match_line(self):
+        """测试签名类型判断和短 id 匹配"""
+        from tapflow.lib.op_object import get_index_type, match_line
+        self.assertEqual(get_index_type("12"), "number_index")
+        self.assertEqual(get_index_type(3), "number_index")
+        self.assertEqual(get_index_type(JOB_A["id"]), "id_index")
+        self.assertEqual(get_index_type("aaaaaa"), "short_id_index")
+        self.assertEqual(get_index_type("job_a"), "name_index")
+        self.assertEqual(get_index_type("abcdefghijkl"), "name_index")
+        self.assertEqual(match_line(self.store, "aaaaaa"), JOB_A["id"])
+        self.assertEqual(match_line({JOB_A["id"]: JOB_A}, "aaaaaa"), JOB_A["id"])
+        self.assertEqual(match_line(self.store, "bbbbbb"), "bbbbbb")
+        tables = TableCache()
+        tables.store_for("conn1").replace([{"id": "t-0000aa", "original_name": "t1"}])
+        self.assertEqual(match_line(tables, "0000aa"), "t-0000aa")
+
+
+class TestDeltaRefresh(unittest.TestCase):
+    def setUp(self):
+        self.loader = Mock(return_value=[dict(JOB_A, last_updated="2024-01-01T00:00:00.000Z"),
+                                         dict(JOB_B, last_updated="2024-01-02T00:00:00.000Z")])
+        self.delta_loader = Mock(return_value=[])
+        self.ids_loader = Mock(return_value=[JOB_A["id"], JOB_B["id"]])
+        self.store = EntityStore("jobs", ttl=60, loader=self.loader, delta_loader=self.delta_loader,
+                                 count_loader=Mock(return_value=2), ids_loader=self.ids_loader,
+                                 tombstone_interval=None)
+
+    def test_delta_after_full_load(self):
+        """测试全量加载后只拉取水位线之后的变更"""
+        self.store.refresh()
+        self.assertEqual(self.store.watermark, "2024-01-02T00:00:00.000Z")
+        changed = dict(JOB_A, status="running", last_updated="2024-01-03T00:00:00.000Z")
+        self.delta_loader.return_value = [changed]
+        self.store.refresh()
+        self.delta_loader.assert_called_once_with("2024-01-02T00:00:00.000Z")
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertIs(self.store["name_index"]["job_a"], changed)
+        self.assertEqual(self.store.watermark, "2024-01-03T00:00:00.000Z")
+        # 计数一致, 不需要拉取 id
+        self.ids_loader.assert_not_called()
+        self.store.refresh(full=True)
+        self.assertEqual(self.loader.call_count, 2)
+
+    @patch('tapflow.lib.cache.time.time')
+    def test_expired_store_uses_delta(self, mock_time):
+        """测试缓存过期后访问索引时走增量刷新"""
+        mock_time.return_value = 1000
+        self.store["id_index"]
+        mock_time.return_value = 1061
+        self.store["id_index"]
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(self.delta_loader.call_count, 1)
+
+    def test_tombstone_removes_deleted(self):
+        """测试计数不一致时核对 id, 移除已删除的实体"""
+        self.store.refresh()
+        self.store.count_loader.return_value = 1
+        self.ids_loader.return_value = [JOB_B["id"]]
+        self.store.refresh()
+        self.assertNotIn("job_a", self.store["name_index"])
+        self.assertIn("job_b", self.store["name_index"])
+        self.assertEqual(self.store.stats["removed"], 1)
+
+    def test_tombstone_skipped_when_ids_unavailable(self):
+        """测试拉取 id 失败时跳过核对, 不会移除缓存的实体"""
+        self.store.refresh()
+        self.store.count_loader.return_value = None
+        self.ids_loader.return_value = None
+        self.store.refresh()
+        self.assertEqual(set(self.store["name_index"]), {"job_a", "job_b"})
+        self.assertEqual(self.store.stats["removed"], 0)
+
+
+class TestDeltaRefreshWithSimulator(unittest.TestCase):
+    def test_refresh_scales_with_changes(self):
+        """测试增量刷新只传输变更的任务, 并发现被删除的任务"""
+        sim = ManagerSimulator(SimulatorConfig(tasks=200, connections=2, tables=4)).start()
+        try:
+            session = sim.session()
+            api = TaskApi(session)
+            store = EntityStore("jobs", loader=api.get_all_tasks, delta_loader=api.get_tasks_updated_since,
+                                count_loader=api.count_tasks, ids_loader=api.get_task_ids, tombstone_interval=None)
+            store.refresh()
+            self.assertEqual(len(store["id_index"]), 200)
+            tasks = list(sim.data.tasks.values())
+            tasks[0].update(status="running", last_updated=iso(4102444800))
+            del sim.data.tasks[tasks[1]["id"]]
+            store.refresh()
+            self.assertEqual(store.stats["delta_items"], 1)
+            self.assertEqual(store["id_index"][tasks[0]["id"]]["status"], "running")
+            self.assertNotIn(tasks[1]["id"], store["id_index"])
+            self.assertEqual(len(store["id_index"]), 199)
+        finally:
+            sim.stop()
+
+    def test_failed_id_requests_keep_cache(self):
+        """测试服务端返回错误时, 任务和连接的删除核对都不会清空缓存"""
+        sim = ManagerSimulator(SimulatorConfig(tasks=5, connections=3, tables=3)).start()
+        try:
+            session = sim.session()
+            tasks, connections = TaskApi(session), ConnectionsApi(session)
+            stores = [
+                (EntityStore("jobs", loader=tasks.get_all_tasks, count_loader=tasks.count_tasks,
+                             ids_loader=tasks.get_task_ids), "/Task", 5),
+                (EntityStore("connections", loader=connections.get_connections,
+                             count_loader=connections.count_connections,
+                             ids_loader=connections.get_connection_ids), "/Connections", 3),
+            ]
+            for store, path, total in stores:
+                store.refresh()
+                for status in (200, 500):
+                    sim.fail_next(path, times=2, status=status)
+                    self.assertEqual(store.check_tombstones(), 0)
+                    self.assertEqual(len(store["id_index"]), total)
+        finally:
+            sim.stop()
+
+
+class TestClientCache(unittest.TestCase):
+    def test_cold_cache_has_empty_indexes(self):
+        """测试冷启动时读取索引不会 KeyError"""
+        cache = ClientCache()
+        self.assertIsNone(cache["jobs"]["name_index"].get("job_a"))
+        self.assertEqual(cache["connections"]["id_index"], {})
+        self.assertNotIn("mysql", cache["connectors"])
+
+    def test_tables_per_connection(self):
+        """测试按连接保存表, 并提供所有表的 id 索引"""
+        tables = TableCache(loader_factory=lambda source: lambda: [{"id": source + "-t1", "original_name": "t1"}])
+        self.assertIn("t1", tables["conn1"]["name_index"])
+        self.assertIn("conn2-t1", tables["conn2"]["id_index"])
+        self.assertEqual(set(tables["id_index"]), {"conn1-t1", "conn2-t1"})
+        tables.invalidate("conn1")
+        self.assertIsNone(tables.get("conn1"))
+
+    def test_entity_helpers(self):
+        """测试 upsert_entity/remove_entity 在还没有缓存时创建 EntityStore"""
+        cache = {}
+        upsert_entity(cache, "jobs", JOB_A)
+        self.assertIsInstance(cache["jobs"], EntityStore)
+        self.assertIs(cache["jobs"]["name_index"]["job_a"], JOB_A)
+        self.assertIs(cache["jobs"]["number_index"]["0"], JOB_A)
+        remove_entity(cache, "jobs", JOB_A["id"])
+        remove_entity(cache, "apis", "missing")
+        self.assertEqual(cache["jobs"].items_list(), [])
+        self.assertEqual(cache["jobs"]["number_index"], {})
+
+    def test_upsert_keeps_number(self):
+        """测试更新实体时保留原来的序号, 删除后序号不再指向该实体"""
+        store = EntityStore("jobs")
+        store.replace([{"id": "j{}".format(i), "name": "job{}".format(i)} for i in range(1000)])
+        updated = {"id": "j500", "name": "job500", "status": "running"}
+        store.upsert(updated)
+        self.assertIs(store["number_index"]["500"], updated)
+        store.upsert({"id": "j500", "name": "renamed"})
+        self.assertEqual(store["number_index"]["500"]["name"], "renamed")
+        self.assertNotIn("job500", store["name_index"])
+        store.remove("j500")
+        self.assertNotIn("500", store["number_index"])
+        self.assertEqual(store.upsert({"id": "new", "name": "new"}), store["number_index"]["1000"])
+
+    def test_delete_event_removes_connection(self):
+        """测试删除连接的事件只移除对应的连接和表缓存"""
+        cache = ClientCache()
+        cache.connections.replace([{"id": "c1", "name": "a"}, {"id": "c2", "name": "b"}])
+        cache.tables.store_for("c1").replace([{"id": "t", "original_name": "t"}])
+        with patch('tapflow.lib.cache.client_cache', cache):
+            from tapflow.lib.http_cache import notify
+            notify("datasource.delete", id="c1")
+        self.assertNotIn("a", cache.connections["name_index"])
+        self.assertIn("b", cache.connections["name_index"])
+        self.assertIsNone(cache.tables.get("c1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
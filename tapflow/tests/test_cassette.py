@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.cassette import Cassette, CassetteMissError, interaction_key, use_cassette
+from tapflow.lib.request import RequestSession
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+
+def real_response(status_code=200, body=b'{"code":"ok","data":{"id":"1"}}'):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers["Content-Type"] = "application/json"
+    response.encoding = "utf-8"
+    return response
+
+
+class TestInteractionKey(unittest.TestCase):
+    def test_volatile_fields_ignored(self):
+        """测试签名, 时间戳和 editVersion 不影响匹配"""
+        a = interaction_key("patch", "/Task", {"ts": "1", "sign": "x", "id": "1"},
+                            {"name": "t", "editVersion": 1, "dag": {"nodes": [{"editVersion": 2}]}})
+        b = interaction_key("PATCH", "/Task", {"ts": "2", "sign": "y", "id": "1"},
+                            {"dag": {"nodes": [{"editVersion": 3}]}, "name": "t", "editVersion": 9})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, interaction_key("PATCH", "/Task", {"id": "2"}, {"name": "t"}))
+
+    def test_query_in_url(self):
+        """测试写在 url 中的查询参数参与匹配, 与通过 params 传入等价"""
+        a = interaction_key("GET", '/Task?filter={"where":{"name":"a"}}&ts=1')
+        b = interaction_key("GET", '/Task?filter={"where":{"name":"b"}}&ts=1')
+        self.assertNotEqual(a, b)
+        self.assertEqual(a, interaction_key("GET", "/Task", {"filter": '{"where":{"name":"a"}}', "ts": "2"}))
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cassette.json.gz")
+        self.session = RequestSession("127.0.0.1:3030")
+
+    @patch('requests.Session.request')
+    def test_record_then_replay(self, mock_request):
+        """测试录制后回放, 回放时不访问网络, 重复请求按顺序返回"""
+        mock_request.side_effect = [
+            real_response(body=b'{"code":"ok","data":{"status":"starting"}}'),
+            real_response(body=b'{"code":"ok","data":{"status":"running"}}'),
+        ]
+        with use_cassette(self.path, mode="record", session=self.session):
+            self.session.get("/Task/1", params={"ts": "1"})
+            self.session.get("/Task/1", params={"ts": "2"})
+        self.assertIsNone(self.session.cassette)
+        self.assertTrue(os.path.exists(self.path))
+
+        mock_request.reset_mock()
+        with use_cassette(self.path, session=self.session) as cassette:
+            statuses = [self.session.get("/Task/1", params={"ts": "3"}).json()["data"]["status"] for _ in range(3)]
+            with self.assertRaises(CassetteMissError):
+                self.session.get("/Task/2")
+        mock_request.assert_not_called()
+        self.assertEqual(statuses, ["starting", "running", "running"])
+        self.assertEqual(cassette.plays, 3)
+
+    @patch('requests.Session.request')
+    def test_replay_latency(self, mock_request):
+        """测试回放时注入延迟"""
+        mock_request.return_value = real_response()
+        with use_cassette(self.path, mode="record", session=self.session):
+            self.session.post("/Task", json={"name": "t"})
+        cassette = Cassette(self.path, latency=0.05)
+        self.session.cassette = cassette
+        start = time.time()
+        response = self.session.post("/Task", json={"name": "t", "editVersion": 2})
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], "application/json")
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            Cassette(self.path, mode="live")
+
+
+class TestCassetteWithSimulator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=5, connections=3, tables=2)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def test_replay_streamed_lists(self):
+        """测试流式读取的列表接口录制后可以离线回放"""
+        path = os.path.join(tempfile.mkdtemp(), "lists.json.gz")
+        session = self.sim.session()
+        with use_cassette(path, mode="record", session=session):
+            tasks = TaskApi(session).get_all_tasks()
+            connections = ConnectionsApi(session).get_connections()
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual(len(connections), 3)
+        before = sum(self.sim.requests.values())
+        with use_cassette(path, session=session) as cassette:
+            self.assertEqual(TaskApi(session).get_all_tasks(), tasks)
+            self.assertEqual(ConnectionsApi(session).get_connections(), connections)
+        self.assertEqual(cassette.plays, 2)
+        self.assertEqual(sum(self.sim.requests.values()), before)
+
+    def test_replay_inline_filters(self):
+        """测试过滤条件写在 url 中的请求按过滤条件回放, 与回放顺序无关"""
+        path = os.path.join(tempfile.mkdtemp(), "names.json.gz")
+        session = self.sim.session()
+        first, second = [task["name"] for task in list(self.sim.data.tasks.values())[:2]]
+        with use_cassette(path, mode="record", session=session):
+            expected = {name: TaskApi(session).get_task_by_name(name) for name in (first, second)}
+        self.assertEqual(expected[first]["name"], first)
+        self.assertEqual(expected[second]["name"], second)
+        with use_cassette(path, session=session):
+            self.assertEqual(TaskApi(session).get_task_id_by_name(second), expected[second]["id"])
+            self.assertEqual(TaskApi(session).get_task_by_name(first), expected[first])
+
+
+if __name__ == "__main__":
+    unittest.main()
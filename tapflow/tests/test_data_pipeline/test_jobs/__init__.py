@@ -2,6 +2,8 @@ import unittest
 from unittest.mock import Mock
 import time
 
+from tapflow.lib.cache import EntityStore
+
 class BaseJobTest(unittest.TestCase):
     def setUp(self):
         # 初始化通用的mock对象
@@ -20,17 +22,9 @@ class BaseJobTest(unittest.TestCase):
 
     def initialize_client_cache(self, mock_client_cache):
         # 初始化client_cache
-        mock_client_cache["jobs"] = {
-            "id_index": {
-                "test_job_id": self.mock_job_data
-            },
-            "name_index": {
-                "test_job": self.mock_job_data
-            },
-            "number_index": {
-                "0": self.mock_job_data
-            }
-        }
+        jobs = EntityStore("jobs")
+        jobs.replace([self.mock_job_data])
+        mock_client_cache["jobs"] = jobs
 
     def create_job(self, mock_client_cache, mock_get_obj, mock_req_get, job_id="test_job_id", name=None, pipeline=None):
         """
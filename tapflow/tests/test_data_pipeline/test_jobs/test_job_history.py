@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+
+from tapflow.lib.data_pipeline.job import Job, JobStats
+from tapflow.lib.data_pipeline.job_history import OUTPUT_FIELDS, JobStatsHistory
+
+
+def sample(**fields) -> JobStats:
+    stats = JobStats()
+    for k, v in fields.items():
+        setattr(stats, k, v)
+    return stats
+
+
+class TestJobStatsHistory(unittest.TestCase):
+    def test_ring_buffer_keeps_latest_samples(self):
+        """测试写满后覆盖最早的采样"""
+        history = JobStatsHistory(capacity=3)
+        for i in range(5):
+            history.append(sample(output_insert=i * 10), at=100 + i)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.times(), [102, 103, 104])
+        self.assertEqual(history.values("output_insert"), [20, 30, 40])
+        self.assertEqual(history.latest()["output_insert"], 40)
+        self.assertEqual(history.times(window=1), [103, 104])
+
+    def test_rates_and_trend(self):
+        """测试速率(累计值归零按重新开始计算), 滑动平均和趋势"""
+        history = JobStatsHistory()
+        for at, inserted, updated, lag in [(0, 0, 0, 100), (2, 20, 0, 200), (4, 40, 20, 300), (6, 10, 0, 400)]:
+            history.append(sample(output_insert=inserted, output_update=updated, replicate_lag=lag), at=at)
+        self.assertEqual(history.rates("output_insert"), [10, 10, 5])
+        self.assertEqual(history.rate(OUTPUT_FIELDS), (20 + 40 + 10) / 6)
+        self.assertEqual(history.moving_average("replicate_lag", n=2), [100, 150, 250, 350])
+        self.assertAlmostEqual(history.trend("replicate_lag"), 50)
+        self.assertIsNone(JobStatsHistory().rate("output_insert"))
+
+    def test_idle(self):
+        """测试最近若干次采样之间没有写入"""
+        history = JobStatsHistory()
+        for at, inserted in enumerate([0, 5, 5, 5]):
+            history.append(sample(output_insert=inserted), at=at)
+        self.assertTrue(history.idle(OUTPUT_FIELDS, 2))
+        self.assertFalse(history.idle(OUTPUT_FIELDS, 3))
+        self.assertFalse(history.idle(OUTPUT_FIELDS, 5))
+
+    def test_export(self):
+        """测试导出 Prometheus 文本格式和 CSV"""
+        history = JobStatsHistory()
+        history.append(sample(output_insert=3, replicate_lag=1.5), at=10)
+        history.append(sample(output_insert=7, replicate_lag=2), at=12)
+        text = history.to_prometheus({"job_name": 'a "b"'})
+        self.assertIn("# TYPE tapflow_job_output_insert_total counter", text)
+        self.assertIn('tapflow_job_output_insert_total{job_name="a \\"b\\""} 7 12000', text)
+        self.assertIn("# TYPE tapflow_job_replicate_lag gauge", text)
+        rows = history.to_csv().splitlines()
+        self.assertEqual(len(rows), 3)
+        header = rows[0].split(",")
+        self.assertEqual(header[0], "timestamp")
+        self.assertEqual(rows[1].split(",")[header.index("replicate_lag")], "1.5")
+        self.assertEqual(JobStatsHistory().to_prometheus(), "")
+
+
+class TestJobRates(unittest.TestCase):
+    @patch('tapflow.lib.data_pipeline.job.Job.stats')
+    def test_cdc_qps_from_history(self, mock_stats):
+        """测试 cdc_qps 使用历史采样计算速率, 不再等待"""
+        job = Job.__new__(Job)
+        history = JobStatsHistory()
+        mock_stats.return_value = sample(output_qps=1)
+        with patch.object(Job, "history", history):
+            self.assertEqual(job.cdc_qps(), 1)
+            history.append(sample(output_insert=0), at=0)
+            history.append(sample(output_insert=50), at=5)
+            self.assertEqual(job.cdc_qps(), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
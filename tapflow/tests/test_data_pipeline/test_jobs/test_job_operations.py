@@ -1,8 +1,17 @@
 import unittest
 from unittest.mock import patch, Mock
 from tapflow.lib.data_pipeline.job import Job
+from tapflow.lib.task_events import TaskSubscription
 from tapflow.tests.test_data_pipeline.test_jobs import BaseJobTest
 
+
+def subscription(status):
+    """返回一个已收到任务状态的订阅"""
+    sub = TaskSubscription(Mock(), "job_id")
+    sub._update({"id": "job_id", "status": status})
+    return sub
+
+
 class TestJobOperations(BaseJobTest):
     @patch('tapflow.lib.data_pipeline.job.logger.warn')
     @patch('tapflow.lib.data_pipeline.job.logger.info')
@@ -120,7 +129,7 @@ class TestJobOperations(BaseJobTest):
         # 验证put请求没被调用
         mock_put.assert_not_called()
 
-    @patch('tapflow.lib.data_pipeline.job.time')
+    @patch('tapflow.lib.data_pipeline.job.task_events.watch')
     @patch('tapflow.lib.data_pipeline.job.logger.warn')
     @patch('tapflow.lib.data_pipeline.job.logger.info')
     @patch('tapflow.lib.data_pipeline.job.req.put')
@@ -129,24 +138,22 @@ class TestJobOperations(BaseJobTest):
     @patch('tapflow.lib.op_object.get_obj')
     @patch('tapflow.lib.data_pipeline.job.client_cache', new_callable=dict)
     def test_stop_timeout(self, mock_client_cache, mock_get_obj, mock_req_get, mock_status, 
-                         mock_put, mock_logger_info, mock_logger_warn, mock_time):
+                         mock_put, mock_logger_info, mock_logger_warn, mock_watch):
         # 创建Job实例
         job = self.create_job(mock_client_cache, mock_get_obj, mock_req_get)
         
-        # 模拟时间流逝
-        mock_time.time.side_effect = [0, 61]  # 第一次调用返回0，第二次调用返回61，超过默认超时时间60
-        
         # 模拟任务状态
-        mock_status.side_effect = ["running", "running"]  # 状态一直是running
+        mock_status.return_value = "running"
+        mock_watch.return_value = subscription("running")  # 订阅到的状态一直是running
         
-        result = job.stop(quiet=False)
+        result = job.stop(t=0.1, quiet=False)
         
         # 验证结果
         self.assertFalse(result)
         # 验证警告日志被调用
         mock_logger_warn.assert_called_once_with("{}", "Task stopped failed")
 
-    @patch('tapflow.lib.data_pipeline.job.time')
+    @patch('tapflow.lib.data_pipeline.job.task_events.watch')
     @patch('tapflow.lib.data_pipeline.job.logger.warn')
     @patch('tapflow.lib.data_pipeline.job.logger.info')
     @patch('tapflow.lib.data_pipeline.job.req.put')
@@ -155,15 +162,13 @@ class TestJobOperations(BaseJobTest):
     @patch('tapflow.lib.op_object.get_obj')
     @patch('tapflow.lib.data_pipeline.job.client_cache', new_callable=dict)
     def test_stop_success(self, mock_client_cache, mock_get_obj, mock_req_get, mock_status, 
-                         mock_put, mock_logger_info, mock_logger_warn, mock_time):
+                         mock_put, mock_logger_info, mock_logger_warn, mock_watch):
         # 创建Job实例
         job = self.create_job(mock_client_cache, mock_get_obj, mock_req_get)
         
-        # 模拟时间流逝
-        mock_time.time.side_effect = [0, 1]  # 确保不会超时
-        
         # 模拟任务状态
-        mock_status.side_effect = ["running", "stop"]  # 第一次是running，第二次是stop
+        mock_status.return_value = "running"
+        mock_watch.return_value = subscription("stop")  # 订阅到的状态是stop
         
         result = job.stop(quiet=False)
         
@@ -172,7 +177,7 @@ class TestJobOperations(BaseJobTest):
         # 验证成功日志被调用
         mock_logger_info.assert_called_once_with("{}", "Task stopped successfully")
 
-    @patch('tapflow.lib.data_pipeline.job.time')
+    @patch('tapflow.lib.data_pipeline.job.task_events.watch')
     @patch('tapflow.lib.data_pipeline.job.logger.warn')
     @patch('tapflow.lib.data_pipeline.job.logger.info')
     @patch('tapflow.lib.data_pipeline.job.req.put')
@@ -181,15 +186,13 @@ class TestJobOperations(BaseJobTest):
     @patch('tapflow.lib.op_object.get_obj')
     @patch('tapflow.lib.data_pipeline.job.client_cache', new_callable=dict)
     def test_stop_with_stopping_status_no_sync(self, mock_client_cache, mock_get_obj, mock_req_get, mock_status, 
-                                             mock_put, mock_logger_info, mock_logger_warn, mock_time):
+                                             mock_put, mock_logger_info, mock_logger_warn, mock_watch):
         # 创建Job实例
         job = self.create_job(mock_client_cache, mock_get_obj, mock_req_get)
         
-        # 模拟时间流逝
-        mock_time.time.side_effect = [0, 1]  # 确保不会超时
-        
         # 模拟任务状态
-        mock_status.side_effect = ["running", "stopping"]  # 第一次是running，第二次是stopping
+        mock_status.return_value = "running"
+        mock_watch.return_value = subscription("stopping")  # 订阅到的状态是stopping
         
         result = job.stop(sync=False, quiet=False)  # 设置sync=False
         
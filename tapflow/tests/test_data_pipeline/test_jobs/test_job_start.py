@@ -3,6 +3,7 @@ from unittest.mock import patch, Mock
 from tapflow.lib.data_pipeline.job import Job
 
 class TestJobStart(BaseJobTest):
+    @patch('tapflow.lib.data_pipeline.job.phase_profiler.track')
     @patch('tapflow.lib.data_pipeline.job.time')
     @patch('tapflow.lib.data_pipeline.job.logger.warn')
     @patch('tapflow.lib.data_pipeline.job.logger.info')
@@ -13,7 +14,8 @@ class TestJobStart(BaseJobTest):
     @patch('tapflow.lib.op_object.get_obj')
     @patch('tapflow.lib.data_pipeline.job.client_cache', new_callable=dict)
     def test_start_when_status_is_edit(self, mock_client_cache, mock_get_obj, mock_req_get, mock_status, 
-                                     mock_save, mock_req_put, mock_logger_info, mock_logger_warn, mock_time):
+                                     mock_save, mock_req_put, mock_logger_info, mock_logger_warn, mock_time,
+                                     mock_track):
         # 创建Job实例
         job = self.create_job(mock_client_cache, mock_get_obj, mock_req_get)
         mock_time.sleep = Mock()  # 模拟sleep函数
@@ -41,6 +43,8 @@ class TestJobStart(BaseJobTest):
             mock_start_task.assert_called_once_with(job.id)
             # 验证成功日志被调用
             mock_logger_info.assert_called_once_with("{}", "Task start succeed")
+            # 验证启动成功后跟踪里程碑
+            mock_track.assert_called_once_with(job.id)
 
     @patch('tapflow.lib.data_pipeline.job.logger.warn')
     @patch('tapflow.lib.data_pipeline.job.req.put')
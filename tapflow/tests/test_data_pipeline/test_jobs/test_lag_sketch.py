@@ -0,0 +1,89 @@
+import random
+import unittest
+
+from tapflow.lib.data_pipeline.lag_sketch import DDSketch, LagSLO, WindowedSketch, merge_sketches, quantiles
+
+
+class TestDDSketch(unittest.TestCase):
+    def test_relative_accuracy(self):
+        """测试分位数的相对误差不超过设定值"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(6, 1.5) for _ in range(20000)]
+        sketch = DDSketch(0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLess(abs(sketch.quantile(q) - exact) / exact, 0.011)
+        self.assertLess(len(sketch.bins), 1000)
+        self.assertIsNone(DDSketch().quantile(0.5))
+
+    def test_merge(self):
+        """测试合并两个草图与直接添加全部采样的结果一致"""
+        a, b, both = DDSketch(), DDSketch(), DDSketch()
+        for i in range(1000):
+            (a if i % 2 else b).add(i)
+            both.add(i)
+        a.merge(b)
+        self.assertEqual(quantiles(a), quantiles(both))
+        self.assertEqual(a.count, 1000)
+        with self.assertRaises(ValueError):
+            a.merge(DDSketch(0.05))
+
+
+class TestWindowedSketch(unittest.TestCase):
+    def test_sliding_window(self):
+        """测试只合并窗口内的分片, 超过保留时间的分片被删除"""
+        sketch = WindowedSketch(slice_seconds=60, retention=3600)
+        for minute in range(120):
+            sketch.add(10000 if minute < 60 else 100, at=minute * 60)
+        now = 120 * 60
+        self.assertAlmostEqual(sketch.sketch(600, now).quantile(0.99), 100, delta=2)
+        self.assertEqual(sketch.sketch(None, now).count, 61)
+
+    def test_project_merge(self):
+        """测试多个任务的延迟分布合并"""
+        fast, slow = WindowedSketch(), WindowedSketch()
+        for i in range(90):
+            fast.add(100, at=1000 + i)
+        for i in range(10):
+            slow.add(9000, at=1000 + i)
+        merged = merge_sketches([fast, slow], 600, now=1100)
+        self.assertEqual(merged.count, 100)
+        self.assertAlmostEqual(merged.quantile(0.5), 100, delta=2)
+        self.assertAlmostEqual(merged.quantile(0.99), 9000, delta=90)
+
+
+class TestLagSLO(unittest.TestCase):
+    def test_parse(self):
+        """测试解析 SLO 文本"""
+        slo = LagSLO.parse("p99 lag < 5s over 10 minutes")
+        self.assertEqual((slo.quantile, slo.threshold_ms, slo.window, slo.inclusive), (0.99, 5000, 600, False))
+        slo = LagSLO.parse("P95 <= 800ms over 1h")
+        self.assertEqual((slo.quantile, slo.threshold_ms, slo.window, slo.inclusive), (0.95, 800, 3600, True))
+        self.assertEqual(LagSLO.parse("p50 < 300 over 30s").threshold_ms, 300)
+        for text in ("p99 > 5s over 10m", "lag < 5s", "p99 < 5 parsecs over 1m"):
+            with self.assertRaises(ValueError):
+                LagSLO.parse(text)
+
+    def test_check(self):
+        """测试按窗口内的分布判断, 一个好的采样不能满足 SLO"""
+        slo = LagSLO.parse("p99 lag < 5s over 10m")
+        sketch = WindowedSketch()
+        sketch.add(100, at=1000)
+        result = slo.check(sketch, now=1000)
+        self.assertFalse(result)
+        self.assertEqual(result.samples, 1)
+        for i in range(200):
+            sketch.add(1000 + i, at=1000 + i)
+        self.assertTrue(slo.check(sketch, now=1200))
+        for i in range(10):
+            sketch.add(20000, at=1200 + i)
+        result = slo.check(sketch, now=1210)
+        self.assertFalse(result)
+        self.assertGreater(result.value, 5000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import itertools
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.data_pipeline.job import Job
+from tapflow.lib.data_pipeline.phase_profiler import PHASES, PhaseProfiler, phase_profiler
+from tapflow.lib.data_pipeline.pipeline import Pipeline
+from tapflow.lib.task_events import TaskEventHub, task_events
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+_names = itertools.count()
+
+
+def task(task_id, run="r1", sync_status=None, **milestone):
+    return {"id": task_id, "name": task_id, "taskRecordId": run, "syncStatus": sync_status,
+            "attrs": {"milestone": milestone}}
+
+
+def finished(begin, end):
+    return {"status": "FINISH", "begin": begin * 1000, "end": end * 1000}
+
+
+class TestPhaseProfiler(unittest.TestCase):
+    def test_server_timestamps(self):
+        """测试里程碑带有 begin/end 时使用服务端时间, 每次状态变化都记录"""
+        profiler = PhaseProfiler()
+        profiler.observe(task("t1", DEDUCTION={"status": "RUNNING", "begin": 100000}), at=200)
+        profiler.observe(task("t1", DEDUCTION=finished(100, 102), DATA_NODE_INIT=finished(102, 105),
+                              TABLE_INIT={"status": "RUNNING", "begin": 105000}), at=300)
+        timeline = profiler.timeline("t1")
+        self.assertEqual(timeline.durations(), {"DEDUCTION": 2, "DATA_NODE_INIT": 3})
+        self.assertEqual(timeline.duration("TABLE_INIT", now=145), 40)
+        self.assertEqual([(phase, status) for _, phase, status in timeline.transitions],
+                         [("DEDUCTION", "RUNNING"), ("DEDUCTION", "FINISH"), ("DATA_NODE_INIT", "FINISH"),
+                          ("TABLE_INIT", "RUNNING")])
+        self.assertEqual(timeline.dominant(), "DATA_NODE_INIT")
+
+    def test_observed_times_from_sync_status(self):
+        """测试只有 syncStatus 时使用观察到的时间, 进入下一阶段时结束上一阶段"""
+        profiler = PhaseProfiler()
+        profiler.observe(task("t1", sync_status="TABLE_INIT"), at=10)
+        profiler.observe(task("t1", sync_status="SNAPSHOT"), at=25)
+        self.assertEqual(profiler.timeline("t1").durations(), {"TABLE_INIT": 15})
+
+    def test_restart_starts_new_run(self):
+        """测试任务重新启动后记录新的时间线, 保留之前的启动"""
+        profiler = PhaseProfiler(max_runs=2)
+        for i, run in enumerate(("r1", "r2", "r3")):
+            profiler.observe(task("t1", run, DEDUCTION=finished(i * 100, i * 100 + 1 + i)))
+        runs = profiler.runs("t1")
+        self.assertEqual([timeline.run for timeline in runs], ["r2", "r3"])
+        self.assertEqual(runs[-1].durations(), {"DEDUCTION": 3})
+        profiler.observe(task("t1", None, DEDUCTION={"status": "RUNNING", "begin": 500000}))
+        self.assertIsNone(profiler.timeline("t1").duration("DEDUCTION"))
+
+    def test_report_by_label(self):
+        """测试按源数据库类型汇总各阶段耗时的分位数, 找出占比最高的阶段"""
+        profiler = PhaseProfiler()
+        for i in range(20):
+            task_id = "t{}".format(i)
+            oracle = i % 2 == 0
+            profiler.label(task_id, source_type="Oracle" if oracle else "Mysql")
+            table_init = (i + 1) * 2 if oracle else 1
+            profiler.observe(task(task_id, DEDUCTION=finished(0, 1), TABLE_INIT=finished(1, 1 + table_init)))
+        report = profiler.report("source_type")
+        oracle = report["Oracle"]["TABLE_INIT"]
+        self.assertEqual(oracle["count"], 10)
+        self.assertEqual(oracle["max"], 38)
+        self.assertAlmostEqual(oracle["p95"], 36.2)
+        self.assertEqual(report["Mysql"]["TABLE_INIT"]["p50"], 1)
+        self.assertEqual(profiler.report()["all"]["DEDUCTION"]["count"], 20)
+        text = profiler.format_report("source_type")
+        self.assertIn("Oracle               dominant phase: TABLE_INIT", text)
+        self.assertEqual(set(profiler.report(lambda timeline: timeline.name[:2], task_ids=["t1", "t12"])),
+                         {"t1"})
+
+    def test_save_and_load(self):
+        """测试时间线保存到文件后重新加载"""
+        profiler = PhaseProfiler()
+        profiler.label("t1", source_type="Oracle")
+        profiler.observe(task("t1", DEDUCTION=finished(0, 4)))
+        path = os.path.join(tempfile.mkdtemp(), "phases.json")
+        profiler.save(path)
+        loaded = PhaseProfiler()
+        loaded.load(path)
+        self.assertEqual(loaded.report("source_type"), profiler.report("source_type"))
+        self.assertEqual(loaded.timeline("t1").transitions, profiler.timeline("t1").transitions)
+
+
+class TestPhaseProfilerWithSimulator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=1, connections=1, tables=1, step_seconds=0.05,
+                                                   snapshot_steps=2)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def test_track_task_start(self):
+        """测试跟踪任务启动直到 CDC 开始, 时间线与服务端里程碑一致"""
+        session = self.sim.session()
+        api = TaskApi(session)
+        hub = TaskEventHub(session, ws_uri=self.sim.ws_uri)
+        profiler = PhaseProfiler(hub=hub)
+        hub.add_listener(profiler.observe)
+        created, ok = api.create_task({"name": "phases_{}".format(next(_names)), "type": "initial_sync+cdc",
+                                       "dag": {}})
+        self.assertTrue(ok)
+        self.assertTrue(api.start_task(created["id"])[1])
+        sub = profiler.track(created["id"])
+        deadline = time.time() + 5
+        while not sub.closed and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(sub.closed)
+        milestone = sub.task["attrs"]["milestone"]
+        timeline = profiler.timeline(created["id"])
+        for phase in ("DEDUCTION", "DATA_NODE_INIT", "TABLE_INIT", "SNAPSHOT"):
+            expected = (milestone[phase]["end"] - milestone[phase]["begin"]) / 1000
+            self.assertEqual(timeline.duration(phase), expected)
+        self.assertEqual(timeline.dominant(), "SNAPSHOT")
+        self.assertEqual(hub.watched(), [])
+
+    def test_pipeline_start_records_timeline(self):
+        """测试只调用 Pipeline.start, 不等待任务状态, 也能记录完整的启动时间线"""
+        session = self.sim.session()
+        api = TaskApi(session)
+        created, ok = api.create_task({"name": "phases_{}".format(next(_names)), "type": "initial_sync+cdc",
+                                       "dag": {}})
+        self.assertTrue(ok)
+        job = Job.__new__(Job)
+        job.id, job.name, job.env, job.setting, job.task_api = created["id"], created["name"], {}, {}, api
+        pipeline = Pipeline.__new__(Pipeline)
+        pipeline.job, pipeline.dag, pipeline.sources, pipeline.sinks = job, Mock(setting={}), [], []
+        # 全局的 task_events 使用模拟服务端, 里程碑由全局的 phase_profiler 记录
+        with patch.object(task_events, "session", session), patch.object(task_events, "ws_uri", self.sim.ws_uri), \
+                patch.object(Job, "save", return_value=True), patch("tapflow.lib.data_pipeline.job.time"):
+            self.assertIs(pipeline.start(), pipeline)
+            deadline = time.time() + 5
+            while created["id"] in task_events.watched() and time.time() < deadline:
+                time.sleep(0.05)
+        self.assertNotIn(created["id"], task_events.watched())
+        timeline = pipeline.phase_timeline()
+        self.assertIs(timeline, phase_profiler.timeline(created["id"]))
+        self.assertEqual(set(timeline.durations()), set(PHASES))
+        self.assertEqual(timeline.labels, {"source_type": "unknown", "target_type": "unknown"})
+
+
+if __name__ == "__main__":
+    unittest.main()
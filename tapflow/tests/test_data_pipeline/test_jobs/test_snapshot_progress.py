@@ -0,0 +1,67 @@
+import unittest
+
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.lib.data_pipeline.job import JobStats
+from tapflow.lib.data_pipeline.snapshot_progress import SnapshotProgress
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+
+def snapshot_stats(inserted: int, tables_done: int, current_rows: int = 0, current_inserted: int = 0) -> JobStats:
+    stats = JobStats()
+    stats.snapshot_row_total = 3000
+    stats.table_total = 3
+    stats.snapshot_insert_row_total = inserted
+    stats.snapshot_table_total = tables_done
+    stats.current_snapshot_table_row_total = current_rows
+    stats.current_snapshot_table_insert_row_total = current_inserted
+    return stats
+
+
+class TestSnapshotProgress(unittest.TestCase):
+    def test_tables_and_eta(self):
+        """测试每张表和整体的进度, 速度及 ETA"""
+        reports = []
+        progress = SnapshotProgress({"a": 500, "b": 1500, "c": 1000}, callback=reports.append)
+        progress.update(snapshot_stats(0, 0, 500, 0), at=0)
+        progress.update(snapshot_stats(400, 0, 500, 400), at=10)
+        report = progress.update(snapshot_stats(900, 1, 1500, 400), at=20)
+        self.assertEqual(len(reports), 3)
+        self.assertEqual(report.percent, 30)
+        self.assertEqual(report.throughput, 45)
+        self.assertAlmostEqual(report.eta, 2100 / 45)
+        self.assertLess(report.eta_low, report.eta)
+        self.assertGreater(report.eta_high, report.eta)
+        a, b, c = report.tables
+        self.assertEqual((a.status, a.percent, a.throughput), ("done", 100, 25))
+        self.assertEqual(b.status, "running")
+        self.assertAlmostEqual(b.percent, 400 / 15)
+        self.assertEqual((c.status, c.percent), ("waiting", 0))
+        self.assertIn("tables 1/3", str(report))
+
+    def test_without_table_rows(self):
+        """测试没有元数据时只报告整体进度, 还没有速度时 ETA 未知"""
+        report = SnapshotProgress().update(snapshot_stats(0, 0), at=0)
+        self.assertEqual(report.tables, [])
+        self.assertIsNone(report.eta)
+        self.assertIn("eta unknown", str(report))
+        self.assertFalse(report.done)
+        self.assertTrue(SnapshotProgress().update(snapshot_stats(3000, 3), at=1).done)
+
+
+class TestTableRowCounts(unittest.TestCase):
+    def test_row_counts_from_metadata(self):
+        """测试从元数据获取表的行数"""
+        sim = ManagerSimulator(SimulatorConfig(tasks=1, connections=1, tables=3, rows_per_table=42)).start()
+        try:
+            session = sim.session()
+            api = MetadataInstanceApi(session)
+            source_id = next(iter(sim.data.connections))
+            self.assertEqual(api.get_table_row_counts(source_id), {"table_0": 42, "table_1": 42, "table_2": 42})
+            self.assertEqual(api.get_table_row_counts(source_id, ["table_2", "missing"]),
+                             {"table_2": 42, "missing": 0})
+        finally:
+            sim.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
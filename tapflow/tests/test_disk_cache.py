@@ -0,0 +1,73 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from tapflow.lib import disk_cache
+from tapflow.lib.cache import ClientCache
+from tapflow.lib.disk_cache import DiskCache, open_disk_cache, restore_client_cache, save_client_cache, scope_for
+
+CONNECTIONS = [{"id": "6721f8a0b1c2d3e4f5000001", "name": "mysql_a", "last_updated": "2024-01-01T00:00:00.000Z"}]
+JOBS = [{"id": "6721f8a0b1c2d3e4f5000002", "name": "job_a", "status": "running"}]
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "tapflow", "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_save_load_and_scope(self):
+        """测试按服务地址和用户隔离保存和读取"""
+        disk = DiskCache(self.path, scope_for("127.0.0.1:3030", "user1"))
+        disk.save("jobs", JOBS, saved_at=1000)
+        with patch('tapflow.lib.disk_cache.time.time', return_value=2000):
+            self.assertEqual(disk.load("jobs"), (JOBS, 1000))
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        other = DiskCache(self.path, scope_for("127.0.0.1:3030", "user2"))
+        self.assertIsNone(other.load("jobs"))
+        self.assertIsNone(disk.load("jobs", max_age=60))
+        disk.close()
+        other.close()
+
+    def test_schema_version_change_drops_entries(self):
+        """测试数据格式版本变化后丢弃旧数据"""
+        DiskCache(self.path, "s").save("jobs", JOBS)
+        with patch.object(disk_cache, "SCHEMA_VERSION", disk_cache.SCHEMA_VERSION + 1):
+            self.assertIsNone(DiskCache(self.path, "s").load("jobs"))
+
+    def test_restore_round_trip(self):
+        """测试 client_cache 写入磁盘后恢复, 保留加载时间和水位线"""
+        disk = DiskCache(self.path, "s")
+        cache = ClientCache()
+        self.assertFalse(restore_client_cache(cache, disk))
+        cache.connections.replace(CONNECTIONS)
+        cache.jobs.replace(JOBS)
+        cache.connectors.replace({"mysql": {"name": "MySQL"}})
+        cache.tables.store_for(CONNECTIONS[0]["id"]).replace([{"id": "t1", "original_name": "orders"}])
+        save_client_cache(cache, disk)
+
+        restored = ClientCache()
+        self.assertTrue(restore_client_cache(restored, disk))
+        self.assertEqual(restored.connections["name_index"]["mysql_a"], CONNECTIONS[0])
+        self.assertEqual(restored.connections.watermark, "2024-01-01T00:00:00.000Z")
+        self.assertEqual(restored.connections.loaded_at, cache.connections.loaded_at)
+        self.assertIn("job_a", restored.jobs["name_index"])
+        self.assertIn("mysql", restored.connectors)
+        self.assertIn("orders", restored.tables[CONNECTIONS[0]["id"]]["name_index"])
+
+    def test_open_failure_and_switch(self):
+        """测试禁用或无法打开时返回 None"""
+        with patch.dict(os.environ, {"TAPFLOW_DISK_CACHE": "0"}):
+            self.assertIsNone(open_disk_cache("server", "user", self.path))
+        with patch('tapflow.lib.disk_cache.sqlite3.connect', side_effect=sqlite3.OperationalError("locked")):
+            self.assertIsNone(open_disk_cache("server", "user", self.path))
+        self.assertIsNotNone(open_disk_cache("server", "user", self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
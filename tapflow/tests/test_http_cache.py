@@ -0,0 +1,172 @@
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.lib.http_cache import HttpCache, CacheRule, notify, register_invalidation_hook, http_cache
+from tapflow.lib.request import RequestSession
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+
+def make_response(body=b'{"code": "ok", "data": {"items": []}}', status_code=200, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.encoding = "utf-8"
+    response.headers.update(headers or {})
+    return response
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.session = RequestSession("127.0.0.1:3030")
+        self.cache = HttpCache(rules=[
+            CacheRule("/MetadataInstances/*", ttl=60),
+            CacheRule("/MetadataInstances/node/*", ttl=0),
+            CacheRule("/MetadataInstances/metadata/v3", ttl=60, methods=("POST",)),
+        ])
+        self.session.http_cache = self.cache
+
+    @patch('requests.Session.request')
+    def test_hit_within_ttl(self, mock_request):
+        """测试 TTL 内重复请求命中缓存, 每次返回独立解析的对象"""
+        mock_request.return_value = make_response()
+        first = self.session.get("/MetadataInstances/1").json()
+        second = self.session.get("/MetadataInstances/1").json()
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.cache.hits, 1)
+
+    @patch('requests.Session.request')
+    def test_uncached_paths(self, mock_request):
+        """测试 ttl 为 0 的接口和未配置的方法不缓存"""
+        mock_request.return_value = make_response()
+        self.session.get("/MetadataInstances/node/schema", params={"nodeId": "1"})
+        self.session.get("/MetadataInstances/node/schema", params={"nodeId": "1"})
+        self.session.post("/MetadataInstances/1", json={})
+        self.session.post("/MetadataInstances/1", json={})
+        self.assertEqual(mock_request.call_count, 4)
+
+    @patch('requests.Session.request')
+    def test_post_cache_keyed_by_body(self, mock_request):
+        mock_request.return_value = make_response()
+        self.session.post("/MetadataInstances/metadata/v3", json={"c1": {"tableNames": ["a"]}})
+        self.session.post("/MetadataInstances/metadata/v3", json={"c1": {"tableNames": ["b"]}})
+        self.session.post("/MetadataInstances/metadata/v3", json={"c1": {"tableNames": ["a"]}})
+        self.assertEqual(mock_request.call_count, 2)
+
+    @patch('tapflow.lib.http_cache.time')
+    @patch('requests.Session.request')
+    def test_revalidate_with_etag(self, mock_request, mock_time):
+        """测试过期后使用 If-None-Match 重新验证, 304 时返回缓存内容"""
+        mock_time.monotonic.return_value = 100
+        mock_request.return_value = make_response(headers={"ETag": '"v1"'})
+        self.session.get("/MetadataInstances/1")
+        mock_time.monotonic.return_value = 200
+        mock_request.return_value = make_response(b"", status_code=304)
+        res = self.session.get("/MetadataInstances/1")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {"code": "ok", "data": {"items": []}})
+        self.assertEqual(mock_request.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        self.assertEqual(self.cache.revalidations, 1)
+
+    @patch('requests.Session.request')
+    def test_lru_eviction_by_bytes(self, mock_request):
+        """测试超过字节上限时淘汰最久未使用的条目"""
+        body = b'{"code": "ok", "data": "' + b"x" * 80 + b'"}'
+        mock_request.return_value = make_response(body)
+        self.cache.max_bytes = len(body) * 2
+        self.session.get("/MetadataInstances/1")
+        self.session.get("/MetadataInstances/2")
+        self.session.get("/MetadataInstances/1")
+        self.session.get("/MetadataInstances/3")
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+        self.session.get("/MetadataInstances/1")
+        self.assertEqual(mock_request.call_count, 3)
+        self.session.get("/MetadataInstances/2")
+        self.assertEqual(mock_request.call_count, 4)
+
+    @patch('requests.Session.request')
+    def test_invalidate(self, mock_request):
+        mock_request.return_value = make_response()
+        self.session.get("/MetadataInstances/1")
+        self.cache.invalidate("/MetadataInstances")
+        self.session.get("/MetadataInstances/1")
+        self.assertEqual(mock_request.call_count, 2)
+
+    def test_notify_invalidates_and_calls_hooks(self):
+        """测试数据变更事件使全局缓存失效并触发回调"""
+        http_cache.put(("k",), "/Connections", make_response(), 60)
+        hook = Mock()
+        with patch.dict('tapflow.lib.http_cache._invalidation_hooks', {}, clear=True):
+            register_invalidation_hook("datasource.save", hook)
+            notify("datasource.save", id="1")
+        self.assertIsNone(http_cache.get(("k",)))
+        hook.assert_called_once_with("datasource.save", id="1")
+
+    @patch('requests.Session.request')
+    def test_filtered_connections_not_cached(self, mock_request):
+        """测试默认规则只缓存不带过滤条件的连接列表, 增量刷新等过滤查询每次都请求服务端"""
+        mock_request.return_value = make_response()
+        self.session.http_cache = HttpCache()
+        since = json.dumps({"where": {"last_updated": {"gte": "2024-01-01"}}})
+        for _ in range(2):
+            self.session.get("/Connections", params={"filter": since})
+        self.assertEqual(mock_request.call_count, 2)
+        for _ in range(2):
+            self.session.get("/Connections")
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch('tapflow.lib.connections.connection.ConnectionsApi')
+    def test_connection_delete_invalidates(self, mock_api):
+        """测试删除连接后连接列表的缓存失效"""
+        from tapflow.lib.connections.connection import Connection
+        http_cache.put(("k",), "/Connections", make_response(), 60)
+        connection = Connection.__new__(Connection)
+        connection.id = "1"
+        with patch.dict('tapflow.lib.http_cache._invalidation_hooks', {}, clear=True):
+            self.assertTrue(connection.delete())
+        self.assertIsNone(http_cache.get(("k",)))
+
+    @patch('requests.Session.request')
+    def test_cached_response_is_consumed(self, mock_request):
+        """测试命中缓存的响应可以像真实响应一样 iter_content 和 close"""
+        mock_request.return_value = make_response()
+        self.session.get("/MetadataInstances/1")
+        res = self.session.get("/MetadataInstances/1")
+        self.assertTrue(res.from_cache)
+        self.assertEqual(b"".join(res.iter_content(8)), b'{"code": "ok", "data": {"items": []}}')
+        res.close()
+
+
+class TestStreamedListWithDefaultCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=1, connections=3, tables=5)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def test_list_twice(self):
+        """测试使用默认缓存规则时, 连续两次流式读取列表接口都能得到完整结果, 流式请求不经过缓存"""
+        session = self.sim.session()
+        session.http_cache = HttpCache()
+        connections = ConnectionsApi(session)
+        metadata = MetadataInstanceApi(session)
+        results = []
+        for _ in range(2):
+            items = connections.get_connections()
+            self.assertEqual(len(items), 3)
+            results.append((items, metadata.list_tables(items[0]["id"])))
+        self.assertTrue(results[0][1])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(session.http_cache.stats()["entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
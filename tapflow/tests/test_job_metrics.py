@@ -0,0 +1,102 @@
+import itertools
+import time
+import unittest
+from unittest.mock import patch
+
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.cache import EntityStore
+from tapflow.lib.data_pipeline.job import Job, JobStats
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+_names = itertools.count()
+
+
+class TestBatchMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=1, connections=1, tables=1, step_seconds=0.05,
+                                                   snapshot_steps=2)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.session = self.sim.session()
+        self.api = TaskApi(self.session)
+
+    def create_task(self, start: bool = True) -> str:
+        task, ok = self.api.create_task({"name": "metrics_{}".format(next(_names)), "type": "initial_sync+cdc",
+                                         "dag": {}})
+        self.assertTrue(ok)
+        if start:
+            self.assertTrue(self.api.start_task(task["id"])[1])
+        return task["id"]
+
+    def requests(self, fn) -> dict:
+        before = self.sim.requests.copy()
+        fn()
+        return {k: v - before[k] for k, v in self.sim.requests.items() if v != before[k]}
+
+    def test_many_jobs_in_one_batch(self):
+        """测试多个任务的统计合并为一次 /measurement/batch 请求, 第二次刷新直接使用缓存的 taskRecordId"""
+        ids = [self.create_task() for _ in range(20)]
+        idle = self.create_task(start=False)
+        time.sleep(0.3)
+        result = {}
+        with patch("tapflow.lib.data_pipeline.job.req", self.session):
+            self.assertEqual(self.requests(lambda: result.update(Job.stats_many(ids + [idle]))),
+                             {"GET /Task": 1, "POST /measurement/batch": 1})
+            self.assertEqual(self.requests(lambda: Job.stats_many(ids)), {"POST /measurement/batch": 1})
+        self.assertIsNone(result[idle])
+        for task_id in ids:
+            self.assertIsInstance(result[task_id], JobStats)
+            self.assertGreater(result[task_id].snapshot_row_total, 0)
+
+    def test_restarted_task_refreshes_record_id(self):
+        """测试任务重新启动后, 旧的 taskRecordId 查不到指标时重新获取"""
+        task_id = self.create_task()
+        self.assertTrue(self.api.get_tasks_metrics([task_id])[task_id])
+        self.assertTrue(self.api.stop_task(task_id))
+        time.sleep(0.1)
+        self.assertTrue(self.api.start_task(task_id)[1])
+        counts = self.requests(lambda: self.assertTrue(self.api.get_tasks_metrics([task_id])[task_id]))
+        self.assertEqual(counts, {"GET /Task": 1, "POST /measurement/batch": 2})
+
+    def test_series_over_long_range(self):
+        """测试 48 小时的历史指标分段并发查询, 拼接后没有重复, 降采样到目标点数"""
+        task_id = self.create_task()
+        record_id = self.api.get_task_record_ids([task_id])[task_id]
+        end = 1700000000000
+        start = end - 48 * 3600 * 1000
+        before = self.sim.requests["POST /measurement/batch"]
+        series = self.api.get_task_measurement_series(task_id, record_id, start, end)
+        self.assertEqual(self.sim.requests["POST /measurement/batch"] - before, 8)
+        self.assertEqual(len(series["time"]), 48 * 720)
+        self.assertEqual(series["time"], sorted(set(series["time"])))
+        self.assertEqual(set(series), {"time", "inputQps", "outputQps", "replicateLag"})
+        with patch("tapflow.lib.data_pipeline.job.req", self.session), \
+                patch("tapflow.lib.data_pipeline.job.client_cache", {"jobs": EntityStore("jobs")}):
+            job = Job(id=task_id)
+            result = job.metrics_series(start / 1000, end / 1000, fields=("replicateLag",), points=500)
+        self.assertEqual(len(result["replicateLag"]), 500)
+        self.assertEqual(result["replicateLag"][0][0], start)
+        self.assertAlmostEqual(max(v for _, v in result["replicateLag"]), 750, delta=1)
+
+
+    def test_series_after_restart(self):
+        """测试任务重新启动后, 历史指标使用新的 taskRecordId 查询"""
+        task_id = self.create_task()
+        self.assertTrue(self.api.get_task_record_ids([task_id]))
+        self.assertTrue(self.api.stop_task(task_id))
+        time.sleep(0.1)
+        self.assertTrue(self.api.start_task(task_id)[1])
+        end = time.time()
+        with patch("tapflow.lib.data_pipeline.job.req", self.session), \
+                patch("tapflow.lib.data_pipeline.job.client_cache", {"jobs": EntityStore("jobs")}):
+            result = Job(id=task_id).metrics_series(end - 60, end, fields=("replicateLag",))
+        self.assertTrue(result["replicateLag"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.cache import system_server_conf
+from tapflow.lib.http_cache import HttpCache
+from tapflow.lib.login import login_with_access_code
+from tapflow.lib.request import req
+from tapflow.lib.session_store import SessionStore, session_key
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+
+class TestPersistedSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=3, connections=1, tables=1)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = SessionStore(os.path.join(self.dir, "tapflow", "session.json"))
+        conf = patch.dict(system_server_conf)
+        conf.start()
+        self.addCleanup(conf.stop)
+        self.addCleanup(req.__init__, req.server)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def login(self) -> dict:
+        before = self.sim.requests.copy()
+        self.assertTrue(login_with_access_code(self.sim.server, "code", interactive=False, store=self.store))
+        req.http_cache = HttpCache()
+        return {k: v - before[k] for k, v in self.sim.requests.items() if v != before[k]}
+
+    def test_token_reused_until_expired(self):
+        """测试第一次登录只查询当前用户, 之后直接使用保存的 token, 即将过期时重新登录"""
+        self.assertEqual(self.login(), {"POST /users/generatetoken": 1, "GET /users/sim-user": 1})
+        self.assertEqual(os.stat(self.store.path).st_mode & 0o777, 0o600)
+        with open(self.store.path) as f:
+            self.assertNotIn("code", "".join(json.load(f)))
+        self.assertEqual(self.login(), {})
+        self.assertEqual(system_server_conf["username"], "simulator")
+        self.assertEqual(req.params, {"access_token": "sim-token"})
+        with patch('tapflow.lib.session_store.time.time', return_value=time.time() + 1209600):
+            self.assertEqual(self.login()["POST /users/generatetoken"], 1)
+
+    def test_rejected_token_is_renewed(self):
+        """测试 token 被服务端拒绝后重新登录并重试请求"""
+        key = session_key(self.sim.server, "code")
+        self.store.save(key, {"token": "sim-token", "user_id": "sim-user", "username": "simulator",
+                              "expires_at": time.time() + 3600})
+        self.assertEqual(self.login(), {})
+        self.sim.fail_next("/Task", status=401)
+        before = self.sim.requests["POST /users/generatetoken"]
+        self.assertEqual(len(TaskApi(req).get_all_tasks()), 3)
+        self.assertEqual(self.sim.requests["POST /users/generatetoken"] - before, 1)
+        self.assertIsNotNone(self.store.load(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import patch
+
+from tapflow.cli.namespace import LazyNamespace
+from tapflow.lib.cache import ClientCache
+from tapflow.lib.op_object import QuickDataSourceMigrateJob, complete_connection_names, connection_object
+
+CONNECTION = {"id": "6721f8a0b1c2d3e4f5000001", "name": "mysql_orders"}
+
+
+class TestLazyNamespace(unittest.TestCase):
+    def setUp(self):
+        self.cache = ClientCache()
+        self.cache.connections.replace([CONNECTION, {"id": "6721f8a0b1c2d3e4f5000002", "name": "print"},
+                                        {"id": "6721f8a0b1c2d3e4f5000003", "name": "my-db"}])
+        self.cache.tables.store_for(CONNECTION["id"]).replace([
+            {"id": "t1", "original_name": "orders"}, {"id": "t2", "original_name": "order items"},
+        ])
+        patcher = patch('tapflow.lib.op_object.client_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolve_connection_names(self):
+        """测试未定义的名称按连接名称解析, 内置名称和非法标识符不解析"""
+        ns = LazyNamespace()
+        obj = eval("mysql_orders", ns)
+        self.assertIsInstance(obj, QuickDataSourceMigrateJob)
+        self.assertIs(obj, connection_object("mysql_orders"))
+        self.assertEqual(eval("mysql_orders.orders", ns), "mysql_orders.orders")
+        self.assertIs(eval("print", ns), print)
+        with self.assertRaises(NameError):
+            eval("not_a_connection", ns)
+        ns["mysql_orders"] = 1
+        self.assertEqual(eval("mysql_orders", ns), 1)
+
+    def test_completion_uses_cache_index(self):
+        """测试连接名称和表名补全"""
+        self.assertEqual(complete_connection_names("mysql"), ["mysql_orders"])
+        self.assertEqual(complete_connection_names("my-"), [])
+        names = dir(connection_object("mysql_orders"))
+        self.assertIn("orders", names)
+        self.assertNotIn("order items", names)
+        self.assertIn("syncTo", names)
+        with self.assertRaises(AttributeError):
+            connection_object("mysql_orders").__deepcopy__
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+import unittest
+
+import websockets
+
+from tapflow.lib.backend_apis.common import AgentApi
+from tapflow.lib.backend_apis.connections import ConnectionsApi
+from tapflow.lib.backend_apis.metadataInstance import MetadataInstanceApi
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.transport import RetryPolicy
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+
+class TestManagerSimulator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=30, connections=5, tables=50, step_seconds=0.05,
+                                                   snapshot_steps=2)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.session = self.sim.session()
+
+    def test_list_and_filter(self):
+        """测试任务, 连接和表的查询与过滤"""
+        self.assertEqual(len(TaskApi(self.session).get_all_tasks()), 30)
+        self.assertEqual(len(TaskApi(self.session).filter_tasks_by_name("task_1", limit=100)), 11)
+        self.assertEqual(TaskApi(self.session).get_task_by_name("task_7")["name"], "task_7")
+        connections = ConnectionsApi(self.session).get_connections()
+        self.assertEqual(len(connections), 5)
+        api = MetadataInstanceApi(self.session)
+        source_id = connections[0]["id"]
+        self.assertEqual(len(api.get_metadata_instance(source_id)), 10)
+        table_id = api.get_table_id("table_3", source_id)
+        self.assertEqual(len(api.get_fields_instance_by_id(table_id)), 8)
+        self.assertEqual(api.get_table_metadata(source_id, "table_3")["id"], table_id)
+        self.assertEqual(len(AgentApi(self.session).get_running_agents()), 1)
+
+    def test_task_lifecycle(self):
+        """测试任务启动后推进里程碑和统计, 停止后进入 stop"""
+        api = TaskApi(self.session)
+        task, ok = api.create_task({"name": "lifecycle", "type": "initial_sync+cdc", "dag": {}})
+        self.assertTrue(ok)
+        # 重名时 SDK 转为更新已有任务
+        (updated, _), ok = api.create_task({"name": "lifecycle"})
+        self.assertTrue(ok)
+        self.assertEqual(updated["id"], task["id"])
+        _, ok = api.start_task(task["id"])
+        self.assertTrue(ok)
+        self.assertEqual(api.get_task_by_id(task["id"])["status"], "scheduled")
+        time.sleep(0.3)
+        data = api.get_task_by_id(task["id"])
+        self.assertEqual(data["status"], "running")
+        self.assertEqual(data["syncStatus"], "CDC")
+        self.assertEqual(data["attrs"]["milestone"]["SNAPSHOT"]["status"], "FINISH")
+        measurement = api.get_task_measurement(task["id"], data["taskRecordId"])
+        stats = measurement["totalData"]["data"]["samples"]["data"][0]
+        self.assertEqual(stats["snapshotInsertRowTotal"], stats["snapshotRowTotal"])
+        self.assertTrue(api.stop_task(task["id"]))
+        time.sleep(0.1)
+        self.assertEqual(api.get_task_by_id(task["id"])["status"], "stop")
+
+    def test_fault_injection(self):
+        """测试指定接口注入错误后, 幂等请求重试成功"""
+        self.session.configure_transport(retry_policy=RetryPolicy(backoff_factor=0))
+        self.sim.fail_next("/Connections", times=2, method="GET")
+        res = self.session.get("/Connections")
+        self.assertEqual(res.status_code, 200)
+        self.sim.fail_next("/Task", times=1, method="POST")
+        res = self.session.post("/Task", json={"name": "faulty"})
+        self.assertEqual(res.status_code, 503)
+
+    def test_websocket_load_schema(self):
+        """测试 /ws/agent 返回 testConnectionResult"""
+        async def load():
+            async with websockets.connect(self.sim.ws_uri) as ws:
+                await ws.send(json.dumps({"type": "testConnection", "data": {"id": "x"}}))
+                return json.loads(await ws.recv())
+
+        message = asyncio.run(load())
+        self.assertEqual(message["data"]["type"], "testConnectionResult")
+        self.assertEqual(message["data"]["result"]["status"], "ready")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import itertools
+import socket
+import time
+import unittest
+from unittest.mock import patch
+
+from tapflow.lib import task_events as task_events_module
+from tapflow.lib.backend_apis.task import TaskApi
+from tapflow.lib.task_events import TaskEventHub
+from tapflow.tests.simulator import ManagerSimulator, SimulatorConfig
+
+_names = itertools.count()
+
+
+class TestTaskEvents(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = ManagerSimulator(SimulatorConfig(tasks=3, connections=2, tables=2, step_seconds=0.05,
+                                                   snapshot_steps=2)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sim.stop()
+
+    def setUp(self):
+        self.session = self.sim.session()
+        self.api = TaskApi(self.session)
+        self.hub = TaskEventHub(self.session, ws_uri=self.sim.ws_uri)
+
+    def start_task(self) -> str:
+        task, ok = self.api.create_task({"name": "push_{}".format(next(_names)), "type": "initial_sync+cdc", "dag": {}})
+        self.assertTrue(ok)
+        self.assertTrue(self.api.start_task(task["id"])[1])
+        return task["id"]
+
+    def test_wait_by_push_without_polling(self):
+        """测试状态和里程碑变化通过推送送达, 等待期间不查询任务"""
+        task_id = self.start_task()
+        before = self.sim.requests["GET /Task/{id}"]
+        seen = []
+        with self.hub.watch(task_id, callback=lambda task: seen.append(task["status"])) as watch:
+            future = watch.future(lambda task: task.get("status") == "running")
+            task = watch.wait_for(lambda task: task.get("syncStatus") == "CDC", 5)
+            self.assertEqual(task["attrs"]["milestone"]["SNAPSHOT"]["status"], "FINISH")
+            self.assertEqual(future.result(1)["status"], "running")
+        self.assertIn("scheduled", seen)
+        self.assertEqual(self.sim.requests["GET /Task/{id}"] - before, 0)
+        self.assertGreater(self.hub.stats["pushed"], 1)
+        self.assertEqual(self.hub.watched(), [])
+
+    def test_one_connection_for_many_subscriptions(self):
+        """测试多个订阅共用一个连接"""
+        ids = [self.start_task() for _ in range(3)]
+        connects = self.sim.requests["WS /ws/agent"]
+        watches = [self.hub.watch(task_id) for task_id in ids]
+        for watch in watches:
+            self.assertIsNotNone(watch.wait_for(lambda task: task.get("status") == "running", 5))
+        self.assertEqual(self.sim.requests["WS /ws/agent"] - connects, 1)
+        for watch in watches:
+            watch.close()
+
+    def test_unavailable_falls_back(self):
+        """测试无法连接时由轮询更新订阅, 一段时间内不再尝试连接"""
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        hub = TaskEventHub(self.session, ws_uri="ws://127.0.0.1:{}/ws/agent".format(port))
+        with patch.object(task_events_module, "POLL_INTERVAL", 0.01):
+            with hub.watch(self.start_task(), interval=0.05) as watch:
+                self.assertIsNotNone(watch.wait_for(lambda task: task.get("status") == "running", 5))
+                deadline = time.time() + 2
+                while hub.available() and time.time() < deadline:
+                    time.sleep(0.01)
+        self.assertFalse(hub.available())
+        self.assertEqual(hub.stats["pushed"], 0)
+        with patch.dict("os.environ", {"TAPFLOW_TASK_PUSH": "0"}):
+            self.assertFalse(self.hub.available())
+
+    def test_poll_is_batched(self):
+        """测试没有推送时所有订阅共用一次 /Task 查询, 请求数与任务数无关"""
+        ids = [self.start_task() for _ in range(5)]
+        before = self.sim.requests.copy()
+        with patch.dict("os.environ", {"TAPFLOW_TASK_PUSH": "0"}):
+            watches = [self.hub.watch(task_id, interval=0.1) for task_id in ids]
+            for watch in watches:
+                task = watch.wait_for(lambda task: task.get("syncStatus") == "CDC", 5)
+                self.assertEqual(task["status"], "running")
+            for watch in watches:
+                watch.close()
+        self.assertEqual(self.sim.requests["GET /Task/{id}"] - before["GET /Task/{id}"], 0)
+        self.assertEqual(self.sim.requests["WS /ws/agent"] - before["WS /ws/agent"], 0)
+        polls = self.sim.requests["GET /Task"] - before["GET /Task"]
+        self.assertEqual(polls, self.hub.stats["polls"])
+        self.assertLess(polls, 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from tapflow.lib.request import RequestSession
+from tapflow.lib.transport import CircuitBreaker, CircuitOpenError, RetryPolicy, TimeoutPolicy
+
+
+def mock_response(status_code=200, body=None):
+    return Mock(status_code=status_code, json=lambda: body or {"code": "ok", "data": {}})
+
+
+class TestTimeoutPolicy(unittest.TestCase):
+    def test_longest_prefix_wins(self):
+        """测试最长前缀优先匹配"""
+        policy = TimeoutPolicy({"/Task": 5, "/Task/batchStart": 60}, default=30)
+        self.assertEqual(policy.get("/Task/123"), 5)
+        self.assertEqual(policy.get("/Task/batchStart?taskIds=1"), 60)
+        self.assertEqual(policy.get("/Connections"), 30)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_backoff_bounded(self):
+        """测试退避时间带抖动且不超过上限"""
+        policy = RetryPolicy(backoff_factor=1, max_backoff=4)
+        for attempt in range(10):
+            self.assertLessEqual(policy.backoff(attempt), 4)
+            self.assertGreaterEqual(policy.backoff(attempt), 0)
+
+    def test_only_idempotent_methods(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.is_retryable("get"))
+        self.assertFalse(policy.is_retryable("POST"))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    @patch('tapflow.lib.transport.time')
+    def test_open_and_recover(self, mock_time):
+        """测试连续失败后打开熔断器, 超时后半开放行一个探测请求"""
+        mock_time.time.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10)
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        mock_time.time.return_value = 111
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.before_request()
+
+
+class TestRequestSessionTransport(unittest.TestCase):
+    def setUp(self):
+        self.session = RequestSession("127.0.0.1:3030")
+        self.session.configure_transport(retry_policy=RetryPolicy(total=2, backoff_factor=0))
+
+    @patch('requests.Session.request')
+    def test_retry_get_on_connection_error(self, mock_request):
+        """测试 GET 请求在连接错误后重试"""
+        mock_request.side_effect = [requests.exceptions.ConnectionError(), mock_response()]
+        res = self.session.get("/Task/1")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(mock_request.call_count, 2)
+
+    @patch('requests.Session.request')
+    def test_retry_get_on_unavailable(self, mock_request):
+        """测试 GET 请求在 503 后重试, 重试次数用尽返回最后一次响应"""
+        mock_request.return_value = mock_response(503)
+        res = self.session.get("/Task/1")
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch('requests.Session.request')
+    def test_post_not_retried(self, mock_request):
+        """测试非幂等请求不重试"""
+        mock_request.side_effect = requests.exceptions.ConnectionError()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.session.post("/Task", json={})
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch('requests.Session.request')
+    def test_endpoint_timeout_applied(self, mock_request):
+        """测试按接口设置默认超时, 调用方显式指定时不覆盖"""
+        mock_request.return_value = mock_response()
+        self.session.post("/measurement/batch", json={})
+        self.assertEqual(mock_request.call_args.kwargs["timeout"], 3)
+        self.session.get("/Task/1", timeout=1)
+        self.assertEqual(mock_request.call_args.kwargs["timeout"], 1)
+
+    @patch('requests.Session.request')
+    def test_circuit_breaker_fail_fast(self, mock_request):
+        """测试熔断器打开后不再发出请求"""
+        self.session.configure_transport(circuit_breaker=CircuitBreaker(failure_threshold=1, recovery_timeout=60))
+        mock_request.side_effect = requests.exceptions.ConnectionError()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.session.post("/Task", json={})
+        with self.assertRaises(CircuitOpenError):
+            self.session.post("/Task", json={})
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch('requests.Session.request')
+    def test_probe_other_error_reopens(self, mock_request):
+        """测试半开状态的探测请求抛出非连接错误时重新打开熔断器, 之后仍可再次探测"""
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        self.session.configure_transport(circuit_breaker=breaker)
+        mock_request.side_effect = [requests.exceptions.ConnectionError(),
+                                    requests.exceptions.ChunkedEncodingError(), mock_response()]
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.session.post("/Task", json={})
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            self.session.post("/Task", json={})
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.session.post("/Task", json={}).status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(mock_request.call_count, 3)
+
+    def test_clone_shares_policies(self):
+        self.session.configure_transport(pool_size=4)
+        clone = self.session.clone()
+        self.assertIs(clone.circuit_breaker, self.session.circuit_breaker)
+        self.assertEqual(clone.pool_size, 4)
+
+    def test_cloud_sign_does_not_mutate_base_url(self):
+        """测试云版签名不修改共享的 base_url"""
+        session = RequestSession("https://cloud.tapdata.net")
+        session.set_ak_sk("ak", "sk")
+        prepared = session.prepare_request(requests.Request("GET", "/agent", params={}))
+        self.assertTrue(prepared.url.startswith("https://cloud.tapdata.net/api/tcm/agent"))
+        self.assertEqual(session.base_url, "https://cloud.tapdata.net")
+
+
+if __name__ == '__main__':
+    unittest.main()
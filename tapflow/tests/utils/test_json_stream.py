@@ -0,0 +1,69 @@
+import json
+import random
+import unittest
+
+from tapflow.lib.utils.json_stream import JsonItemStream
+
+
+def split(raw: bytes, size: int) -> list:
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+class TestJsonItemStream(unittest.TestCase):
+    def test_items_across_chunk_boundaries(self):
+        """测试任意分块下解析结果与完整解析一致"""
+        items = [
+            {"id": "1", "name": 'a"b\\c,]}{[', "stats": {"items": [1, {"x": []}]}},
+            "plain", 12.5, None, ["nested", {"k": "中文"}], {},
+        ]
+        doc = {"reqId": "r", "ts": 1, "code": "ok", "data": {"total": 6, "other": {"items": [0]}, "items": items}}
+        for ensure_ascii in (True, False):
+            raw = json.dumps(doc, ensure_ascii=ensure_ascii).encode("utf-8")
+            for size in (1, 2, 5, 64, len(raw)):
+                stream = JsonItemStream(split(raw, size))
+                self.assertEqual(list(stream), items)
+                self.assertEqual(stream.envelope["code"], "ok")
+                self.assertTrue(stream.found)
+
+    def test_random_documents(self):
+        """测试随机生成的文档"""
+        rnd = random.Random(7)
+
+        def value(depth=0):
+            r = rnd.random()
+            if depth > 3 or r < 0.3:
+                return rnd.choice([1, -2.5e3, "\\\\", "}]", None, True, ""])
+            if r < 0.6:
+                return [value(depth + 1) for _ in range(rnd.randint(0, 3))]
+            return {"k{}".format(i): value(depth + 1) for i in range(rnd.randint(0, 3))}
+
+        for _ in range(50):
+            items = [value() for _ in range(rnd.randint(0, 5))]
+            raw = json.dumps({"data": {"items": items}, "code": "ok"}, indent=rnd.choice([None, 2])).encode()
+            self.assertEqual(list(JsonItemStream(split(raw, rnd.randint(1, 16)))), items)
+
+    def test_error_envelope(self):
+        """测试错误响应没有 items, code 和 message 保存在 envelope 中"""
+        stream = JsonItemStream([b'{"code":"SystemError","message":"boom","data":null}'])
+        self.assertEqual(list(stream), [])
+        self.assertFalse(stream.found)
+        self.assertEqual(stream.envelope, {"code": "SystemError", "message": "boom"})
+
+    def test_items_yielded_before_response_complete(self):
+        """测试第一个元素在响应接收完之前就可以使用"""
+        received = []
+
+        def chunks():
+            received.append(1)
+            yield b'{"code":"ok","data":{"items":[{"id":1},'
+            received.append(2)
+            yield b'{"id":2}]}}'
+
+        stream = iter(JsonItemStream(chunks()))
+        self.assertEqual(next(stream), {"id": 1})
+        self.assertEqual(received, [1])
+        self.assertEqual(list(stream), [{"id": 2}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import math
+import unittest
+
+from tapflow.lib.utils.lttb import lttb
+
+
+class TestLttb(unittest.TestCase):
+    def test_keeps_endpoints_and_peaks(self):
+        """测试降采样后保留首尾点和尖峰"""
+        times = list(range(10000))
+        values = [math.sin(t / 500) for t in times]
+        values[4321] = 50
+        out_t, out_v = lttb(times, values, 200)
+        self.assertEqual(len(out_t), 200)
+        self.assertEqual((out_t[0], out_t[-1]), (0, 9999))
+        self.assertIn(4321, out_t)
+        self.assertEqual(out_t, sorted(out_t))
+        self.assertEqual(out_v[out_t.index(4321)], 50)
+
+    def test_small_input_unchanged(self):
+        """测试点数不超过目标时原样返回"""
+        self.assertEqual(lttb([1, 2, 3], [4, 5, 6], 10), ([1, 2, 3], [4, 5, 6]))
+        self.assertEqual(lttb([], [], 10), ([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from tapflow.lib.utils.profiler import Profiler, normalize_endpoint
+
+
+class TestProfiler(unittest.TestCase):
+    def test_normalize_endpoint(self):
+        """测试路径中的 ObjectId 被替换为 {id}, 查询参数被去掉"""
+        self.assertEqual(
+            normalize_endpoint("get", "/Task/6721f8a0b1c2d3e4f5a6b7c8/measurement?filter=1"),
+            "GET /Task/{id}/measurement",
+        )
+        self.assertEqual(normalize_endpoint("post", "/Task/batchStart"), "POST /Task/batchStart")
+
+    def test_record_request_histogram(self):
+        """测试接口统计的次数, 错误数, 字节数和分位数"""
+        profiler = Profiler()
+        for ms in (3, 8, 40, 40, 2000):
+            profiler.record_request("GET", "/Connections", ms / 1000, size=10)
+        profiler.record_request("GET", "/Connections", 0.001, ok=False, cached=True)
+        stats = profiler.to_dict()["endpoints"]["GET /Connections"]
+        self.assertEqual(stats["count"], 6)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["cached"], 1)
+        self.assertEqual(stats["bytes"], 50)
+        self.assertEqual(stats["p50_ms"], 10)
+        self.assertEqual(stats["p99_ms"], 2000)
+
+    def test_nested_spans(self):
+        """测试嵌套 span 汇总请求和等待耗时"""
+        profiler = Profiler()
+        with profiler.span("Pipeline.start"):
+            profiler.record_request("PATCH", "/Task", 0.1)
+            with profiler.span("Job.start"):
+                profiler.record_request("PUT", "/Task/batchStart", 0.2)
+                with profiler.sleeping():
+                    time.sleep(0.01)
+        spans = profiler.to_dict()["spans"]
+        self.assertEqual(len(spans), 1)
+        outer = spans[0]
+        self.assertEqual(outer["name"], "Pipeline.start")
+        self.assertEqual(outer["request_count"], 2)
+        self.assertAlmostEqual(outer["request_ms"], 300, delta=1)
+        self.assertGreaterEqual(outer["sleep_ms"], 10)
+        inner = outer["children"][0]
+        self.assertEqual(inner["name"], "Job.start")
+        self.assertEqual(inner["request_count"], 1)
+
+    def test_span_records_error(self):
+        """测试 span 内抛出异常时记录错误并继续抛出"""
+        profiler = Profiler()
+        with self.assertRaises(ValueError):
+            with profiler.span("Job.save"):
+                raise ValueError("bad dag")
+        self.assertIn("bad dag", profiler.to_dict()["spans"][0]["error"])
+
+    def test_export_and_reset(self):
+        """测试导出 JSON 文件和清空统计"""
+        profiler = Profiler()
+        profiler.record_request("GET", "/Task", 0.01)
+        with profiler.span("Job.status"):
+            pass
+        path = os.path.join(tempfile.mkdtemp(), "profile.json")
+        profiler.to_json(path)
+        with open(path) as f:
+            data = json.load(f)
+        self.assertIn("GET /Task", data["endpoints"])
+        self.assertTrue(any("GET /Task" in line for line in profiler.report()))
+        profiler.reset()
+        self.assertEqual(profiler.to_dict(), {"endpoints": {}, "spans": []})
+
+    def test_disabled(self):
+        """测试关闭后不再记录"""
+        profiler = Profiler()
+        profiler.enabled = False
+        profiler.record_request("GET", "/Task", 0.01)
+        with profiler.span("Job.start") as span:
+            self.assertIsNone(span)
+        self.assertEqual(profiler.to_dict(), {"endpoints": {}, "spans": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
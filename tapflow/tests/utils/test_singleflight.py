@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from tapflow.lib.utils.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def run_concurrently(self, flight, key, fn, n=5):
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_request(self):
+        """测试相同 key 的并发调用只执行一次"""
+        flight = SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            time.sleep(0.05)
+            return {"status": "running"}
+
+        results, errors = self.run_concurrently(flight, "task", fn)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r[0] for r in results], [{"status": "running"}] * 5)
+        self.assertEqual(sum(1 for r in results if not r[1]), 1)
+
+    def test_shared_result_is_copied(self):
+        """测试等待方拿到的是副本, 修改结果互不影响"""
+        flight = SingleFlight(ttl=10)
+        value, shared = flight.do("k", lambda: {"a": 1})
+        value["a"] = 2
+        copied, shared = flight.do("k", lambda: {"a": 3})
+        self.assertTrue(shared)
+        self.assertEqual(copied, {"a": 1})
+
+    def test_no_ttl_calls_again(self):
+        flight = SingleFlight()
+        fn = Mock(return_value=1)
+        flight.do("k", fn)
+        flight.do("k", fn)
+        self.assertEqual(fn.call_count, 2)
+
+    @patch('tapflow.lib.utils.singleflight.time')
+    def test_ttl_expire(self, mock_time):
+        """测试结果超过 ttl 后重新请求"""
+        mock_time.monotonic.return_value = 100
+        flight = SingleFlight(ttl=1)
+        fn = Mock(return_value=1)
+        flight.do("k", fn)
+        mock_time.monotonic.return_value = 100.5
+        flight.do("k", fn)
+        self.assertEqual(fn.call_count, 1)
+        mock_time.monotonic.return_value = 102
+        flight.do("k", fn)
+        self.assertEqual(fn.call_count, 2)
+
+    def test_error_propagates_and_not_cached(self):
+        """测试异常传递给所有等待方, 且不会被缓存"""
+        flight = SingleFlight(ttl=10)
+
+        def fn():
+            time.sleep(0.05)
+            raise KeyError("data")
+
+        results, errors = self.run_concurrently(flight, "k", fn, n=3)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(flight.do("k", lambda: 1), (1, False))
+
+    def test_forget(self):
+        flight = SingleFlight(ttl=10)
+        flight.do("k", lambda: 1)
+        flight.forget("k")
+        self.assertEqual(flight.do("k", lambda: 2), (2, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from tapflow.lib.utils.trie import Trie
+
+
+class TestTrie(unittest.TestCase):
+    def test_prefix_matches(self):
+        """测试前缀匹配, 唯一匹配和计数"""
+        trie = Trie()
+        for name in ("mysql_source", "mysql_sink", "mongo"):
+            trie.insert(name, name.upper())
+        self.assertEqual(trie.count("mysql"), 2)
+        self.assertEqual(sorted(k for k, _ in trie.matches("mysql")), ["mysql_sink", "mysql_source"])
+        self.assertIsNone(trie.unique("mysql"))
+        self.assertEqual(trie.unique("mo"), ("mongo", "MONGO"))
+        self.assertEqual(trie.matches("pg"), [])
+        self.assertEqual(len(trie.matches("", limit=2)), 2)
+
+    def test_suffix_and_remove(self):
+        """测试后缀匹配, 删除后分支被清理"""
+        trie = Trie(reverse=True)
+        trie.insert("6721f8a0b1c2d3e4f5aaaaaa", 1)
+        trie.insert("6721f8a0b1c2d3e4f5baaaaa", 2)
+        self.assertEqual(trie.count("aaaaa"), 2)
+        self.assertEqual(trie.unique("aaaaaa"), ("6721f8a0b1c2d3e4f5aaaaaa", 1))
+        self.assertTrue(trie.remove("6721f8a0b1c2d3e4f5aaaaaa"))
+        self.assertFalse(trie.remove("6721f8a0b1c2d3e4f5aaaaaa"))
+        self.assertEqual(trie.count("aaaaaa"), 0)
+        self.assertEqual(trie.unique("aaaaa"), ("6721f8a0b1c2d3e4f5baaaaa", 2))
+        trie.insert("6721f8a0b1c2d3e4f5baaaaa", 3)
+        self.assertEqual(len(trie), 1)
+        self.assertEqual(trie.unique("a"), ("6721f8a0b1c2d3e4f5baaaaa", 3))
+
+    def test_fragment_longer_than_depth(self):
+        """测试超过树深度的片段在最深一层节点中再比较"""
+        trie = Trie(reverse=True, depth=2)
+        trie.insert("x1aa", 1)
+        trie.insert("x2aa", 2)
+        self.assertEqual(trie.count("aa"), 2)
+        self.assertEqual(trie.count("2aa"), 1)
+        self.assertEqual(trie.unique("1aa"), ("x1aa", 1))
+        self.assertEqual(trie.matches("3aa"), [])
+
+    def test_key_is_prefix_of_another(self):
+        """测试一个 key 是另一个 key 的前缀"""
+        trie = Trie()
+        trie.insert("job", 1)
+        trie.insert("job_2", 2)
+        self.assertEqual(trie.count("job"), 2)
+        trie.remove("job_2")
+        self.assertEqual(trie.unique("jo"), ("job", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()